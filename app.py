@@ -13,12 +13,18 @@ Features:
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
 import json
 from pathlib import Path
 import plotly.express as px
 import plotly.graph_objects as go
 
+from pipeline.serving import load_serving_model
+from pipeline.comparables import load_comparables
+from pipeline.market_cube import load_market_cube
+from pipeline.drift import load_drift_monitor
+from pipeline.undervalued import load_undervalued
+from pipeline.profiling import instrument, request as profile_request
+
 # Page config
 st.set_page_config(
     page_title="Home Price Predictor",
@@ -127,6 +133,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Load model and data
+@instrument('app.load_model')
 @st.cache_resource
 def load_model():
     """Load the trained model"""
@@ -134,21 +141,13 @@ def load_model():
     MODELS_DIR = ROOT / 'models'
     
     try:
-        # Try to load best ensemble model first
-        model_path = MODELS_DIR / 'best_ensemble_model.joblib'
-        if not model_path.exists():
-            # Fallback to best advanced model
-            model_path = MODELS_DIR / 'best_advanced_model.joblib'
-        if not model_path.exists():
-            # Final fallback to best model
-            model_path = MODELS_DIR / 'best_model_final.joblib'
-        
-        model = joblib.load(model_path)
-        return model, str(model_path.name)
+        # Best ensemble -> best advanced -> best final model, as served by pipeline/serving.py
+        return load_serving_model(MODELS_DIR)
     except Exception as e:
         st.error(f"Error loading model: {e}")
         return None, None
 
+@instrument('app.load_metadata')
 @st.cache_data
 def load_metadata():
     """Load model metadata and results"""
@@ -186,8 +185,42 @@ def load_metadata():
         with open(expected_path) as f:
             metadata['expected_features'] = json.load(f)
     
+    # Load compact feature dtypes (python -m pipeline.dtypes)
+    dtypes_path = MODELS_DIR / 'feature_dtypes.json'
+    if dtypes_path.exists():
+        with open(dtypes_path) as f:
+            metadata['feature_dtypes'] = json.load(f)
+    
     return metadata
 
+@instrument('app.load_comparables_index')
+@st.cache_resource
+def load_comparables_index():
+    """Load the comparable-sales spatial index"""
+    ROOT = Path(__file__).parent
+    return load_comparables(ROOT / 'models')
+
+@instrument('app.load_market_cube_data')
+@st.cache_resource
+def load_market_cube_data():
+    """Load the pre-aggregated market statistics cube"""
+    ROOT = Path(__file__).parent
+    return load_market_cube(ROOT / 'models')
+
+@instrument('app.load_undervalued_data')
+@st.cache_data(show_spinner=False)
+def load_undervalued_data():
+    """Load the last undervalued-listings scan (python -m pipeline.undervalued scan)"""
+    ROOT = Path(__file__).parent
+    return load_undervalued(ROOT / 'models')
+
+@instrument('app.load_drift_monitor')
+@st.cache_resource
+def load_drift_monitor_data():
+    """Live input sketch shared by all sessions (python -m pipeline.drift build)"""
+    ROOT = Path(__file__).parent
+    return load_drift_monitor(ROOT / 'models')
+
 # Sidebar navigation
 st.sidebar.markdown("""
 <div style='text-align: center; padding: 2rem 0;'>
@@ -211,20 +244,26 @@ st.sidebar.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Load model and metadata
-model, model_name = load_model()
-metadata = load_metadata()
-
-# Page routing
-if page == "🏡 Home":
-    from pages import home
-    home.show(model, model_name, metadata)
-elif page == "🎯 Predict":
-    from pages import predict
-    predict.show(model, model_name, metadata)
-elif page == "📊 Analysis":
-    from pages import analysis
-    analysis.show(model, model_name, metadata)
-else:
-    from pages import about
-    about.show(metadata)
+# One traced request per script run (HOME_PRICE_PROFILE=1)
+with profile_request(page):
+    # Load model and metadata
+    model, model_name = load_model()
+    metadata = load_metadata()
+    metadata['comparables'] = load_comparables_index()
+    metadata['market_cube'] = load_market_cube_data()
+    metadata['drift_monitor'] = load_drift_monitor_data()
+    metadata['undervalued'] = load_undervalued_data()
+
+    # Page routing
+    if page == "🏡 Home":
+        from pages import home
+        home.show(model, model_name, metadata)
+    elif page == "🎯 Predict":
+        from pages import predict
+        predict.show(model, model_name, metadata)
+    elif page == "📊 Analysis":
+        from pages import analysis
+        analysis.show(model, model_name, metadata)
+    else:
+        from pages import about
+        about.show(metadata)
@@ -0,0 +1 @@
+# Benchmarks module for Home Price Prediction performance checks
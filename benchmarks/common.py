@@ -0,0 +1,17 @@
+"""
+Shared output helpers for the benchmark scripts (timing lives in pipeline/timing.py)
+"""
+
+
+def print_table(rows, columns):
+    """Print a list of dicts as an aligned table"""
+    widths = {c: max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(_fmt(r.get(c)).ljust(widths[c]) for c in columns))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:,.4f}" if abs(value) < 10 else f"{value:,.1f}"
+    return str(value)
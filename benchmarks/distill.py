@@ -0,0 +1,55 @@
+"""
+Teacher vs distilled student - latency/accuracy trade-off
+
+Usage:
+    python -m benchmarks.distill --batch-size 10000
+"""
+
+import argparse
+import joblib
+from pathlib import Path
+
+from benchmarks.common import print_table
+from pipeline.timing import time_calls
+from pipeline.data import DATA_DIR, MODELS_DIR, load_training_matrices
+from pipeline.metrics import regression_scores
+from pipeline.serving import STUDENT_MODEL, resolve_model_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark teacher vs distilled student")
+    parser.add_argument('--teacher', default=None)
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    models_dir = Path(args.models_dir)
+    teacher = joblib.load(Path(args.teacher) if args.teacher else resolve_model_path(models_dir))
+    student = joblib.load(models_dir / STUDENT_MODEL)
+    _, X_test, _, y_test = load_training_matrices(args.data_dir)
+
+    single = X_test.iloc[[0]]
+    batch = X_test.iloc[:args.batch_size]
+
+    rows = []
+    for name, model in [('teacher', teacher), ('student', student)]:
+        one = time_calls(lambda: model.predict(single), repeat=args.repeat)
+        many = time_calls(lambda: model.predict(batch), repeat=max(3, args.repeat // 20))
+        scores = regression_scores(y_test, model.predict(X_test))
+        rows.append({
+            'model': name,
+            'single_p50_ms': one['p50_ms'],
+            'single_p95_ms': one['p95_ms'],
+            'batch_ms': many['p50_ms'],
+            'rows_per_sec': len(batch) / (many['p50_ms'] / 1000),
+            'test_r2': scores['r2'],
+            'test_rmse': scores['rmse'],
+        })
+
+    print_table(rows, list(rows[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Sequential vs parallel ensemble-member inference
+
+Uses the served model when it is a Voting/Stacking ensemble; otherwise fits
+a small RF + XGBoost (+ LightGBM if installed) VotingRegressor on a sample
+of the training matrix, mirroring notebook 06.
+
+Usage:
+    python -m benchmarks.ensemble --batch-size 20000 --threads 8
+"""
+
+import argparse
+import joblib
+import numpy as np
+from pathlib import Path
+from sklearn.ensemble import VotingRegressor, StackingRegressor
+
+from benchmarks.common import print_table
+from pipeline.timing import time_calls
+from pipeline.data import DATA_DIR, MODELS_DIR, load_training_matrices
+from pipeline.ensemble import ParallelEnsemble
+from pipeline.serving import resolve_model_path
+
+
+def build_voting(X_train, y_train, sample=20000, seed=42):
+    """Small notebook-06-style VotingRegressor for when no ensemble is saved"""
+    from sklearn.ensemble import RandomForestRegressor
+    import xgboost as xgb
+
+    members = [
+        ('rf', RandomForestRegressor(n_estimators=100, max_depth=20, max_features='sqrt',
+                                     random_state=seed, n_jobs=-1)),
+        ('xgb', xgb.XGBRegressor(n_estimators=300, learning_rate=0.05, max_depth=7,
+                                 subsample=0.8, colsample_bytree=0.8, random_state=seed,
+                                 tree_method='hist', n_jobs=-1)),
+    ]
+    try:
+        import lightgbm as lgb
+        members.append(('lgb', lgb.LGBMRegressor(n_estimators=300, learning_rate=0.05, max_depth=7,
+                                                 num_leaves=50, random_state=seed, n_jobs=-1, verbose=-1)))
+    except ImportError:
+        pass
+
+    idx = np.random.default_rng(seed).permutation(len(X_train))[:sample]
+    return VotingRegressor(members, n_jobs=1).fit(X_train.iloc[idx], y_train[idx])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel ensemble-member inference")
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--batch-size', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=None, help="Global thread budget")
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    X_train, X_test, y_train, _ = load_training_matrices(args.data_dir)
+    path = Path(args.model) if args.model else resolve_model_path(args.models_dir)
+    ensemble = joblib.load(path) if path.exists() else None
+    if not isinstance(ensemble, (VotingRegressor, StackingRegressor)):
+        print("No saved Voting/Stacking ensemble found; fitting a small VotingRegressor")
+        ensemble = build_voting(X_train, y_train)
+
+    parallel = ParallelEnsemble(ensemble, thread_budget=args.threads)
+    single = X_test.iloc[[0]]
+    batch = X_test.iloc[:args.batch_size]
+    assert np.allclose(ensemble.predict(batch), parallel.predict(batch))
+
+    rows = []
+    for name, model in [('sequential', ensemble), ('parallel', parallel)]:
+        one = time_calls(lambda: model.predict(single), repeat=args.repeat)
+        many = time_calls(lambda: model.predict(batch), repeat=max(3, args.repeat // 10))
+        rows.append({
+            'mode': name,
+            'single_p50_ms': one['p50_ms'],
+            'single_p95_ms': one['p95_ms'],
+            'batch_p50_ms': many['p50_ms'],
+            'rows_per_sec': len(batch) / (many['p50_ms'] / 1000),
+        })
+
+    print(f"Members: {len(parallel.members)}, thread budget: {parallel.thread_budget}, batch: {len(batch):,} rows")
+    print_table(rows, list(rows[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+"""
+Load test - concurrent valuation traffic against the serving model
+
+Drives the model stack app.py serves (pipeline.serving.load_serving_model)
+with a mix of single-row, small-batch and large-batch requests. Feature rows
+are synthetic listings from pipeline/synthetic.py run through the fitted
+Preprocessor, so requests look like what the predict page and batch jobs send.
+
+Targets:
+- inproc: requests call model.predict from a thread pool in this process,
+  like concurrent Streamlit sessions sharing the cached load_model()
+- http: a stand-in JSON endpoint (POST /predict) started on localhost as a
+  subprocess, or an already running one given with --url
+
+Arrivals are open-loop Poisson at --rate requests/s, where latency counts
+from the scheduled arrival so queueing shows up. With --rate 0 they are
+closed-loop: each client sends its next request as soon as the last one
+returns. Each concurrency level runs for --duration seconds while a sampler
+records CPU and RSS of the serving process; the table across levels is the
+saturation curve.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 1 2 4 8 16 --duration 20
+    python -m benchmarks.load_test --target http --rate 50 --mix single=0.9,small=0.1
+    python -m benchmarks.load_test --serve --port 8502     # stand-in endpoint only
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+import urllib.request
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.common import print_table
+from pipeline.data import ROOT, MODELS_DIR, CACHE_DIR, TARGET
+from pipeline.dtypes import apply_dtypes
+from pipeline.preprocessing import Preprocessor, load_preprocessor
+from pipeline.batch_score import model_feature_columns, check_model_columns
+from pipeline.serving import load_serving_model
+from pipeline.synthetic import raw_spec, generate_frame, load_schema_features, load_importance
+from pipeline.concurrency import available_cpus
+
+RESULTS_PATH = CACHE_DIR / 'benchmarks' / 'load_test.json'
+REQUEST_SIZES = {'single': 1, 'small': 16, 'large': 1000}
+DEFAULT_MIX = 'single=0.8,small=0.15,large=0.05'
+SAMPLE_INTERVAL = 0.25
+SEED = 42
+
+
+def parse_pairs(text, cast=float):
+    """'single=0.8,small=0.2' -> {'single': 0.8, 'small': 0.2}"""
+    pairs = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, value = item.partition('=')
+        pairs[name.strip()] = cast(value)
+    return pairs
+
+
+def feature_dtypes(models_dir=MODELS_DIR):
+    path = Path(models_dir) / 'feature_dtypes.json'
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def feature_pool(model, models_dir=MODELS_DIR, n_rows=5000, seed=SEED):
+    """Model-ready feature rows for synthetic listings shaped by the schema artifacts"""
+    spec = raw_spec(load_schema_features(models_dir), load_importance(models_dir), seed=seed)
+    raw = generate_frame(spec, n_rows, np.random.default_rng(seed), key_prefix='L')
+    prep = load_preprocessor(models_dir)
+    if prep is None:
+        prep = Preprocessor(reference_year=2025).fit(raw)
+    X = prep.transform(raw.drop(columns=[TARGET]))
+    columns = model_feature_columns(model, models_dir)
+    check_model_columns(X.columns, columns)
+    if columns is not None:
+        X = X.reindex(columns=columns, fill_value=0)
+    dtypes = feature_dtypes(models_dir)
+    if dtypes:
+        X = apply_dtypes(X, dtypes)
+    return X.reset_index(drop=True)
+
+
+class Workload:
+    """Draws (kind, first row, n rows) requests from the mix over the feature pool"""
+
+    def __init__(self, mix, sizes, pool_rows):
+        unknown = set(mix) - set(sizes)
+        if unknown:
+            raise ValueError(f"No request size for {sorted(unknown)}; sizes are {sizes}")
+        self.kinds = list(mix)
+        weights = np.array([mix[k] for k in self.kinds], dtype=float)
+        self.probs = weights / weights.sum()
+        self.sizes = {k: min(sizes[k], pool_rows) for k in self.kinds}
+        self.pool_rows = pool_rows
+
+    def draw(self, rng):
+        kind = self.kinds[rng.choice(len(self.kinds), p=self.probs)]
+        size = self.sizes[kind]
+        return kind, int(rng.integers(0, self.pool_rows - size + 1)), size
+
+
+class InProcessTarget:
+    """Calls the served model directly, as app sessions share load_model()"""
+
+    def __init__(self, model, pool):
+        self.model = model
+        self.pool = pool
+        self.pid = os.getpid()
+
+    def call(self, start, size):
+        self.model.predict(self.pool.iloc[start:start + size])
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """POSTs JSON rows to a stand-in endpoint; payloads are encoded up front"""
+
+    def __init__(self, url, pool, pid=None, process=None):
+        self.url = url.rstrip('/') + '/predict'
+        self.pool = pool
+        self.pid = pid
+        self.process = process
+        self._payloads = {}
+
+    def _payload(self, start, size):
+        key = (start, size)
+        if key not in self._payloads:
+            rows = self.pool.iloc[start:start + size]
+            body = {'columns': list(rows.columns), 'data': rows.to_numpy(dtype=float).tolist()}
+            self._payloads[key] = json.dumps(body).encode()
+        return self._payloads[key]
+
+    def prepare(self, workload, n_per_kind=8, seed=SEED):
+        """Pre-encode a few payloads per request kind so the client does no JSON work under load"""
+        rng = np.random.default_rng(seed)
+        self.offsets = {}
+        for kind, size in workload.sizes.items():
+            starts = rng.integers(0, workload.pool_rows - size + 1, n_per_kind)
+            self.offsets[size] = [int(s) for s in starts]
+            for s in self.offsets[size]:
+                self._payload(int(s), size)
+
+    def call(self, start, size):
+        offsets = self.offsets[size]
+        data = self._payload(offsets[start % len(offsets)], size)
+        req = urllib.request.Request(self.url, data=data, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=300) as resp:
+            resp.read()
+
+    def close(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+def process_usage(pid):
+    """(cumulative CPU seconds, RSS MB) of ``pid`` from /proc, or None where unavailable"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError):
+        if pid != os.getpid():
+            return None
+        from pipeline.profiling import rss_mb
+        times = os.times()
+        return times.user + times.system, rss_mb()
+    ticks = os.sysconf('SC_CLK_TCK')
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    return cpu, pages * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU % (100 = one core) and RSS of a process until stopped"""
+
+    def __init__(self, pid, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        last = process_usage(self.pid)
+        last_t = start
+        while last is not None and not self._stop_event.wait(self.interval):
+            usage, now = process_usage(self.pid), time.perf_counter()
+            if usage is None:
+                break
+            cpu_pct = (usage[0] - last[0]) / (now - last_t) * 100
+            self.samples.append({'t': round(now - start, 3), 'cpu_pct': round(cpu_pct, 1),
+                                 'rss_mb': round(usage[1], 1)})
+            last, last_t = usage, now
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.samples
+
+
+def _summarize(records, wall, dropped, samples, concurrency, rate):
+    ok = [r for r in records if r[2]]
+    latencies = np.array([r[1] for r in ok]) if ok else np.array([np.nan])
+    row = {
+        'concurrency': concurrency,
+        'offered_rps': rate if rate else None,
+        'requests': len(records),
+        'errors': len(records) - len(ok),
+        'dropped': dropped,
+        'rps': len(ok) / wall,
+        'rows_per_sec': sum(r[3] for r in ok) / wall,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max()),
+        'cpu_pct': float(np.mean([s['cpu_pct'] for s in samples])) if samples else None,
+        'rss_mb': float(max(s['rss_mb'] for s in samples)) if samples else None,
+    }
+    by_kind = {}
+    for kind in sorted({r[0] for r in ok}):
+        kind_ms = np.array([r[1] for r in ok if r[0] == kind])
+        by_kind[kind] = {'requests': len(kind_ms), 'p50_ms': float(np.percentile(kind_ms, 50)),
+                         'p95_ms': float(np.percentile(kind_ms, 95))}
+    return row, by_kind
+
+
+def run_level(target, workload, concurrency, duration, rate=0.0, seed=SEED):
+    """One load level; returns (summary row, per-kind latency, resource samples)"""
+    records = []  # (kind, latency ms, ok, rows); list.append is atomic
+    sampler = ResourceSampler(target.pid) if target.pid else None
+    if sampler:
+        sampler.start()
+
+    def send(kind, start, size, issued):
+        try:
+            target.call(start, size)
+            ok = True
+        except Exception:
+            ok = False
+        records.append((kind, (time.perf_counter() - issued) * 1000, ok, size))
+
+    begin = time.perf_counter()
+    deadline = begin + duration
+    dropped = 0
+    if rate:
+        # Open loop: arrivals do not wait for responses, so a saturated server builds a queue
+        rng = np.random.default_rng(seed)
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        arrival, submitted = begin, 0
+        while True:
+            arrival += rng.exponential(1.0 / rate)
+            if arrival >= deadline:
+                break
+            time.sleep(max(0.0, arrival - time.perf_counter()))
+            pool.submit(send, *workload.draw(rng), arrival)
+            submitted += 1
+        # Requests still queued at the deadline are cancelled and counted as dropped
+        pool.shutdown(wait=True, cancel_futures=True)
+        dropped = submitted - len(records)
+    else:
+        def client(i):
+            rng = np.random.default_rng([seed, i])
+            while time.perf_counter() < deadline:
+                send(*workload.draw(rng), time.perf_counter())
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - begin
+
+    samples = sampler.stop() if sampler else []
+    row, by_kind = _summarize(records, wall, dropped, samples, concurrency, rate)
+    return row, by_kind, samples
+
+
+class PredictHandler(BaseHTTPRequestHandler):
+    """Stand-in valuation endpoint: POST /predict {"columns": [...], "data": [[...]]}"""
+
+    model = None
+    dtypes = None
+
+    def do_GET(self):
+        self._reply(200, {'status': 'ok'} if self.path == '/health' else {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self._reply(404, {'error': 'not found'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            X = pd.DataFrame(body['data'], columns=body['columns'])
+            if self.dtypes:
+                X = apply_dtypes(X, self.dtypes)
+            preds = np.asarray(self.model.predict(X), dtype=float)
+        except Exception as e:
+            return self._reply(400, {'error': str(e)})
+        self._reply(200, {'predictions': preds.tolist()})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(models_dir=MODELS_DIR, port=8502):
+    """Run the stand-in endpoint until interrupted"""
+    PredictHandler.model, name = load_serving_model(models_dir)
+    PredictHandler.dtypes = feature_dtypes(models_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', port), PredictHandler)
+    print(f"Serving {name} on http://127.0.0.1:{port}/predict", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def start_server(models_dir, port, timeout=120):
+    """Start serve() in a subprocess and wait until /health answers"""
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.load_test', '--serve', '--port', str(port),
+                                '--models-dir', str(models_dir)], cwd=ROOT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Stand-in server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url + '/health', timeout=1):
+                return url, process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise TimeoutError(f"Stand-in server did not start within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the valuation path")
+    parser.add_argument('--target', choices=['inproc', 'http'], default='inproc')
+    parser.add_argument('--url', default=None, help="Existing endpoint for --target http (default: start one)")
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Client threads per level (closed loop) or in-flight limit (open loop)")
+    parser.add_argument('--rate', type=float, default=0.0, help="Poisson arrivals per second (0 = closed loop)")
+    parser.add_argument('--duration', type=float, default=15.0, help="Seconds per level")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Request kind weights")
+    parser.add_argument('--sizes', default=','.join(f"{k}={v}" for k, v in REQUEST_SIZES.items()),
+                        help="Rows per request kind")
+    parser.add_argument('--pool-rows', type=int, default=5000, help="Synthetic feature rows to draw requests from")
+    parser.add_argument('--output', default=str(RESULTS_PATH))
+    parser.add_argument('--serve', action='store_true', help="Only run the stand-in HTTP endpoint")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.models_dir, args.port)
+        return
+
+    sizes = parse_pairs(args.sizes, int)
+    workload_mix = parse_pairs(args.mix)
+    model, model_name = load_serving_model(args.models_dir)
+    start = time.time()
+    pool = feature_pool(model, args.models_dir, max(args.pool_rows, max(sizes.values())))
+    print(f"Built {len(pool):,} x {pool.shape[1]} feature pool ({time.time() - start:.1f}s)")
+    workload = Workload(workload_mix, sizes, len(pool))
+
+    if args.target == 'http':
+        url, process = (args.url, None) if args.url else start_server(args.models_dir, args.port)
+        target = HttpTarget(url, pool, pid=process.pid if process else None, process=process)
+        target.prepare(workload)
+    else:
+        target = InProcessTarget(model, pool)
+
+    mode = f"open loop at {args.rate:g} req/s" if args.rate else "closed loop"
+    print(f"Load testing {model_name} ({args.target}, {mode}, mix {workload_mix})")
+    rows, levels = [], []
+    try:
+        # Warm up caches and lazy imports outside the measurements
+        run_level(target, workload, 1, min(2.0, args.duration))
+        for concurrency in args.concurrency:
+            row, by_kind, samples = run_level(target, workload, concurrency, args.duration, args.rate)
+            rows.append(row)
+            levels.append({**row, 'by_kind': by_kind, 'samples': samples})
+            print(f"  concurrency {concurrency}: {row['rps']:,.1f} req/s, p95 {row['p95_ms']:,.1f} ms")
+    finally:
+        target.close()
+
+    print_table(rows, list(rows[0]))
+    peak = max(rows, key=lambda r: r['rps'])
+    print(f"\nPeak throughput {peak['rps']:,.1f} req/s ({peak['rows_per_sec']:,.0f} rows/s) "
+          f"at concurrency {peak['concurrency']}, p95 {peak['p95_ms']:,.1f} ms; {available_cpus()} CPUs")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'timestamp': datetime.now().isoformat(timespec='seconds'), 'model': model_name,
+                   'target': args.target, 'rate': args.rate, 'duration': args.duration,
+                   'mix': workload_mix, 'sizes': sizes, 'cpus': available_cpus(), 'levels': levels}, f, indent=2)
+    print(f"Saved {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Region shards vs monolithic model - accuracy, memory and latency
+
+Single-row requests replay test rows in order, so they follow the test
+set's regional mix; each is sent with its raw postal code, as the predict
+page does. Memory is the RSS growth of a fresh process that loads
+the model and serves those requests, measured once per model and LRU size.
+
+Usage:
+    python -m benchmarks.shards --cache-sizes 1,2,4 --requests 500 --raw-dir filled_data
+"""
+
+import time
+import argparse
+import joblib
+import numpy as np
+import multiprocessing
+from pathlib import Path
+
+from benchmarks.common import print_table
+from pipeline.timing import time_calls
+from pipeline.data import RAW_DATA_DIR, DATA_DIR, MODELS_DIR, load_training_matrices, load_training_keys
+from pipeline.metrics import regression_scores
+from pipeline.profiling import rss_mb
+from pipeline.serving import resolve_model_path
+from pipeline.shards import SHARDS_DIR, REGION_COLUMN, load_sharded_model, region_table
+
+
+def load_variant(models_dir, monolith_path, max_loaded):
+    """Monolithic model (max_loaded is None) or a fresh ShardedModel"""
+    if max_loaded is None:
+        return joblib.load(monolith_path)
+    return load_sharded_model(models_dir, max_loaded)
+
+
+def predict_kwargs(max_loaded, codes):
+    """Per-request keyword arguments: the postal code for shards, nothing for the monolith"""
+    if max_loaded is None:
+        return [{} for _ in codes]
+    return [{'postal_codes': code} for code in codes]
+
+
+def memory_probe(models_dir, monolith_path, max_loaded, requests, codes):
+    """RSS growth (MB) from loading a variant and serving ``requests`` row by row"""
+    import xgboost  # noqa: F401 - library import is not part of the model's footprint
+
+    before = rss_mb()
+    model = load_variant(models_dir, monolith_path, max_loaded)
+    for i, kwargs in enumerate(predict_kwargs(max_loaded, codes)):
+        model.predict(requests.iloc[[i]], **kwargs)
+    return rss_mb() - before
+
+
+def serve_rows(model, requests, request_kwargs):
+    """Per-request latencies (ms) for single-row predictions"""
+    samples = []
+    for i, kwargs in enumerate(request_kwargs):
+        row = requests.iloc[[i]]
+        start = time.perf_counter()
+        model.predict(row, **kwargs)
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.asarray(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark region shards against the monolithic model")
+    parser.add_argument('--model', default=None, help="Monolithic model (default: the model app.py serves)")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--raw-dir', default=str(RAW_DATA_DIR),
+                        help="Notebook 01 train_raw.csv/test_raw.csv, for the raw postal codes")
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--cache-sizes', default='1,2,4', help="Shard LRU sizes to compare")
+    parser.add_argument('--requests', type=int, default=500, help="Single-row requests replayed per variant")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    models_dir = Path(args.models_dir)
+    monolith_path = Path(args.model) if args.model else resolve_model_path(models_dir)
+    sharded = load_sharded_model(models_dir)
+    if sharded is None:
+        raise SystemExit(f"No shards in {models_dir / SHARDS_DIR}; run python -m pipeline.shards first")
+    _, X_test, _, y_test = load_training_matrices(args.data_dir)
+    _, codes_test = load_training_keys(REGION_COLUMN, args.raw_dir)
+    if len(codes_test) != len(X_test):
+        raise SystemExit(f"test_raw.csv in {args.raw_dir} does not line up with X_test.csv in {args.data_dir}")
+    requests, codes = X_test.iloc[:args.requests], codes_test.iloc[:args.requests].tolist()
+    batch, batch_codes = X_test.iloc[:args.batch_size], codes_test.iloc[:args.batch_size]
+
+    monolith = joblib.load(monolith_path)
+    sharded.max_loaded = len(sharded.index['shards'])
+    predictions = {'monolith': monolith.predict(X_test), 'sharded': sharded.predict(X_test, codes_test)}
+    print(f"Monolith: {monolith_path.name}; {len(sharded.index['shards'])} shards, "
+          f"{len(requests)} single-row requests over "
+          f"{len(set(sharded.shard_for(codes)))} shards\n")
+    print(region_table(codes_test, y_test, predictions, sharded.digits)
+          .to_string(index=False, float_format=lambda v: f"{v:,.4f}" if abs(v) < 10 else f"{v:,.0f}"))
+    print()
+
+    shard_bytes = sum(s['bytes'] for s in sharded.index['shards'].values())
+    variants = [('monolith', None)] + [(f'sharded lru={n}', int(n)) for n in args.cache_sizes.split(',')]
+    # Fresh process per variant so freed memory from earlier variants does not hide growth
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for label, max_loaded in variants:
+        with context.Pool(1) as pool:
+            memory = pool.apply(memory_probe, (models_dir, monolith_path, max_loaded, requests, codes))
+
+        model = load_variant(models_dir, monolith_path, max_loaded)
+        single = serve_rows(model, requests, predict_kwargs(max_loaded, codes))
+        batch_kwargs = {} if max_loaded is None else {'postal_codes': batch_codes}
+        many = time_calls(lambda: model.predict(batch, **batch_kwargs), repeat=5, warmup=1)
+        scores = regression_scores(y_test, predictions['monolith' if max_loaded is None else 'sharded'])
+        row = {
+            'model': label,
+            'test_r2': scores['r2'],
+            'test_rmse': scores['rmse'],
+            'disk_mb': (monolith_path.stat().st_size if max_loaded is None else shard_bytes) / 1e6,
+            'rss_mb': memory,
+            'single_p50_ms': float(np.percentile(single, 50)),
+            'single_p95_ms': float(np.percentile(single, 95)),
+            'batch_rows_per_sec': len(batch) / (many['p50_ms'] / 1000),
+        }
+        if max_loaded is not None:
+            stats = model.stats
+            row['hit_rate'] = stats['hits'] / max(stats['hits'] + stats['misses'], 1)
+            row['evictions'] = stats['evictions']
+        rows.append(row)
+
+    print_table(rows, list(rows[-1]))
+
+
+if __name__ == '__main__':
+    main()
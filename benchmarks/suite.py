@@ -0,0 +1,287 @@
+"""
+Benchmark suite - end-to-end performance checks with a stored baseline
+
+Runs every stage on synthetic MLS data from pipeline/synthetic.py (shaped
+by the schema artifacts in models/) generated from a fixed seed, so two runs
+on the same machine measure the same work:
+- ingestion: monthly CSVs read the notebook 01 way (rows/sec)
+- preprocessing: Preprocessor.fit_transform (notebook 02) time and peak memory
+- training: fit time per model family used in notebooks 03/04/06
+- serving: single-row and batch predict latency through the app's wrappers
+- pages: Streamlit render time of every page of app.py
+
+Results are written as JSON and compared metric by metric against a
+baseline file. A metric that is worse than the baseline by more than the
+tolerance counts as a regression, and the command exits non-zero.
+
+Usage:
+    python -m benchmarks.suite --save-baseline          # record benchmarks/baseline.json
+    python -m benchmarks.suite                          # compare against it
+    python -m benchmarks.suite --rows 200000 --skip pages
+"""
+
+import gc
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+
+from benchmarks.common import print_table
+from pipeline.timing import time_calls
+from pipeline.data import ROOT, MODELS_DIR, CACHE_DIR, load_month
+from pipeline.preprocessing import Preprocessor
+from pipeline.synthetic import raw_spec, generate_frame, load_schema_features, load_importance
+from pipeline.concurrency import ThreadBudget, BudgetedModel, available_cpus, configure_estimator
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+RESULTS_PATH = CACHE_DIR / 'benchmarks' / 'latest.json'
+STAGES = ['ingestion', 'preprocessing', 'training', 'serving', 'pages']
+PAGES = ["🏡 Home", "🎯 Predict", "📊 Analysis", "ℹ️ About"]
+SEED = 42
+
+
+def metric(value, unit, better='lower'):
+    return {'value': float(value), 'unit': unit, 'better': better}
+
+
+def synthetic_months(n_rows, n_months=4, seed=SEED):
+    """Raw monthly frames from the schema-driven generator in pipeline/synthetic.py"""
+    spec = raw_spec(load_schema_features(MODELS_DIR), load_importance(MODELS_DIR), seed=seed)
+    rng = np.random.default_rng(seed)
+    return [generate_frame(spec, n_rows // n_months, rng, f"2025-{m:02d}", key_prefix=f"B{m:02d}")
+            for m in range(1, n_months + 1)]
+
+
+def bench_ingestion(months, workdir, repeat):
+    """Notebook 01 path: read each monthly CSV and concatenate"""
+    paths = []
+    for i, df in enumerate(months, start=1):
+        path = Path(workdir) / f"CRMLSSold2025{i:02d}_filled.csv"
+        df.to_csv(path, index=False)
+        paths.append(path)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        combined = pd.concat([load_month(p) for p in paths], ignore_index=True)
+        timings.append(time.perf_counter() - start)
+    seconds = float(np.median(timings))
+    return combined, {
+        'ingestion.seconds': metric(seconds, 's'),
+        'ingestion.rows_per_sec': metric(len(combined) / seconds, 'rows/s', 'higher'),
+    }
+
+
+def bench_preprocessing(raw, repeat):
+    """Notebook 02 fit_transform: wall time, then peak traced memory in a separate pass"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        X, y = Preprocessor(reference_year=2025).fit_transform(raw)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    Preprocessor(reference_year=2025).fit_transform(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return X, y, {
+        'preprocessing.seconds': metric(np.median(timings), 's'),
+        'preprocessing.peak_mb': metric(peak / 1e6, 'MB'),
+        'preprocessing.n_features': metric(X.shape[1], 'columns', 'equal'),
+    }
+
+
+def training_models(threads):
+    """Model families from notebooks 03/04/06 with fixed seeds and benchmark-sized settings"""
+    from sklearn.linear_model import Ridge
+    from sklearn.ensemble import RandomForestRegressor
+    import xgboost as xgb
+
+    models = {
+        'ridge': Ridge(alpha=1.0),
+        'random_forest': RandomForestRegressor(n_estimators=50, max_depth=12, n_jobs=threads, random_state=SEED),
+        'xgboost': xgb.XGBRegressor(n_estimators=300, learning_rate=0.05, max_depth=7, subsample=0.8,
+                                    colsample_bytree=0.8, tree_method='hist', n_jobs=threads,
+                                    random_state=SEED),
+    }
+    try:
+        import lightgbm as lgb
+        models['lightgbm'] = lgb.LGBMRegressor(n_estimators=300, learning_rate=0.05, num_leaves=63,
+                                               n_jobs=threads, random_state=SEED, verbose=-1)
+    except ImportError:
+        pass
+    return models
+
+
+def bench_training(X, y, threads):
+    results, fitted = {}, {}
+    for name, model in training_models(threads).items():
+        start = time.perf_counter()
+        model.fit(X, y)
+        results[f'training.{name}.seconds'] = metric(time.perf_counter() - start, 's')
+        fitted[name] = model
+    return fitted, results
+
+
+def bench_serving(model, X, repeat, batch_size):
+    """Predict latency through BudgetedModel, as the app calls it"""
+    served = BudgetedModel(configure_estimator(model, ThreadBudget.for_serving().inner),
+                           ThreadBudget.for_serving())
+    single = X.iloc[[0]]
+    batch = X.iloc[:batch_size]
+    one = time_calls(lambda: served.predict(single), repeat=repeat)
+    many = time_calls(lambda: served.predict(batch), repeat=max(3, repeat // 20))
+    return {
+        'serving.single_p50_ms': metric(one['p50_ms'], 'ms'),
+        'serving.single_p95_ms': metric(one['p95_ms'], 'ms'),
+        'serving.batch_p50_ms': metric(many['p50_ms'], 'ms'),
+        'serving.batch_rows_per_sec': metric(len(batch) / (many['p50_ms'] / 1000), 'rows/s', 'higher'),
+    }
+
+
+def bench_pages(repeat):
+    """Render app.py and switch to every page with Streamlit's AppTest"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(ROOT / 'app.py'), default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    results = {'pages.first_render_ms': metric((time.perf_counter() - start) * 1000, 'ms')}
+
+    for page in PAGES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            at.sidebar.radio[0].set_value(page).run()
+            timings.append((time.perf_counter() - start) * 1000)
+        if at.exception:
+            raise RuntimeError(f"{page} raised: {at.exception[0].message}")
+        slug = page.split(' ', 1)[1].lower()
+        results[f'pages.{slug}_render_ms'] = metric(np.median(timings), 'ms')
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Per-metric comparison rows; ``regression`` is True when worse than tolerance allows"""
+    rows = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or current['better'] == 'equal':
+            rows.append({'metric': name, 'value': current['value'], 'baseline': base and base['value'],
+                         'change': '', 'regression': bool(base and base['value'] != current['value'])})
+            continue
+        change = (current['value'] - base['value']) / base['value'] if base['value'] else 0.0
+        worse = change > tolerance if current['better'] == 'lower' else change < -tolerance
+        rows.append({'metric': name, 'value': current['value'], 'baseline': base['value'],
+                     'change': f"{change * 100:+.1f}%", 'regression': worse})
+    return rows
+
+
+def run_suite(rows, repeat=3, skip=(), batch_size=10000, threads=None):
+    """Run every stage not in ``skip`` and return the flat metrics dict"""
+    threads = threads or available_cpus()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        months = synthetic_months(rows)
+        if 'ingestion' not in skip:
+            raw, stage = bench_ingestion(months, workdir, repeat)
+            results.update(stage)
+        else:
+            raw = pd.concat(months, ignore_index=True)
+
+    X, y, stage = bench_preprocessing(raw, repeat)
+    if 'preprocessing' not in skip:
+        results.update(stage)
+
+    split = int(len(X) * 0.8)
+    if 'training' not in skip or 'serving' not in skip:
+        fitted, stage = bench_training(X.iloc[:split], y.iloc[:split], threads)
+        if 'training' not in skip:
+            results.update(stage)
+        if 'serving' not in skip:
+            results.update(bench_serving(fitted['xgboost'], X.iloc[split:], repeat * 50, batch_size))
+
+    if 'pages' not in skip:
+        results.update(bench_pages(repeat))
+    return results
+
+
+def environment():
+    import sklearn
+    import xgboost
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': available_cpus(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'xgboost': xgboost.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the performance benchmark suite")
+    parser.add_argument('--rows', type=int, default=50000, help="Synthetic rows across all months")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--skip', nargs='*', default=[], choices=STAGES)
+    parser.add_argument('--output', default=str(RESULTS_PATH))
+    parser.add_argument('--baseline', default=str(BASELINE_PATH))
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed relative slowdown")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    results = run_suite(args.rows, args.repeat, set(args.skip), args.batch_size, args.threads)
+    report = {'environment': environment(), 'config': {'rows': args.rows, 'repeat': args.repeat,
+                                                       'batch_size': args.batch_size, 'seed': SEED},
+              'metrics': results}
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline {baseline_path}")
+        print_table([{'metric': k, 'value': v['value'], 'unit': v['unit']} for k, v in results.items()],
+                    ['metric', 'value', 'unit'])
+        return
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --save-baseline first")
+        print_table([{'metric': k, 'value': v['value'], 'unit': v['unit']} for k, v in results.items()],
+                    ['metric', 'value', 'unit'])
+        return
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get('config') != report['config']:
+        print(f"Warning: baseline config {baseline.get('config')} differs from this run")
+    rows = compare(results, baseline['metrics'], args.tolerance)
+    print_table(rows, ['metric', 'value', 'baseline', 'change', 'regression'])
+
+    regressions = [r['metric'] for r in rows if r['regression']]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance * 100:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
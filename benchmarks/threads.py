@@ -0,0 +1,107 @@
+"""
+Thread-budget scaling - outer workers x inner library threads
+
+For each split of the CPU budget (plus an oversubscribed n_jobs=-1-style
+configuration) this measures:
+- training: fitting several XGBoost models concurrently, as CV folds/trials do
+- serving: concurrent predict requests, as several app sessions do
+
+Usage:
+    python -m benchmarks.threads --tasks 8 --requests 200
+"""
+
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import print_table
+from pipeline.data import DATA_DIR, load_training_matrices
+from pipeline.backtest import DEFAULT_MODEL_PARAMS
+from pipeline.concurrency import ThreadBudget, available_cpus, limit_library_threads
+
+
+def budget_splits(total):
+    """(outer, inner) pairs covering the budget, then one oversubscribed pair"""
+    splits = []
+    outer = 1
+    while outer <= total:
+        splits.append((outer, total // outer))
+        outer *= 2
+    splits.append((total, total))
+    return splits
+
+
+def bench_training(X, y, outer, inner, tasks, n_estimators):
+    import xgboost as xgb
+
+    params = dict(DEFAULT_MODEL_PARAMS, n_estimators=n_estimators)
+
+    def fit(_):
+        xgb.XGBRegressor(**params, n_jobs=inner).fit(X, y)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=outer) as pool:
+        list(pool.map(fit, range(tasks)))
+    return time.perf_counter() - start
+
+
+def bench_serving(model, X, outer, requests, batch_size):
+    rng = np.random.default_rng(0)
+    starts = rng.integers(0, max(1, len(X) - batch_size), requests)
+    latencies = []
+
+    def call(i):
+        t0 = time.perf_counter()
+        model.predict(X.iloc[starts[i]:starts[i] + batch_size])
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=outer) as pool:
+        list(pool.map(call, range(requests)))
+    wall = time.perf_counter() - start
+    return wall, np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark outer x inner thread splits")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--sample', type=int, default=20000)
+    parser.add_argument('--tasks', type=int, default=8, help="Concurrent model fits (folds/trials)")
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    import xgboost as xgb
+
+    X_train, X_test, y_train, _ = load_training_matrices(args.data_dir)
+    idx = np.random.default_rng(42).permutation(len(X_train))[:args.sample]
+    X, y = X_train.iloc[idx].astype(np.float32), y_train[idx]
+
+    total = available_cpus()
+    model = xgb.XGBRegressor(**dict(DEFAULT_MODEL_PARAMS, n_estimators=300), n_jobs=total).fit(X, y)
+
+    rows = []
+    for outer, inner in budget_splits(total):
+        limit_library_threads(inner)
+        train_wall = bench_training(X, y, outer, inner, args.tasks, args.n_estimators)
+        model.set_params(n_jobs=inner)
+        serve_wall, p95 = bench_serving(model, X_test, outer, args.requests, args.batch_size)
+        rows.append({
+            'outer': outer,
+            'inner': inner,
+            'threads': outer * inner,
+            'oversubscribed': outer * inner > total,
+            'train_wall_s': train_wall,
+            'fits_per_min': args.tasks / train_wall * 60,
+            'requests_per_sec': args.requests / serve_wall,
+            'request_p95_ms': p95,
+        })
+
+    print(f"CPU budget: {total} ({ThreadBudget.for_serving()} for the app)")
+    print_table(rows, list(rows[0]))
+
+
+if __name__ == '__main__':
+    main()
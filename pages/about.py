@@ -4,6 +4,9 @@ About page - Project information and methodology
 
 import streamlit as st
 
+from pipeline.profiling import instrument
+
+@instrument('page.about')
 def show(metadata):
     """Display the about page"""
     
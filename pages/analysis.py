@@ -4,106 +4,57 @@ Analysis page - Model insights and visualizations
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import time
 from pathlib import Path
 
-def show(model, model_name, metadata):
-    """Display the analysis page"""
-    
-    st.markdown("""
-    <div class="hero">
-        <h1>📊 Model Analysis & Insights</h1>
-        <p>Deep dive into model performance and feature importance</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Get data
-    summary = metadata.get('summary', {})
-    feature_importance = metadata.get('feature_importance')
-    
-    # Performance metrics
-    st.markdown("## 🎯 Model Performance")
-    
-    best_r2 = summary.get('overall_best_r2', summary.get('best_r2', 0.839))
-    best_model = summary.get('overall_best', summary.get('best_model', 'XGBoost'))
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.metric("R² Score", f"{best_r2*100:.2f}%", 
-                 delta=f"{(best_r2 - 0.884)*100:+.2f}% vs baseline",
-                 delta_color="normal")
-    
-    with col2:
-        # Calculate RMSE if available (estimate)
-        rmse_estimate = 50000  # Placeholder
-        st.metric("RMSE", f"${rmse_estimate:,.0f}", 
-                 help="Root Mean Squared Error - average prediction error")
-    
-    with col3:
-        # MAE estimate
-        mae_estimate = 35000  # Placeholder
-        st.metric("MAE", f"${mae_estimate:,.0f}",
-                 help="Mean Absolute Error - average absolute prediction error")
+from pipeline.market_cube import DIMENSIONS, ALL, SKETCH_EDGES
+from pipeline.profiling import instrument
+from pipeline.undervalued import GROUP_COLUMNS
+
+# Sections rerun on their own when their widgets change (Streamlit >= 1.37)
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda f: f)
+
+# Figures are built once per model version and reused across reruns and sessions
+@st.cache_resource(show_spinner=False)
+def _feature_importance_figure(model_name, top_20):
+    """Top 20 feature importance bar chart"""
+    # Create horizontal bar chart
+    fig = go.Figure()
     
-    # Feature Importance
-    if feature_importance is not None and not feature_importance.empty:
-        st.markdown("## 🔍 Feature Importance")
-        
-        st.markdown("""
-        <div class="info-card">
-            <p>These features have the greatest impact on home price predictions. Understanding feature importance helps explain <strong>why</strong> the model makes certain predictions.</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Top 20 features
-        top_20 = feature_importance.head(20)
-        
-        # Create horizontal bar chart
-        fig = go.Figure()
-        
-        fig.add_trace(go.Bar(
-            y=top_20['feature'][::-1],
-            x=top_20['importance'][::-1],
-            orientation='h',
-            marker=dict(
-                color=top_20['importance'][::-1],
-                colorscale='Viridis',
-                showscale=True,
-                colorbar=dict(title="Importance")
-            ),
-            text=[f"{x:.4f}" for x in top_20['importance'][::-1]],
-            textposition='auto',
-        ))
-        
-        fig.update_layout(
-            title="Top 20 Most Important Features",
-            xaxis_title="Importance Score",
-            yaxis_title="Feature",
-            height=600,
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            font=dict(size=12),
-            showlegend=False,
-            margin=dict(l=200)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # Feature importance table
-        with st.expander("📋 View Full Feature Importance Table"):
-            st.dataframe(
-                feature_importance,
-                use_container_width=True,
-                height=400
-            )
-    else:
-        st.warning("⚠️ Feature importance data not available. Run notebook 05 to generate.")
+    fig.add_trace(go.Bar(
+        y=top_20['feature'][::-1],
+        x=top_20['importance'][::-1],
+        orientation='h',
+        marker=dict(
+            color=top_20['importance'][::-1],
+            colorscale='Viridis',
+            showscale=True,
+            colorbar=dict(title="Importance")
+        ),
+        text=[f"{x:.4f}" for x in top_20['importance'][::-1]],
+        textposition='auto',
+    ))
     
-    # Model comparison (if multiple models were tested)
-    st.markdown("## 📈 Model Evolution")
+    fig.update_layout(
+        title="Top 20 Most Important Features",
+        xaxis_title="Importance Score",
+        yaxis_title="Feature",
+        height=600,
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(size=12),
+        showlegend=False,
+        margin=dict(l=200)
+    )
     
+    return fig
+
+@st.cache_resource(show_spinner=False)
+def _evolution_figure(model_name, best_r2):
+    """R² progression across development stages"""
     # Create a progress chart showing improvement
     stages = ['Initial\nBaseline', 'After\nPreprocessing', 'Optimized\nXGBoost', 'Final\nEnsemble']
     r2_scores = [0.736, 0.778, 0.839, best_r2]
@@ -136,11 +87,11 @@ def show(model, model_name, metadata):
         font=dict(size=12)
     )
     
-    st.plotly_chart(fig, use_container_width=True)
-    
-    # Performance by price range (simulated data)
-    st.markdown("## 💰 Performance by Price Range")
-    
+    return fig
+
+@st.cache_resource(show_spinner=False)
+def _price_range_figure(model_name):
+    """Accuracy and sample count by price range"""
     price_ranges = ['<$200K', '$200-400K', '$400-600K', '$600-800K', '$800K-1M', '>$1M']
     r2_by_range = [0.78, 0.85, 0.87, 0.84, 0.81, 0.76]
     count_by_range = [1500, 8500, 7200, 3800, 1200, 559]
@@ -182,6 +133,253 @@ def show(model, model_name, metadata):
         legend=dict(x=0.7, y=1.0)
     )
     
+    return fig
+
+@st.cache_resource(show_spinner=False)
+def _error_figure(model_name):
+    """Prediction error histogram"""
+    # Simulated error distribution
+    errors = np.random.normal(0, 35000, 1000)
+    
+    fig = go.Figure()
+    fig.add_trace(go.Histogram(
+        x=errors/1000,
+        nbinsx=50,
+        marker_color='#667eea',
+        opacity=0.7,
+        name='Error Distribution'
+    ))
+    
+    fig.update_layout(
+        title="Prediction Error Distribution",
+        xaxis_title="Error ($1000s)",
+        yaxis_title="Frequency",
+        height=350,
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="white",
+        showlegend=False
+    )
+    
+    return fig
+
+@fragment
+@instrument('analysis.market_explorer')
+def show_market_explorer(cube):
+    """Drill-downs by city/postal code/property type/month, answered from the cube"""
+    st.markdown("## 🏘️ Market Explorer")
+    
+    filters = {}
+    cols = st.columns(3)
+    for col, dim in zip(cols, ['City', 'PostalCode', 'PropertyType']):
+        with col:
+            filters[dim] = st.selectbox(dim, [ALL] + cube.values(dim), key=f"market_{dim}")
+    by = st.radio("Break down by", DIMENSIONS, index=DIMENSIONS.index('Month'), horizontal=True,
+                  key="market_by")
+    
+    start = time.perf_counter()
+    cell = cube.cell(**filters)
+    rows = cube.breakdown(by, **filters)
+    sketch = cube.distribution(**filters)
+    lookup_ms = (time.perf_counter() - start) * 1000
+    
+    if cell is None or rows.empty:
+        st.info("No sales match this selection.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Sales", f"{int(cell['count']):,}")
+    with col2:
+        st.metric("Median Price", f"${cell['median_price']:,.0f}")
+    with col3:
+        st.metric("Median $/sqft", f"${cell['median_ppsf']:,.0f}" if pd.notna(cell['median_ppsf']) else "n/a")
+    
+    if by == 'Month':
+        rows = rows.sort_index()
+    else:
+        rows = rows.sort_values('count', ascending=False).head(25)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig = go.Figure()
+        fig.add_trace(go.Bar(
+            x=rows.index.astype(str),
+            y=rows['median_price'],
+            error_y=dict(type='data', symmetric=False,
+                         array=rows['p75'] - rows['median_price'],
+                         arrayminus=rows['median_price'] - rows['p25']),
+            marker_color='#667eea',
+            customdata=rows[['count', 'median_ppsf']],
+            hovertemplate="%{x}<br>Median: $%{y:,.0f}<br>Sales: %{customdata[0]:,}"
+                          "<br>$/sqft: %{customdata[1]:,.0f}<extra></extra>",
+        ))
+        fig.update_layout(
+            title=f"Median Price by {by} (bars: 25th-75th percentile)",
+            yaxis_title="Close Price ($)",
+            height=400,
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="white",
+            showlegend=False
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        centers = np.sqrt(SKETCH_EDGES[:-1] * SKETCH_EDGES[1:])
+        nonzero = np.flatnonzero(sketch)
+        span = slice(nonzero[0], nonzero[-1] + 1)
+        fig = go.Figure()
+        fig.add_trace(go.Bar(
+            x=centers[span] / 1000,
+            y=sketch[span],
+            marker_color='#f5576c',
+            opacity=0.8
+        ))
+        fig.update_layout(
+            title="Price Distribution",
+            xaxis_title="Close Price ($1000s, log scale)",
+            yaxis_title="Sales",
+            xaxis_type='log',
+            height=400,
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="white",
+            showlegend=False
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.caption(f"Answered from the pre-aggregated cube of {cube.n_sales:,} sales in {lookup_ms:.1f} ms")
+
+@fragment
+@instrument('analysis.undervalued')
+def show_undervalued(results):
+    """Top listings by predicted versus list price, per city or postal code"""
+    st.markdown("## 💎 Undervalued Listings")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Listings Scanned", f"{results['rows']:,}")
+    with col2:
+        share = results['below_interval'] / max(results['priced'], 1)
+        st.metric("Listed Below Valuation Interval", f"{share:.1%}")
+    with col3:
+        st.metric("Scan Time", f"{results['wall_time']:.1f}s")
+    
+    level = st.radio("Rank within", ['Overall'] + list(GROUP_COLUMNS), horizontal=True, key="undervalued_level")
+    if level == 'Overall':
+        rows = results['top']['overall']
+    else:
+        table = results['top'][level]
+        # Areas with the strongest candidate first
+        areas = table.groupby(level)['z_score'].max().sort_values(ascending=False).index.tolist()
+        area = st.selectbox(level, areas, key="undervalued_area")
+        rows = table[table[level] == area]
+    
+    if rows.empty:
+        st.info("No priced listings in the last scan.")
+        return
+    
+    formats = {
+        'ListPrice': '${:,.0f}',
+        'predicted_price': '${:,.0f}',
+        'interval_low': '${:,.0f}',
+        'interval_high': '${:,.0f}',
+        'gap': '${:,.0f}',
+        'gap_pct': '{:+.1%}',
+        'z_score': '{:.2f}',
+        'LivingArea': '{:,.0f}',
+        'BedroomsTotal': '{:.0f}',
+        'BathroomsTotalInteger': '{:.0f}',
+        'YearBuilt': '{:.0f}',
+    }
+    rows = rows.drop(columns=['rank', 'below_interval'], errors='ignore')
+    st.dataframe(
+        rows.style.format({k: v for k, v in formats.items() if k in rows.columns}),
+        use_container_width=True,
+        hide_index=True
+    )
+    calibration = "per-price-band model error" if results['calibrated'] else "a flat 15% model error"
+    st.caption(f"z-score: list price below the valuation in units of {calibration}. "
+               f"Scanned {results['generated']} with {results['model']}.")
+
+@instrument('page.analysis')
+def show(model, model_name, metadata):
+    """Display the analysis page"""
+    
+    st.markdown("""
+    <div class="hero">
+        <h1>📊 Model Analysis & Insights</h1>
+        <p>Deep dive into model performance and feature importance</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Get data
+    summary = metadata.get('summary', {})
+    feature_importance = metadata.get('feature_importance')
+    
+    # Performance metrics
+    st.markdown("## 🎯 Model Performance")
+    
+    best_r2 = summary.get('overall_best_r2', summary.get('best_r2', 0.839))
+    best_model = summary.get('overall_best', summary.get('best_model', 'XGBoost'))
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("R² Score", f"{best_r2*100:.2f}%", 
+                 delta=f"{(best_r2 - 0.884)*100:+.2f}% vs baseline",
+                 delta_color="normal")
+    
+    with col2:
+        # Calculate RMSE if available (estimate)
+        rmse_estimate = 50000  # Placeholder
+        st.metric("RMSE", f"${rmse_estimate:,.0f}", 
+                 help="Root Mean Squared Error - average prediction error")
+    
+    with col3:
+        # MAE estimate
+        mae_estimate = 35000  # Placeholder
+        st.metric("MAE", f"${mae_estimate:,.0f}",
+                 help="Mean Absolute Error - average absolute prediction error")
+    
+    # Feature Importance
+    if feature_importance is not None and not feature_importance.empty:
+        st.markdown("## 🔍 Feature Importance")
+        
+        st.markdown("""
+        <div class="info-card">
+            <p>These features have the greatest impact on home price predictions. Understanding feature importance helps explain <strong>why</strong> the model makes certain predictions.</p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Top 20 features
+        top_20 = feature_importance.head(20)
+        
+        fig = _feature_importance_figure(model_name, top_20)
+        
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Feature importance table
+        with st.expander("📋 View Full Feature Importance Table"):
+            st.dataframe(
+                feature_importance,
+                use_container_width=True,
+                height=400
+            )
+    else:
+        st.warning("⚠️ Feature importance data not available. Run notebook 05 to generate.")
+    
+    # Model comparison (if multiple models were tested)
+    st.markdown("## 📈 Model Evolution")
+    
+    fig = _evolution_figure(model_name, best_r2)
+    
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Performance by price range (simulated data)
+    st.markdown("## 💰 Performance by Price Range")
+    
+    fig = _price_range_figure(model_name)
+    
     st.plotly_chart(fig, use_container_width=True)
     
     st.markdown("""
@@ -191,34 +389,21 @@ def show(model, model_name, metadata):
     </div>
     """, unsafe_allow_html=True)
     
+    # Market drill-downs (python -m pipeline.market_cube)
+    if metadata.get('market_cube') is not None:
+        show_market_explorer(metadata['market_cube'])
+    
+    # Active inventory ranked by predicted vs list price (python -m pipeline.undervalued scan)
+    if metadata.get('undervalued') is not None:
+        show_undervalued(metadata['undervalued'])
+    
     # Error distribution
     st.markdown("## 📉 Prediction Error Analysis")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        # Simulated error distribution
-        import numpy as np
-        errors = np.random.normal(0, 35000, 1000)
-        
-        fig = go.Figure()
-        fig.add_trace(go.Histogram(
-            x=errors/1000,
-            nbinsx=50,
-            marker_color='#667eea',
-            opacity=0.7,
-            name='Error Distribution'
-        ))
-        
-        fig.update_layout(
-            title="Prediction Error Distribution",
-            xaxis_title="Error ($1000s)",
-            yaxis_title="Frequency",
-            height=350,
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="white",
-            showlegend=False
-        )
+        fig = _error_figure(model_name)
         
         st.plotly_chart(fig, use_container_width=True)
     
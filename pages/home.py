@@ -5,6 +5,9 @@ Home page - Landing page with key metrics and overview
 import streamlit as st
 import plotly.graph_objects as go
 
+from pipeline.profiling import instrument
+
+@instrument('page.home')
 def show(model, model_name, metadata):
     """Display the home page"""
     
@@ -5,37 +5,74 @@ Predict page - Interactive prediction tool
 import streamlit as st
 import pandas as pd
 import numpy as np
+import plotly.graph_objects as go
 from datetime import datetime
 
-def show(model, model_name, metadata):
-    """Display the prediction page"""
-    
-    st.markdown("""
-    <div class="hero">
-        <h1>🎯 Predict Home Price</h1>
-        <p>Enter property details to get an instant valuation</p>
-    </div>
-    """, unsafe_allow_html=True)
+from pipeline.dtypes import apply_dtypes
+from pipeline.sensitivity import SWEEP_RANGES, ENGINEERED_COLUMNS, sweep_values, sensitivity, refresh_engineered
+from pipeline.profiling import instrument, span
+
+# Sections rerun on their own when their widgets change (Streamlit >= 1.37)
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda f: f)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _sensitivity_grid(_model, model_name, base_row, features, n_points, predict_kwargs):
+    """Score a 1-D or 2-D sweep in one batch (cached per input row and sweep)"""
+    grids = {f: sweep_values(f, n_points) for f in features}
+    return sensitivity(_model, base_row, grids, **predict_kwargs)
+
+@fragment
+@instrument('predict.sensitivity_panel')
+def show_sensitivity(model, model_name, base_row, predict_kwargs):
+    """What-if panel: price response to one or two features"""
+    st.markdown("### 📈 What-If Sensitivity")
     
-    if model is None:
-        st.error("⚠️ Model not loaded. Please check the models directory.")
+    sweepable = [f for f in SWEEP_RANGES if f in base_row.columns]
+    if not sweepable:
         return
     
-    # Get expected features
-    expected_features = metadata.get('expected_features', [])
-    feature_schema = metadata.get('feature_schema', {})
+    col1, col2 = st.columns(2)
+    with col1:
+        features = st.multiselect("Features to sweep (1 or 2)", sweepable,
+                                  default=sweepable[:1], max_selections=2)
+    with col2:
+        n_points = st.slider("Grid points per feature", min_value=10, max_value=200,
+                             value=100 if len(features) < 2 else 20, step=10)
     
-    if not expected_features:
-        st.warning("Feature schema not found. Using simplified prediction form.")
-        expected_features = ['LivingArea', 'BedroomsTotal', 'BathroomsTotalInteger', 
-                           'YearBuilt', 'GarageSpaces']
+    if not features:
+        return
     
-    st.markdown("## Property Details")
+    with span('predict.sensitivity'):
+        grid = _sensitivity_grid(model, model_name, base_row, tuple(features), n_points, predict_kwargs)
     
-    # Create tabs for different input methods
-    tab1, tab2 = st.tabs(["📝 Simple Form", "🔧 Advanced"])
+    if len(features) == 1:
+        fig = go.Figure(go.Scatter(
+            x=grid[features[0]], y=grid['prediction'],
+            mode='lines', line=dict(color='#667eea', width=3)
+        ))
+        fig.update_layout(xaxis_title=features[0], yaxis_title="Predicted Price ($)")
+    else:
+        heat = grid.pivot(index=features[1], columns=features[0], values='prediction')
+        fig = go.Figure(go.Heatmap(
+            z=heat.values, x=heat.columns, y=heat.index,
+            colorscale='Viridis', colorbar=dict(title="Price ($)")
+        ))
+        fig.update_layout(xaxis_title=features[0], yaxis_title=features[1])
     
-    with tab1:
+    fig.update_layout(
+        title="Predicted Price Response",
+        height=400,
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="white"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"{len(grid):,} variants of the current property scored in one batch")
+
+@fragment
+@instrument('predict.form')
+def _prediction_section(model, model_name, metadata, expected_features):
+    """Input form and valuation; submitting reruns only this fragment"""
+    with st.form("predict_form"):
         st.markdown("### Basic Information")
         
         col1, col2 = st.columns(2)
@@ -57,107 +94,199 @@ def show(model, model_name, metadata):
         with col1:
             city = st.text_input("City", value="Baton Rouge")
             postal_code = st.text_input("Postal Code", value="70808")
+            latitude = st.number_input("Latitude", min_value=-90.0, max_value=90.0, value=30.4515, format="%.4f")
+            longitude = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=-91.1871, format="%.4f")
         
         with col2:
             property_type = st.selectbox("Property Type", 
                 ["Single Family Residential", "Condo/Townhouse", "Multi-Family", "Other"])
             condition = st.selectbox("Condition", ["Excellent", "Good", "Average", "Fair", "Poor"])
         
-        # Predict button
-        if st.button("🔮 Predict Price", use_container_width=True, type="primary"):
-            with st.spinner("Analyzing property..."):
-                # Create a feature vector (simplified for demo)
-                # In production, this would use the full feature set
-                features = {
-                    'LivingArea': living_area,
-                    'BedroomsTotal': bedrooms,
-                    'BathroomsTotalInteger': bathrooms,
-                    'YearBuilt': year_built,
-                    'GarageSpaces': garage,
-                    'StoriesTotal': stories,
-                }
+        # Predict button - inputs above are only sent when the form is submitted
+        submitted = st.form_submit_button("🔮 Predict Price", use_container_width=True, type="primary")
+    
+    if submitted:
+        with st.spinner("Analyzing property..."):
+            # Create a feature vector (simplified for demo)
+            # In production, this would use the full feature set
+            features = {
+                'LivingArea': living_area,
+                'BedroomsTotal': bedrooms,
+                'BathroomsTotalInteger': bathrooms,
+                'YearBuilt': year_built,
+                'GarageSpaces': garage,
+                'StoriesTotal': stories,
+                'Latitude': latitude,
+                'Longitude': longitude,
+            }
+            
+            # Region-sharded serving (HOME_PRICE_SHARDED=1) routes on the raw postal code, passed beside X
+            shard_for = getattr(model, 'shard_for', None)
+            predict_kwargs = {'postal_codes': postal_code} if shard_for is not None else {}
+            
+            # For demo, create a dummy dataframe with all expected features
+            # Set most to 0 and only fill in what we have
+            X = pd.DataFrame(0, index=[0], columns=expected_features if expected_features else features.keys())
+            
+            # Fill in the features we have
+            for key, value in features.items():
+                if key in X.columns:
+                    X[key] = value
+            
+            # BuildingAge/TotalRooms/HasGarage from the inputs, as the what-if sweep recomputes them
+            X = refresh_engineered(X)
+            
+            # Sketch the input against the training distribution (before the mixed-dtype cast, which is slower to read).
+            # Only the columns the form sets: the zero-filled rest would all look like drift
+            drift_monitor = metadata.get('drift_monitor')
+            if drift_monitor is not None:
+                observed = [c for c in list(features) + ENGINEERED_COLUMNS if c in X.columns]
+                drift_monitor.observe(X[observed])
+            
+            # Match the compact training dtypes instead of upcasting to float64
+            feature_dtypes = metadata.get('feature_dtypes')
+            if feature_dtypes:
+                X = apply_dtypes(X, feature_dtypes)
+            
+            try:
+                # Make prediction
+                with span('predict.model'):
+                    prediction = model.predict(X, **predict_kwargs)[0]
+                st.session_state['predict_base_row'] = X
+                st.session_state['predict_kwargs'] = predict_kwargs
+                
+                # Display result
+                st.markdown("<br>", unsafe_allow_html=True)
+                st.markdown("""
+                <div style="text-align: center; padding: 3rem; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 1rem; color: white; box-shadow: 0 10px 40px rgba(0,0,0,0.2);">
+                    <h2 style="margin: 0; font-size: 1.5rem; opacity: 0.9;">Estimated Home Value</h2>
+                    <h1 style="margin: 1rem 0; font-size: 4rem; font-weight: 800;">${:,.0f}</h1>
+                    <p style="margin: 0; font-size: 1.2rem; opacity: 0.9;">Based on {} analysis</p>
+                </div>
+                """.format(prediction, model_name.replace('_', ' ').replace('.joblib', '')), unsafe_allow_html=True)
+                
+                # Name the shard that priced this home
+                if shard_for is not None:
+                    st.caption(f"Priced by the `{shard_for(postal_code)[0]}` shard ({city} {postal_code})")
+                
+                # Confidence range (±10%)
+                lower = prediction * 0.9
+                upper = prediction * 1.1
+                
+                st.markdown("<br>", unsafe_allow_html=True)
+                
+                col1, col2, col3 = st.columns(3)
                 
-                # For demo, create a dummy dataframe with all expected features
-                # Set most to 0 and only fill in what we have
-                X = pd.DataFrame(0, index=[0], columns=expected_features if expected_features else features.keys())
+                with col1:
+                    st.markdown(f"""
+                    <div class="info-card" style="text-align: center;">
+                        <h4 style="color: #667eea; margin: 0;">Conservative</h4>
+                        <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${lower:,.0f}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
                 
-                # Fill in the features we have
-                for key, value in features.items():
-                    if key in X.columns:
-                        X[key] = value
+                with col2:
+                    st.markdown(f"""
+                    <div class="info-card" style="text-align: center; border-left: 4px solid #f5576c;">
+                        <h4 style="color: #f5576c; margin: 0;">Most Likely</h4>
+                        <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${prediction:,.0f}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
                 
-                try:
-                    # Make prediction
-                    prediction = model.predict(X)[0]
-                    
-                    # Display result
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    st.markdown("""
-                    <div style="text-align: center; padding: 3rem; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 1rem; color: white; box-shadow: 0 10px 40px rgba(0,0,0,0.2);">
-                        <h2 style="margin: 0; font-size: 1.5rem; opacity: 0.9;">Estimated Home Value</h2>
-                        <h1 style="margin: 1rem 0; font-size: 4rem; font-weight: 800;">${:,.0f}</h1>
-                        <p style="margin: 0; font-size: 1.2rem; opacity: 0.9;">Based on {} analysis</p>
+                with col3:
+                    st.markdown(f"""
+                    <div class="info-card" style="text-align: center;">
+                        <h4 style="color: #667eea; margin: 0;">Optimistic</h4>
+                        <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${upper:,.0f}</p>
                     </div>
-                    """.format(prediction, model_name.replace('_', ' ').replace('.joblib', '')), unsafe_allow_html=True)
-                    
-                    # Confidence range (±10%)
-                    lower = prediction * 0.9
-                    upper = prediction * 1.1
-                    
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.markdown(f"""
-                        <div class="info-card" style="text-align: center;">
-                            <h4 style="color: #667eea; margin: 0;">Conservative</h4>
-                            <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${lower:,.0f}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col2:
-                        st.markdown(f"""
-                        <div class="info-card" style="text-align: center; border-left: 4px solid #f5576c;">
-                            <h4 style="color: #f5576c; margin: 0;">Most Likely</h4>
-                            <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${prediction:,.0f}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col3:
-                        st.markdown(f"""
-                        <div class="info-card" style="text-align: center;">
-                            <h4 style="color: #667eea; margin: 0;">Optimistic</h4>
-                            <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${upper:,.0f}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    # Property summary
-                    st.markdown("### 📋 Property Summary")
-                    
-                    summary_col1, summary_col2 = st.columns(2)
-                    
-                    with summary_col1:
-                        st.markdown(f"""
-                        - **Living Area:** {living_area:,} sq ft
-                        - **Bedrooms:** {bedrooms}
-                        - **Bathrooms:** {bathrooms}
-                        - **Year Built:** {year_built}
-                        """)
-                    
-                    with summary_col2:
-                        st.markdown(f"""
-                        - **Garage:** {garage} spaces
-                        - **Stories:** {stories}
-                        - **Property Type:** {property_type}
-                        - **Condition:** {condition}
-                        """)
-                    
-                    st.info("💡 **Tip:** This prediction is based on historical data and market trends. Actual sale prices may vary based on current market conditions, negotiation, and other factors.")
-                    
-                except Exception as e:
-                    st.error(f"❌ Prediction failed: {e}")
-                    st.info("This might be due to missing features in the simplified form. Try using the Advanced tab or check the model requirements.")
+                    """, unsafe_allow_html=True)
+                
+                # Property summary
+                st.markdown("### 📋 Property Summary")
+                
+                summary_col1, summary_col2 = st.columns(2)
+                
+                with summary_col1:
+                    st.markdown(f"""
+                    - **Living Area:** {living_area:,} sq ft
+                    - **Bedrooms:** {bedrooms}
+                    - **Bathrooms:** {bathrooms}
+                    - **Year Built:** {year_built}
+                    """)
+                
+                with summary_col2:
+                    st.markdown(f"""
+                    - **Garage:** {garage} spaces
+                    - **Stories:** {stories}
+                    - **Property Type:** {property_type}
+                    - **Condition:** {condition}
+                    """)
+                
+                # Nearest sold homes from the training set
+                comparables = metadata.get('comparables')
+                if comparables is not None:
+                    st.markdown("### 🏘️ Comparable Sales")
+                    with span('predict.comparables'):
+                        comps = comparables.query(latitude, longitude, k=5, LivingArea=living_area,
+                                                  BedroomsTotal=bedrooms, YearBuilt=year_built)
+                    formats = {
+                        'distance_km': '{:.2f} km',
+                        'ClosePrice': '${:,.0f}',
+                        'LivingArea': '{:,.0f}',
+                        'BedroomsTotal': '{:.0f}',
+                        'BathroomsTotalInteger': '{:.0f}',
+                        'YearBuilt': '{:.0f}',
+                        'PricePerSqFt': '${:,.0f}',
+                    }
+                    st.dataframe(
+                        comps.style.format({k: v for k, v in formats.items() if k in comps.columns}),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                    st.caption(f"Median comparable: ${comps['ClosePrice'].median():,.0f}")
+                
+                st.info("💡 **Tip:** This prediction is based on historical data and market trends. Actual sale prices may vary based on current market conditions, negotiation, and other factors.")
+                
+            except Exception as e:
+                st.error(f"❌ Prediction failed: {e}")
+                st.info("This might be due to missing features in the simplified form. Try using the Advanced tab or check the model requirements.")
+    
+    # What-if curves around the last predicted property
+    if 'predict_base_row' in st.session_state:
+        show_sensitivity(model, model_name, st.session_state['predict_base_row'],
+                         st.session_state.get('predict_kwargs', {}))
+
+@instrument('page.predict')
+def show(model, model_name, metadata):
+    """Display the prediction page"""
+    
+    st.markdown("""
+    <div class="hero">
+        <h1>🎯 Predict Home Price</h1>
+        <p>Enter property details to get an instant valuation</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    if model is None:
+        st.error("⚠️ Model not loaded. Please check the models directory.")
+        return
+    
+    # Get expected features
+    expected_features = metadata.get('expected_features', [])
+    feature_schema = metadata.get('feature_schema', {})
+    
+    if not expected_features:
+        st.warning("Feature schema not found. Using simplified prediction form.")
+        expected_features = ['LivingArea', 'BedroomsTotal', 'BathroomsTotalInteger', 
+                           'YearBuilt', 'GarageSpaces']
+    
+    st.markdown("## Property Details")
+    
+    # Create tabs for different input methods
+    tab1, tab2 = st.tabs(["📝 Simple Form", "🔧 Advanced"])
+    
+    with tab1:
+        _prediction_section(model, model_name, metadata, expected_features)
     
     with tab2:
         st.markdown("### Advanced Feature Input")
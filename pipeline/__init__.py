@@ -0,0 +1 @@
+# Pipeline module for Home Price Prediction offline stages
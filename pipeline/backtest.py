@@ -0,0 +1,178 @@
+"""
+Rolling-origin backtest - train on months 1..k, test on month k+1, for every k
+
+Folds run in parallel in a process pool. The raw monthly CSVs are parsed
+once into the shared cache, and each fold's preprocessed matrices are saved
+as .npy files that later runs (or other models) memory-map instead of
+rebuilding. The ThreadBudget splits the allocated CPUs between workers and
+each worker's BLAS/OpenMP/XGBoost threads so the pool never oversubscribes.
+
+Each fold scores its test month chunk by chunk into a MetricsAccumulator
+(pipeline/metrics.py). The fold accumulators are merged into pooled metrics
+over every test row, with a per-price-band breakdown, and saved next to the
+results table.
+
+Usage:
+    python -m pipeline.backtest --workers 4 --min-train-months 3
+"""
+
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipeline.data import (RAW_DATA_DIR, MODELS_DIR, CACHE_DIR, list_monthly_files,
+                           month_label, cache_months, load_cached_months)
+from pipeline.preprocessing import Preprocessor, split_target, outlier_mask
+from pipeline.metrics import MetricsAccumulator
+from pipeline.concurrency import ThreadBudget, worker_initializer
+
+DEFAULT_MODEL_PARAMS = {
+    'n_estimators': 300,
+    'learning_rate': 0.05,
+    'max_depth': 7,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'random_state': 42,
+    'tree_method': 'hist',
+}
+EVAL_CHUNK_ROWS = 50000
+
+
+def fold_cache_dir(cache_dir, train_paths, test_path):
+    """Directory holding one fold's preprocessed matrices"""
+    key = '+'.join(Path(p).stem for p in list(train_paths) + [test_path])
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return Path(cache_dir) / 'folds' / f"{month_label(test_path)}_{digest}"
+
+
+def prepare_fold(train_paths, test_path, cache_dir=CACHE_DIR):
+    """Build (or memory-map) X_train, y_train, X_test, y_test for one fold"""
+    fold_dir = fold_cache_dir(cache_dir, train_paths, test_path)
+    names = ['X_train', 'y_train', 'X_test', 'y_test']
+    files = [fold_dir / f'{n}.npy' for n in names]
+
+    if all(f.exists() for f in files):
+        return tuple(np.load(f, mmap_mode='r') for f in files)
+
+    train_df = load_cached_months(train_paths)
+    test_df = load_cached_months([test_path])
+
+    prep = Preprocessor()
+    X_train, y_train = prep.fit_transform(train_df)
+    X_test, y_test = split_target(test_df)
+    X_test = prep.transform(X_test).reset_index(drop=True)
+    y_test = y_test.reset_index(drop=True)
+    keep = outlier_mask(y_test)
+    X_test, y_test = X_test[keep], y_test[keep]
+
+    arrays = [X_train.to_numpy(dtype=np.float32), y_train.to_numpy(dtype=np.float64),
+              X_test.to_numpy(dtype=np.float32), y_test.to_numpy(dtype=np.float64)]
+    fold_dir.mkdir(parents=True, exist_ok=True)
+    for f, arr in zip(files, arrays):
+        tmp = f.with_suffix('.tmp.npy')
+        np.save(tmp, arr)
+        tmp.replace(f)
+    with open(fold_dir / 'feature_columns.json', 'w') as fh:
+        json.dump(prep.feature_columns_, fh)
+    return tuple(np.load(f, mmap_mode='r') for f in files)
+
+
+def run_fold(train_paths, test_path, model_params, threads, cache_dir=CACHE_DIR):
+    """Train and score a single fold inside a worker process; returns (result, metrics)"""
+    import xgboost as xgb
+
+    start = time.time()
+    X_train, y_train, X_test, y_test = prepare_fold(train_paths, test_path, cache_dir)
+    prep_time = time.time() - start
+
+    model = xgb.XGBRegressor(**model_params, n_jobs=threads)
+    start = time.time()
+    model.fit(X_train, y_train)
+    train_time = time.time() - start
+
+    metrics = MetricsAccumulator()
+    for i in range(0, len(y_test), EVAL_CHUNK_ROWS):
+        rows = slice(i, i + EVAL_CHUNK_ROWS)
+        metrics.update(y_test[rows], model.predict(X_test[rows]))
+
+    result = {
+        'test_month': month_label(test_path),
+        'train_months': len(train_paths),
+        'n_train': int(len(y_train)),
+        'n_test': int(len(y_test)),
+        'n_features': int(X_train.shape[1]),
+        'prep_time': prep_time,
+        'train_time': train_time,
+    }
+    scores = metrics.scores()
+    result.update({k: scores[k] for k in ('r2', 'rmse', 'mape', 'mae')})
+    return result, metrics
+
+
+def run_backtest(raw_dir=RAW_DATA_DIR, cache_dir=CACHE_DIR, min_train_months=1,
+                 workers=None, threads_per_fold=None, model_params=None):
+    """Run every rolling-origin fold; returns the per-month results table and pooled metrics"""
+    files = list_monthly_files(raw_dir)
+    if len(files) <= min_train_months:
+        raise ValueError(f"Need more than {min_train_months} monthly files, found {len(files)}")
+
+    print(f"Caching {len(files)} monthly files...")
+    cached = cache_months(files, cache_dir)
+
+    folds = [(cached[:k], cached[k]) for k in range(min_train_months, len(cached))]
+    budget = ThreadBudget().plan(workers or len(folds))
+    threads = threads_per_fold or budget.inner
+    params = dict(DEFAULT_MODEL_PARAMS, **(model_params or {}))
+
+    print(f"Running {len(folds)} folds on {budget.outer} workers x {threads} threads")
+    results = []
+    pooled = MetricsAccumulator()
+    with ProcessPoolExecutor(max_workers=budget.outer, initializer=worker_initializer,
+                             initargs=(threads,)) as pool:
+        futures = [pool.submit(run_fold, train, test, params, threads, cache_dir)
+                   for train, test in folds]
+        for future in as_completed(futures):
+            res, metrics = future.result()
+            pooled.merge(metrics)
+            print(f"  {res['test_month']}: R²={res['r2']:.4f} RMSE=${res['rmse']:,.0f} "
+                  f"MAPE={res['mape']*100:.2f}% ({res['train_time']:.1f}s)")
+            results.append(res)
+
+    return pd.DataFrame(results).sort_values('test_month').reset_index(drop=True), pooled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest across monthly MLS files")
+    parser.add_argument('--raw-dir', default=str(RAW_DATA_DIR))
+    parser.add_argument('--cache-dir', default=str(CACHE_DIR))
+    parser.add_argument('--min-train-months', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--threads-per-fold', type=int, default=None)
+    parser.add_argument('--output', default=str(MODELS_DIR / 'backtest_results.csv'))
+    args = parser.parse_args()
+
+    start = time.time()
+    results, pooled = run_backtest(args.raw_dir, args.cache_dir, args.min_train_months,
+                                   args.workers, args.threads_per_fold)
+    print("\n" + results.to_string(index=False))
+    results.to_csv(args.output, index=False)
+
+    overall = pooled.scores()
+    print(f"\nAll test months: R²={overall['r2']:.4f} RMSE=${overall['rmse']:,.0f} "
+          f"MAPE={overall['mape']*100:.2f}% ({overall['mape_excluded']:,} targets below the MAPE floor)")
+    bands = pooled.band_scores()
+    print(pd.DataFrame(bands).T[['n', 'r2', 'rmse', 'mape', 'pct_error_p05', 'pct_error_p95']]
+          .to_string(float_format=lambda v: f"{v:,.4f}" if abs(v) < 10 else f"{v:,.0f}"))
+    metrics_path = Path(args.output).with_name('backtest_metrics.json')
+    with open(metrics_path, 'w') as f:
+        json.dump({'overall': overall, 'price_bands': bands}, f, indent=2)
+    print(f"\nSaved {args.output} and {metrics_path.name} ({time.time() - start:.1f}s total)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+"""
+Batch scoring - nightly revaluation of raw listing files
+
+Raw CSVs are streamed in fixed-size chunks. Each chunk goes through the
+fitted Preprocessor and the saved model in a pool of worker processes. Each
+worker loads the preprocessor and model once and runs on its share of the
+ThreadBudget. Predictions are written to one partition file per chunk
+(output/<source>/part-00000.csv). A checkpoint file records completed
+partitions, so a killed job resumes at the first missing chunk. With each
+checkpoint the score store is saved and the merged metrics and drift
+sketches of the completed chunks go to _progress.joblib; a resumed job
+restores them, so its report still covers every row. Throughput
+and per-stage timings (read, preprocess, predict, write) are reported at the
+end and saved next to the partitions.
+
+With ``--store``, rows whose ListingKey, content hash and model version
+match the score store (pipeline/store.py) reuse their stored prediction, so
+only new or edited listings are featurized and predicted.
+
+When models/drift_reference.joblib exists, every worker also sketches its
+chunks' raw rows and model inputs (pipeline/drift.py). The merged sketches
+are saved as _drift.joblib, and their drift summary goes into the report.
+
+Model columns the preprocessor does not produce are zero-filled. They are
+checked once before scoring: any are reported, and more than
+MAX_MISSING_COLUMNS of the model's columns (e.g. a model trained on notebook
+02 names against the sanitized Preprocessor output) stops the run.
+
+Input files that still carry ClosePrice (e.g. rescoring sold listings) are
+also scored against it. Every chunk updates a MetricsAccumulator
+(pipeline/metrics.py), and the merged accumulator is saved as
+_metrics.joblib. Its overall and per-price-band metrics go into the report.
+
+Usage:
+    python -m pipeline.preprocessing   # once, to save models/preprocessor.joblib
+    python -m pipeline.batch_score filled_data/active_listings.csv --output scores/2025-08-01 --workers 8
+    python -m pipeline.batch_score filled_data/active_listings.csv --output scores/2025-08-02 --store cache/score_store.pkl
+"""
+
+import json
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from pipeline.data import MODELS_DIR, TARGET
+from pipeline.preprocessing import load_preprocessor, clean_column_name
+from pipeline.serving import resolve_model_path
+from pipeline.concurrency import ThreadBudget, limit_library_threads, configure_estimator
+from pipeline.store import KEY_COLUMN, ScoreStore, model_version, row_hashes, hash_schema
+from pipeline.drift import BATCH_SAMPLE_ROWS, load_references, save_sketch, drift_report, summarize
+from pipeline.metrics import MetricsAccumulator
+
+CHUNK_SIZE = 50000
+CHECKPOINT_FILE = '_checkpoint.json'
+REPORT_FILE = '_report.json'
+DRIFT_FILE = '_drift.joblib'
+METRICS_FILE = '_metrics.joblib'
+PROGRESS_FILE = '_progress.joblib'
+# Share of the model's columns the preprocessor may fail to produce before scoring is refused
+MAX_MISSING_COLUMNS = 0.01
+STAGES = ['read', 'lookup', 'preprocess', 'predict', 'write']
+
+# Loaded once per worker process by _init_worker
+_worker = {}
+
+
+def model_feature_columns(model, models_dir=MODELS_DIR):
+    """Feature order the model was trained on"""
+    names = getattr(model, 'feature_names_in_', None)
+    if names is not None:
+        return list(names)
+    path = Path(models_dir) / 'expected_feature_columns.json'
+    if path.exists():
+        with open(path) as f:
+            return [clean_column_name(c) for c in json.load(f)]
+    return None
+
+
+def check_model_columns(available, columns, max_missing=MAX_MISSING_COLUMNS):
+    """Model ``columns`` not in ``available`` (they would be zero-filled when scoring).
+
+    Prints a warning if any are missing and raises ValueError if more than
+    ``max_missing`` of them are: a naming mismatch would otherwise give
+    plausible but wrong prices for every row.
+    """
+    if columns is None:
+        return []
+    available = set(available)
+    missing = [c for c in columns if c not in available]
+    if len(missing) > max_missing * len(columns):
+        raise ValueError(f"{len(missing)} of {len(columns)} model columns are not produced by the preprocessor "
+                         f"(e.g. {missing[:5]}); was the model trained on the same feature names?")
+    if missing:
+        print(f"Warning: {len(missing)} model columns are not produced by the preprocessor "
+              f"and will be zero-filled: {missing[:10]}")
+    return missing
+
+
+def score_frame(df, prep, model, columns=None, sketches=None):
+    """Raw rows -> predictions, with (preprocess, predict) seconds.
+
+    ``sketches`` ({'raw': ..., 'features': ...} FeatureSketches) are updated
+    with the raw rows and the model inputs; their time counts as preprocessing.
+    """
+    start = time.perf_counter()
+    sketches = sketches or {}
+    if 'raw' in sketches:
+        sketches['raw'].update(df, BATCH_SAMPLE_ROWS)
+    X = prep.transform(df)
+    if columns is not None:
+        X = X.reindex(columns=columns, fill_value=0)
+    if 'features' in sketches:
+        sketches['features'].update(X, BATCH_SAMPLE_ROWS)
+    prep_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preds = np.asarray(model.predict(X), dtype=float)
+    return preds, prep_time, time.perf_counter() - start
+
+
+def _init_worker(models_dir, model_path, threads):
+    limit_library_threads(threads)
+    prep = load_preprocessor(models_dir)
+    if prep is None:
+        raise FileNotFoundError(f"No preprocessor in {models_dir}; run python -m pipeline.preprocessing")
+    model = configure_estimator(joblib.load(model_path), threads)
+    _worker.update(prep=prep, model=model, columns=model_feature_columns(model, models_dir),
+                   drift=load_references(models_dir))
+
+
+def _write_partition(frame, path, fmt):
+    tmp = path.with_name(path.name + '.tmp')
+    if fmt == 'parquet':
+        frame.to_parquet(tmp, index=False)
+    else:
+        frame.to_csv(tmp, index=False)
+    tmp.replace(path)
+
+
+def score_chunk(chunk, out_path, fmt='csv', reused=None, target=None):
+    """Worker task: score one chunk and write its partition.
+
+    ``reused`` holds rows of the same chunk whose predictions came from the
+    score store; they are merged into the partition without rescoring.
+    With ``target`` (actual prices of ``chunk``), the chunk's metrics are returned too.
+    """
+    preds, prep_time, predict_time = np.empty(0), 0.0, 0.0
+    sketches = {name: reference.empty() for name, reference in _worker['drift'].items()}
+    if len(chunk):
+        preds, prep_time, predict_time = score_frame(chunk, _worker['prep'], _worker['model'],
+                                                     _worker['columns'], sketches)
+
+    start = time.perf_counter()
+    result = pd.DataFrame({'source_row': chunk.index.to_numpy()})
+    if KEY_COLUMN in chunk.columns:
+        result.insert(0, KEY_COLUMN, chunk[KEY_COLUMN].to_numpy())
+    result['predicted_price'] = preds
+    if reused is not None and len(reused):
+        result = pd.concat([result, reused[result.columns]]).sort_values('source_row')
+    _write_partition(result, Path(out_path), fmt)
+    write_time = time.perf_counter() - start
+
+    metrics = MetricsAccumulator().update(target, preds) if target is not None else None
+    return {'rows': len(chunk), 'predictions': preds, 'drift': sketches, 'metrics': metrics,
+            'preprocess': prep_time, 'predict': predict_time, 'write': write_time}
+
+
+def partition_path(output_dir, source, chunk_id, fmt='csv'):
+    return Path(output_dir) / Path(source).stem / f"part-{chunk_id:05d}.{fmt}"
+
+
+def load_checkpoint(output_dir):
+    """Completed partitions per source file, e.g. {'listings.csv': [0, 1, 2]}"""
+    path = Path(output_dir) / CHECKPOINT_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return {source: set(chunks) for source, chunks in json.load(f).items()}
+
+
+def save_checkpoint(output_dir, done):
+    path = Path(output_dir) / CHECKPOINT_FILE
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({source: sorted(chunks) for source, chunks in done.items()}, f)
+    tmp.replace(path)
+
+
+def load_progress(output_dir):
+    """State saved with the checkpoint: {'done', 'drift', 'metrics'}, or None"""
+    path = Path(output_dir) / PROGRESS_FILE
+    return joblib.load(path) if path.exists() else None
+
+
+def save_progress(output_dir, done, drift, metrics):
+    """Completed chunks with their merged drift sketches and metrics, then the checkpoint"""
+    save_sketch({'done': done, 'drift': drift, 'metrics': metrics}, Path(output_dir) / PROGRESS_FILE)
+    save_checkpoint(output_dir, done)
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE, keep_target=False):
+    """Yield (chunk_id, chunk, read seconds); chunk index is the row number in the file.
+
+    The target column is dropped unless ``keep_target``.
+    """
+    reader = pd.read_csv(path, chunksize=chunk_size, low_memory=False)
+    chunk_id = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(reader)
+        except StopIteration:
+            return
+        if not keep_target:
+            chunk = chunk.drop(columns=[TARGET], errors='ignore')
+        yield chunk_id, chunk, time.perf_counter() - start
+        chunk_id += 1
+
+
+def run_batch(inputs, output_dir, models_dir=MODELS_DIR, model_path=None, chunk_size=CHUNK_SIZE,
+              workers=None, fmt='csv', resume=True, store_path=None):
+    """Score every row of ``inputs`` into partitioned files under ``output_dir``"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_path = Path(model_path) if model_path else resolve_model_path(models_dir)
+    prep = load_preprocessor(models_dir)
+    if prep is None:
+        raise FileNotFoundError(f"No preprocessor in {models_dir}; run python -m pipeline.preprocessing")
+    # Once, before any worker starts: a schema mismatch should stop the run, not zero-fill it
+    check_model_columns(prep.feature_columns_, model_feature_columns(joblib.load(model_path), models_dir))
+
+    store = ScoreStore(store_path) if store_path else None
+    # Hash each raw column by the rule the fitted preprocessing implies, not the chunk's inferred dtype
+    schema = hash_schema(prep) if store is not None else None
+    version = model_version(model_path, models_dir)
+
+    # Metrics and drift of checkpointed chunks come back from _progress.joblib
+    progress = load_progress(output_dir) if resume else None
+    if progress is not None:
+        done, drift, metrics = progress['done'], progress['drift'], progress['metrics']
+    else:
+        done = load_checkpoint(output_dir) if resume else {}
+        drift, metrics = {}, None
+        if done:
+            print(f"Warning: no {PROGRESS_FILE} in {output_dir}; metrics and drift will only cover the rows "
+                  f"scored in this run")
+
+    budget = ThreadBudget().plan(workers or ThreadBudget().total)
+    print(f"Scoring with {model_path.name} on {budget.outer} workers x {budget.inner} threads")
+
+    timings = dict.fromkeys(STAGES, 0.0)
+    rows = skipped = reused_rows = 0
+    max_pending = 2 * budget.outer
+    start = time.time()
+
+    with ProcessPoolExecutor(max_workers=budget.outer, initializer=_init_worker,
+                             initargs=(str(models_dir), str(model_path), budget.inner)) as pool:
+        pending = {}
+
+        def collect(futures):
+            nonlocal rows, metrics
+            for future in futures:
+                source, chunk_id, keys, hashes, reused_metrics = pending.pop(future)
+                stats = future.result()
+                rows += stats['rows']
+                for stage in STAGES[2:]:
+                    timings[stage] += stats[stage]
+                if store is not None:
+                    store.update(keys, hashes, stats['predictions'], version)
+                for name, sketch in stats['drift'].items():
+                    drift[name] = drift[name].merge(sketch) if name in drift else sketch
+                for chunk_metrics in (stats['metrics'], reused_metrics):
+                    if chunk_metrics is not None:
+                        metrics = metrics.merge(chunk_metrics) if metrics is not None else chunk_metrics
+                done.setdefault(source, set()).add(chunk_id)
+            # Store first: a chunk recorded as done must never lose its store updates
+            if store is not None:
+                store.save()
+            save_progress(output_dir, done, drift, metrics)
+            elapsed = time.time() - start
+            print(f"  {rows:,} rows scored ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+        for source in inputs:
+            name = Path(source).name
+            (output_dir / Path(source).stem).mkdir(exist_ok=True)
+            for chunk_id, chunk, read_time in iter_chunks(source, chunk_size, keep_target=True):
+                timings['read'] += read_time
+                out_path = partition_path(output_dir, source, chunk_id, fmt)
+                if chunk_id in done.get(name, ()) and out_path.exists():
+                    skipped += len(chunk)
+                    continue
+                target = (pd.to_numeric(chunk.pop(TARGET), errors='coerce').to_numpy()
+                          if TARGET in chunk.columns else None)
+
+                reused = keys = hashes = reused_metrics = None
+                if store is not None:
+                    lookup_start = time.perf_counter()
+                    keys = (chunk[KEY_COLUMN].to_numpy() if KEY_COLUMN in chunk.columns
+                            else np.full(len(chunk), None, dtype=object))
+                    hashes = row_hashes(chunk, schema)
+                    fresh = store.changed(keys, hashes, version)
+                    reused = pd.DataFrame({
+                        KEY_COLUMN: keys[~fresh],
+                        'source_row': chunk.index.to_numpy()[~fresh],
+                        'predicted_price': store.predictions(keys[~fresh]),
+                    })
+                    if target is not None:
+                        # Stored predictions are scored here (counted once the chunk completes);
+                        # the workers only see fresh rows
+                        reused_metrics = MetricsAccumulator().update(target[~fresh], reused['predicted_price'])
+                        target = target[fresh]
+                    chunk, keys, hashes = chunk[fresh], keys[fresh], hashes[fresh]
+                    reused_rows += len(reused)
+                    timings['lookup'] += time.perf_counter() - lookup_start
+
+                future = pool.submit(score_chunk, chunk, out_path, fmt, reused, target)
+                pending[future] = (name, chunk_id, keys, hashes, reused_metrics)
+                if len(pending) >= max_pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+        if pending:
+            finished, _ = wait(pending)
+            collect(finished)
+
+    if store is not None:
+        store.save()
+    # Skipped chunks are only in the metrics and drift if their state was restored
+    partial = bool(skipped) and progress is None
+    drift_summary = {}
+    if drift:
+        save_sketch(drift, output_dir / DRIFT_FILE)
+        references = load_references(models_dir)
+        drift_summary = {name: summarize(drift_report(references[name], sketch), sketch)
+                         for name, sketch in drift.items()}
+
+    metrics_report = {}
+    if metrics is not None:
+        save_sketch(metrics, output_dir / METRICS_FILE)
+        metrics_report = {'overall': metrics.scores(), 'price_bands': metrics.band_scores()}
+
+    wall = time.time() - start
+    report = {
+        'model': model_path.name,
+        'model_version': version,
+        'inputs': [str(p) for p in inputs],
+        'rows_scored': rows,
+        'rows_reused': reused_rows,
+        'rows_skipped': skipped,
+        # True when resumed chunks are missing from the metrics and drift below (no _progress.joblib)
+        'partial': partial,
+        'workers': budget.outer,
+        'threads_per_worker': budget.inner,
+        'chunk_size': chunk_size,
+        'wall_time': wall,
+        'rows_per_sec': (rows + reused_rows) / wall if wall else 0.0,
+        # read/lookup are wall time in the parent; the other stages are summed over workers
+        'stage_seconds': timings,
+        'drift': drift_summary,
+        # Only when the inputs carry actual prices; covers every completed chunk unless 'partial'
+        'metrics': metrics_report,
+    }
+    with open(output_dir / REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def load_scores(output_dir):
+    """Concatenate all partitions written by run_batch"""
+    parts = sorted(Path(output_dir).glob('*/part-*.*'))
+    frames = [pd.read_parquet(p) if p.suffix == '.parquet' else pd.read_csv(p) for p in parts]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score raw listing files in parallel chunks")
+    parser.add_argument('inputs', nargs='+', help="Raw listing CSV files")
+    parser.add_argument('--output', required=True, help="Directory for partitioned predictions")
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--model', default=None, help="Model file (default: same choice as the app)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--no-resume', action='store_true', help="Ignore the checkpoint and rescore everything")
+    parser.add_argument('--store', default=None,
+                        help="Score store to reuse unchanged listings from, e.g. cache/score_store.pkl")
+    args = parser.parse_args()
+
+    report = run_batch(args.inputs, args.output, args.models_dir, args.model, args.chunk_size,
+                       args.workers, args.format, resume=not args.no_resume, store_path=args.store)
+
+    print(f"\nScored {report['rows_scored']:,} rows, reused {report['rows_reused']:,} unchanged "
+          f"({report['rows_skipped']:,} resumed from checkpoint) "
+          f"in {report['wall_time']:.1f}s -> {report['rows_per_sec']:,.0f} rows/s")
+    for stage, seconds in report['stage_seconds'].items():
+        print(f"  {stage:<10} {seconds:8.2f}s")
+    for name, summary in report['drift'].items():
+        flagged = ', '.join(summary['drift'][:10]) or 'none'
+        print(f"  drift ({name}): {len(summary['drift'])} columns drifting ({flagged})")
+    if report['partial']:
+        print(f"  WARNING: metrics and drift exclude the {report['rows_skipped']:,} resumed rows")
+    if report['metrics']:
+        overall = report['metrics']['overall']
+        print(f"  accuracy: R²={overall['r2']:.4f} RMSE=${overall['rmse']:,.0f} MAPE={overall['mape']*100:.2f}% "
+              f"on {overall['n']:,} rows with a {TARGET}")
+        for band, scores in report['metrics']['price_bands'].items():
+            print(f"    {band:<14} {scores['n']:>9,} rows  RMSE=${scores['rmse']:,.0f}  MAPE={scores['mape']*100:.2f}%")
+    print(f"Saved partitions and {REPORT_FILE} to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
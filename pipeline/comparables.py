@@ -0,0 +1,130 @@
+"""
+Comparable sales - BallTree over Latitude/Longitude for nearest sold homes
+
+Built offline from the raw training rows behind the notebook 02 matrix
+(train_raw.csv, aligned by load_training_rows), not from the matrix itself:
+there, missing coordinates and attributes are already median-imputed, so
+every listing without a location would sit at the median lat/lon and show
+up as a comparable for any home near it. Rows without valid coordinates are
+left out, and missing attributes stay NaN. The index is a haversine BallTree plus float32 attribute arrays, persisted to
+models/comparables_index.joblib. A query returns the k nearest sales in
+sub-millisecond time without scanning all rows. When property attributes
+are given, a wider geographic candidate set is re-ranked on distance plus
+scaled LivingArea/BedroomsTotal/YearBuilt differences.
+
+Usage:
+    python -m pipeline.comparables
+"""
+
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from pipeline.data import RAW_DATA_DIR, TARGET, MODELS_DIR, load_training_rows
+
+COMPARABLES_INDEX = 'comparables_index.joblib'
+EARTH_RADIUS_KM = 6371.0
+ATTRIBUTES = ['LivingArea', 'BedroomsTotal', 'BathroomsTotalInteger', 'YearBuilt']
+# Attributes used when re-ranking, and how many km one standard deviation is worth
+RERANK_WEIGHTS = {'LivingArea': 2.0, 'BedroomsTotal': 1.0, 'YearBuilt': 1.0}
+
+
+class ComparablesIndex:
+    """Nearest sold homes by great-circle distance"""
+
+    def __init__(self, latitude, longitude, prices, attributes=None):
+        from sklearn.neighbors import BallTree
+
+        coords = np.radians(np.column_stack([latitude, longitude]).astype(np.float64))
+        self.tree = BallTree(coords, metric='haversine')
+        self.prices = np.asarray(prices, dtype=np.float32)
+        self.attributes = {name: np.asarray(values, dtype=np.float32)
+                           for name, values in (attributes or {}).items()}
+        self.scales = {name: float(np.nanstd(values)) or 1.0 for name, values in self.attributes.items()}
+
+    def __len__(self):
+        return len(self.prices)
+
+    @classmethod
+    def from_raw(cls, df, target_col=TARGET):
+        """Build from raw sold rows (un-imputed); rows without valid coordinates or price are skipped"""
+        lat = pd.to_numeric(df['Latitude'], errors='coerce')
+        lon = pd.to_numeric(df['Longitude'], errors='coerce')
+        y = pd.to_numeric(df[target_col], errors='coerce')
+        valid = (lat.between(-90, 90) & lon.between(-180, 180) & ~((lat == 0) & (lon == 0)) & y.notna()).to_numpy()
+        attributes = {name: pd.to_numeric(df[name], errors='coerce').to_numpy()[valid]
+                      for name in ATTRIBUTES if name in df.columns}
+        return cls(lat.to_numpy()[valid], lon.to_numpy()[valid], y.to_numpy()[valid], attributes)
+
+    def nearest(self, latitude, longitude, k=5, candidates=10, **subject):
+        """Row indices and distances (km) of the k nearest comparables.
+
+        Keyword arguments named after ATTRIBUTES (e.g. LivingArea=2000)
+        switch on re-ranking of ``k * candidates`` geographic neighbours.
+        """
+        rerank = {name: value for name, value in subject.items()
+                  if name in RERANK_WEIGHTS and name in self.attributes and value is not None}
+        n = min(len(self), k * candidates if rerank else k)
+        dist, idx = self.tree.query(np.radians([[latitude, longitude]]), k=n)
+        dist_km = dist[0] * EARTH_RADIUS_KM
+        idx = idx[0]
+
+        if rerank:
+            score = dist_km.copy()
+            for name, value in rerank.items():
+                diff = np.abs(self.attributes[name][idx] - value) / self.scales[name]
+                # A sale missing the attribute counts as its worst candidate, not as a match
+                worst = np.nanmax(diff) if np.isfinite(diff).any() else 0.0
+                score += RERANK_WEIGHTS[name] * np.where(np.isnan(diff), worst, diff)
+            order = np.argsort(score)[:k]
+            idx, dist_km = idx[order], dist_km[order]
+        return idx, dist_km
+
+    def query(self, latitude, longitude, k=5, candidates=10, **subject):
+        """The k nearest comparables as a DataFrame for display"""
+        idx, dist_km = self.nearest(latitude, longitude, k, candidates, **subject)
+        comps = pd.DataFrame({'distance_km': dist_km, 'ClosePrice': self.prices[idx]})
+        for name, values in self.attributes.items():
+            comps[name] = values[idx]
+        if 'LivingArea' in comps.columns:
+            comps['PricePerSqFt'] = comps['ClosePrice'] / comps['LivingArea'].where(comps['LivingArea'] > 0)
+        return comps
+
+
+def load_comparables(models_dir=MODELS_DIR):
+    """Load the persisted index, or None if it has not been built"""
+    path = Path(models_dir) / COMPARABLES_INDEX
+    return joblib.load(path) if path.exists() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the comparable-sales spatial index")
+    parser.add_argument('--raw-dir', default=str(RAW_DATA_DIR), help="Notebook 01 train_raw.csv/test_raw.csv")
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    args = parser.parse_args()
+
+    train, _ = load_training_rows(['Latitude', 'Longitude'] + ATTRIBUTES, args.raw_dir)
+    start = time.time()
+    index = ComparablesIndex.from_raw(train)
+    print(f"Indexed {len(index):,} of {len(train):,} sales ({len(train) - len(index):,} without valid "
+          f"coordinates left out) in {time.time() - start:.2f}s")
+
+    path = Path(args.models_dir) / COMPARABLES_INDEX
+    joblib.dump(index, path)
+    print(f"Saved {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+    # Quick latency check against the median location
+    lat, lon = train['Latitude'].median(), train['Longitude'].median()
+    start = time.perf_counter()
+    for _ in range(200):
+        index.nearest(lat, lon, k=5, LivingArea=2000, BedroomsTotal=3, YearBuilt=2000)
+    print(f"Lookup latency: {(time.perf_counter() - start) / 200 * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    # Run from the importable module so pickled classes resolve to pipeline.comparables
+    from pipeline.comparables import main
+    main()
@@ -0,0 +1,113 @@
+"""
+Thread budget - one place that decides outer vs inner parallelism
+
+``n_jobs=-1`` everywhere means every layer (CV folds, search trials, RF
+trees, XGBoost/OpenMP, BLAS, concurrent app sessions) assumes it owns the
+whole machine. On an 8-CPU Slurm allocation that multiplies into dozens of
+threads per core. A ThreadBudget starts from the CPUs actually allocated to
+this process and splits them into ``outer`` workers (folds, trials,
+concurrent requests) times ``inner`` library threads per worker.
+
+Environment overrides:
+    HOME_PRICE_THREADS                  total CPUs to use
+    HOME_PRICE_CONCURRENT_PREDICTIONS   concurrent predict calls in the app
+"""
+
+import os
+import threading
+
+THREAD_ENV_VARS = [
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+]
+
+# Parameter names libraries use for their thread count
+THREAD_PARAMS = ('n_jobs', 'nthread', 'thread_count')
+
+
+def available_cpus():
+    """CPUs this process may use: override, Slurm allocation, affinity, then cpu_count"""
+    for var in ('HOME_PRICE_THREADS', 'SLURM_CPUS_PER_TASK'):
+        value = os.environ.get(var)
+        if value and value.isdigit() and int(value) > 0:
+            return int(value)
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class ThreadBudget:
+    """Split ``total`` CPUs into ``outer`` workers x ``inner`` threads"""
+
+    def __init__(self, total=None, outer=1):
+        self.total = total or available_cpus()
+        self.outer = max(1, min(outer, self.total))
+        self.inner = max(1, self.total // self.outer)
+
+    def __repr__(self):
+        return f"ThreadBudget(total={self.total}, outer={self.outer}, inner={self.inner})"
+
+    def plan(self, outer_tasks):
+        """Budget with as many outer workers as there are tasks (up to total)"""
+        return ThreadBudget(self.total, outer_tasks)
+
+    @classmethod
+    def for_serving(cls):
+        """Budget for the Streamlit app: concurrent predictions x threads each"""
+        total = available_cpus()
+        concurrent = os.environ.get('HOME_PRICE_CONCURRENT_PREDICTIONS', '')
+        outer = int(concurrent) if concurrent.isdigit() else min(4, total)
+        return cls(total, outer)
+
+
+def limit_library_threads(n_threads):
+    """Cap OpenMP/BLAS pools in this process (and anything it spawns)"""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        return threadpool_limits(limits=n_threads)
+    except ImportError:
+        return None
+
+
+def worker_initializer(n_threads):
+    """ProcessPoolExecutor initializer that applies the inner thread cap"""
+    limit_library_threads(n_threads)
+
+
+def configure_estimator(estimator, n_threads):
+    """Set every n_jobs/nthread/thread_count parameter, nested ones included"""
+    if not hasattr(estimator, 'get_params'):
+        return estimator
+    params = estimator.get_params(deep=True)
+    # None means "all cores" for XGBoost, so unset values are capped too
+    names = [name for name in params if name.split('__')[-1] in THREAD_PARAMS]
+    for name in sorted(names, key=lambda n: n.count('__')):
+        try:
+            estimator.set_params(**{name: n_threads})
+        except ValueError:
+            pass
+    return estimator
+
+
+class BudgetedModel:
+    """Allow at most ``budget.outer`` concurrent predictions, each on ``budget.inner`` threads"""
+
+    def __init__(self, model, budget):
+        self.model = model
+        self.budget = budget
+        self._slots = threading.BoundedSemaphore(budget.outer)
+
+    def __getattr__(self, name):
+        if name == 'model':
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def predict(self, X, **kwargs):
+        with self._slots:
+            return self.model.predict(X, **kwargs)
@@ -0,0 +1,142 @@
+"""
+Data loading - monthly MLS files and on-disk caches shared by pipeline stages
+"""
+
+import re
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RAW_DATA_DIR = ROOT / 'filled_data'
+DATA_DIR = ROOT / 'data'
+MODELS_DIR = ROOT / 'models'
+CACHE_DIR = ROOT / 'cache'
+
+TARGET = 'ClosePrice'
+MONTH_PATTERN = 'CRMLSSold*_filled.csv'
+
+
+def list_monthly_files(raw_dir=RAW_DATA_DIR):
+    """Return the monthly CRMLSSold*_filled.csv files in chronological order"""
+    files = sorted(Path(raw_dir).glob(MONTH_PATTERN))
+    if not files:
+        raise FileNotFoundError(f"No filled CSV files found in {raw_dir}")
+    return files
+
+
+def month_label(path):
+    """Turn CRMLSSold202508_filled.csv into '2025-08'"""
+    match = re.search(r'(\d{4})(\d{2})', Path(path).name)
+    if match is None:
+        return Path(path).stem
+    return f"{match.group(1)}-{match.group(2)}"
+
+
+def file_fingerprint(path):
+    """Cheap cache key for a source file (name, size, mtime)"""
+    stat = Path(path).stat()
+    key = f"{Path(path).name}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def load_month(path):
+    """Load one monthly file the same way notebook 01 does"""
+    df = pd.read_csv(path, low_memory=False)
+    df['_source_file'] = Path(path).name
+    return df
+
+
+def cache_months(files, cache_dir=CACHE_DIR):
+    """Parse each monthly CSV once and keep a pickled copy in the cache.
+
+    Returns a list of cached pickle paths in the same order as ``files``.
+    Re-parsing the CSVs dominates the cost of every stage that reads raw
+    months, so workers load these pickles instead.
+    """
+    cache_dir = Path(cache_dir) / 'months'
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    cached = []
+    for path in files:
+        target = cache_dir / f"{Path(path).stem}_{file_fingerprint(path)}.pkl"
+        if not target.exists():
+            df = load_month(path)
+            tmp = target.with_suffix('.tmp')
+            df.to_pickle(tmp)
+            tmp.replace(target)
+            print(f"  Cached {Path(path).name}: {len(df):,} rows")
+        cached.append(target)
+    return cached
+
+
+def load_cached_months(cached_paths):
+    """Concatenate cached monthly frames"""
+    return pd.concat([pd.read_pickle(p) for p in cached_paths], ignore_index=True)
+
+
+def load_training_matrices(data_dir=DATA_DIR, sanitize=True):
+    """Load notebook 02 outputs as (X_train, X_test, y_train, y_test)"""
+    from pipeline.preprocessing import clean_column_name
+
+    data_dir = Path(data_dir)
+    X_train = pd.read_csv(data_dir / 'X_train.csv')
+    X_test = pd.read_csv(data_dir / 'X_test.csv')
+    y_train = pd.read_csv(data_dir / 'y_train.csv')[TARGET].values
+    y_test = pd.read_csv(data_dir / 'y_test.csv')[TARGET].values
+    if sanitize:
+        X_train.columns = [clean_column_name(c) for c in X_train.columns]
+        X_test.columns = [clean_column_name(c) for c in X_test.columns]
+    return X_train, X_test, y_train, y_test
+
+
+def load_training_rows(columns, raw_dir=RAW_DATA_DIR, dtype=None):
+    """Raw ``columns`` and the target for the rows behind load_training_matrices, as (train, test) frames.
+
+    Notebook 02 keeps train_raw.csv/test_raw.csv in order and only drops
+    target outliers, so replaying that mask lines the raw values up with
+    X_train/X_test: before imputation and clipping, and including columns
+    the matrices only hold encoded.
+    """
+    from pipeline.preprocessing import split_target, outlier_mask
+
+    frames = []
+    for name in ('train_raw.csv', 'test_raw.csv'):
+        df = pd.read_csv(Path(raw_dir) / name, usecols=list(dict.fromkeys(list(columns) + [TARGET])), dtype=dtype)
+        _, y = split_target(df)
+        frames.append(df[outlier_mask(y)].reset_index(drop=True))
+    return tuple(frames)
+
+
+def load_training_keys(column, raw_dir=RAW_DATA_DIR):
+    """Raw ``column`` of the rows behind load_training_matrices, as (train, test) string Series"""
+    train, test = load_training_rows([column], raw_dir, dtype={column: str})
+    return train[column], test[column]
+
+
+def parse_postal_codes(values):
+    """5-digit ZIP codes as floats (NaN if unknown) from int, float or text (ZIP+4 too) values"""
+    values = pd.Series(values)
+    codes = pd.to_numeric(values, errors='coerce')
+    if codes.isna().any():
+        # ZIP+4 text such as '90210-1234'
+        zip5 = values.astype(str).str.extract(r'^\s*(\d{5})', expand=False)
+        codes = codes.fillna(pd.to_numeric(zip5, errors='coerce'))
+    codes = codes.to_numpy(dtype=float, copy=True)
+    # 0 is what the app's forms fill in for a missing postal code
+    codes[~((codes > 0) & (codes < 100000) & (codes % 1 == 0))] = np.nan
+    return codes
+
+
+def load_feature_importance(models_dir=MODELS_DIR, sanitize=True):
+    """Feature importance (gain) from feature_importance.json, highest first"""
+    from pipeline.preprocessing import clean_column_name
+
+    with open(Path(models_dir) / 'feature_importance.json') as f:
+        importance = pd.Series(json.load(f), dtype=float)
+    if sanitize:
+        importance.index = [clean_column_name(c) for c in importance.index]
+        importance = importance.groupby(level=0).sum()
+    return importance.sort_values(ascending=False)
@@ -0,0 +1,111 @@
+"""
+Distillation - train a compact student on the teacher's predictions
+
+The served XGBoost teacher (1,000 trees, depth 15) is far larger than
+interactive requests need. The student is a few hundred shallow trees fit
+to the teacher's predictions on the training set, restricted to the top
+features from feature_importance.json. It is saved next to the teacher as
+models/student_model.joblib together with its measured accuracy gap.
+
+Usage:
+    python -m pipeline.distill --top-features 60 --n-estimators 300 --max-depth 6
+"""
+
+import json
+import time
+import argparse
+import joblib
+from pathlib import Path
+from datetime import datetime
+
+from pipeline.data import DATA_DIR, MODELS_DIR, load_training_matrices, load_feature_importance
+from pipeline.metrics import regression_scores
+from pipeline.serving import DistilledModel, STUDENT_MODEL, resolve_model_path
+
+DEFAULT_STUDENT_PARAMS = {
+    'n_estimators': 300,
+    'learning_rate': 0.1,
+    'max_depth': 6,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'random_state': 42,
+    'tree_method': 'hist',
+}
+
+
+def select_student_features(importance, columns, top_features):
+    """Top-N features by importance that exist in the training matrix"""
+    available = set(columns)
+    ranked = [f for f in importance.index if f in available]
+    return ranked[:top_features]
+
+
+def distill(teacher, X_train, X_test, y_test, features, student_params=None, n_jobs=-1):
+    """Fit the student on teacher predictions; return (student, metrics)"""
+    import xgboost as xgb
+
+    params = dict(DEFAULT_STUDENT_PARAMS, **(student_params or {}))
+    soft_targets = teacher.predict(X_train)
+
+    student_model = xgb.XGBRegressor(**params, n_jobs=n_jobs)
+    start = time.time()
+    student_model.fit(X_train[features], soft_targets)
+    train_time = time.time() - start
+    student = DistilledModel(student_model, features)
+
+    teacher_pred = teacher.predict(X_test)
+    student_pred = student.predict(X_test)
+    teacher_scores = regression_scores(y_test, teacher_pred)
+    student_scores = regression_scores(y_test, student_pred)
+
+    metrics = {
+        'model': 'Distilled Student',
+        'timestamp': datetime.now().isoformat(),
+        'n_features': len(features),
+        'features': features,
+        'model_config': params,
+        'train_time': train_time,
+        'teacher_test_metrics': teacher_scores,
+        'student_test_metrics': student_scores,
+        'r2_gap': teacher_scores['r2'] - student_scores['r2'],
+        'fidelity_r2': regression_scores(teacher_pred, student_pred)['r2'],
+    }
+    return student, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the served model into a low-latency student")
+    parser.add_argument('--teacher', default=None, help="Teacher model path (default: the model app.py serves)")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--top-features', type=int, default=60)
+    parser.add_argument('--n-estimators', type=int, default=DEFAULT_STUDENT_PARAMS['n_estimators'])
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_STUDENT_PARAMS['max_depth'])
+    args = parser.parse_args()
+
+    models_dir = Path(args.models_dir)
+    teacher_path = Path(args.teacher) if args.teacher else resolve_model_path(models_dir)
+    print(f"Teacher: {teacher_path}")
+    teacher = joblib.load(teacher_path)
+
+    X_train, X_test, y_train, y_test = load_training_matrices(args.data_dir)
+    features = select_student_features(load_feature_importance(models_dir), X_train.columns,
+                                       args.top_features)
+    print(f"Student features: {len(features)} of {X_train.shape[1]}")
+
+    student, metrics = distill(teacher, X_train, X_test, y_test, features,
+                               {'n_estimators': args.n_estimators, 'max_depth': args.max_depth})
+    metrics['teacher'] = teacher_path.name
+
+    joblib.dump(student, models_dir / STUDENT_MODEL)
+    with open(models_dir / 'student_model_metrics.json', 'w') as f:
+        json.dump(metrics, f, indent=2)
+
+    print(f"Teacher test R²: {metrics['teacher_test_metrics']['r2']:.4f}")
+    print(f"Student test R²: {metrics['student_test_metrics']['r2']:.4f} "
+          f"(gap {metrics['r2_gap']*100:.2f} pts, fidelity {metrics['fidelity_r2']:.4f})")
+    print(f"Saved {models_dir / STUDENT_MODEL}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Drift monitor - live feature sketches compared against the training distribution
+
+A FeatureSketch summarizes a stream of rows in fixed-size arrays. Each
+column keeps its null count, plus:
+- numeric columns: counts over bins cut at the training quantiles
+- categorical columns: counts of the training's most frequent categories,
+  with everything else counted as other
+Sketches built on the same reference add element-wise. Worker processes and
+app sessions therefore each keep their own sketch and merge them later.
+
+References are fitted once from the training data: the model input matrix
+(data/X_train.csv) and, when available, the raw training rows. They are saved
+to models/drift_reference.joblib. drift_report() computes PSI, KS (numeric
+columns) and the null-rate change per column of a live sketch, and flags drift.
+
+The predict page feeds the columns each submitted row sets (its form inputs
+and the features derived from them) to a DriftMonitor; columns it never sets
+are reported as unobserved rather than null. The monitor
+writes its sketch and a report to cache/drift/ every FLUSH_SECS. Batch
+scoring sketches each chunk in its worker and saves the merged result with
+the partitions.
+
+Usage:
+    python -m pipeline.drift build                       # fit models/drift_reference.joblib
+    python -m pipeline.drift report                      # merge cache/drift/predict-*.joblib
+    python -m pipeline.drift report scores/2025-08-01/_drift.joblib --reference raw
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import joblib
+import numpy as np
+import pandas as pd
+from glob import glob
+from pathlib import Path
+
+from pipeline.data import RAW_DATA_DIR, DATA_DIR, MODELS_DIR, CACHE_DIR, TARGET, load_training_matrices
+from pipeline.preprocessing import clean_column_name, leakage_columns
+
+DRIFT_REFERENCE = 'drift_reference.joblib'
+DRIFT_DIR = CACHE_DIR / 'drift'
+N_BINS = 20
+MAX_CATEGORIES = 50
+FLUSH_SECS = 300
+BATCH_SAMPLE_ROWS = 5000
+
+# Flag thresholds (PSI >= 0.25 is the usual "significant shift" rule of thumb)
+PSI_WARN = 0.1
+PSI_DRIFT = 0.25
+KS_DRIFT = 0.1
+NULL_DRIFT = 0.05
+MIN_ROWS = 100
+
+
+def bin_edges(values, n_bins=N_BINS):
+    """Cut points at the training quantiles (the distinct values for low-cardinality columns)"""
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.empty(0)
+    distinct = np.unique(values)
+    if len(distinct) <= n_bins:
+        return distinct
+    return np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+
+
+class FeatureSketch:
+    """Mergeable per-column summary: quantile-bin counts, category counts, null counts"""
+
+    def __init__(self, numeric_edges, categories, ignored=()):
+        self.numeric = list(numeric_edges)
+        self.categorical = list(categories)
+        # Columns deliberately left out (leakage, target); not reported as new columns
+        self.ignored = list(ignored)
+        self.categories = {col: list(cats) for col, cats in categories.items()}
+        width = max([len(e) for e in numeric_edges.values()], default=0)
+        # Padded with +inf so every column shares one array; padded bins stay empty
+        self.edges = np.full((len(self.numeric), width), np.inf)
+        for i, col in enumerate(self.numeric):
+            self.edges[i, :len(numeric_edges[col])] = numeric_edges[col]
+        self.counts = np.zeros((len(self.numeric), width + 1), dtype=np.int64)
+        self.category_counts = {col: np.zeros(len(cats) + 1, dtype=np.int64)
+                                for col, cats in self.categories.items()}
+        self.nulls = np.zeros(len(self.numeric) + len(self.categorical), dtype=np.int64)
+        self.absent = np.zeros_like(self.nulls)
+        self.extra_columns = {}
+        self.n = 0
+        self._layout_cache = None
+
+    @classmethod
+    def fit(cls, df, n_bins=N_BINS, max_categories=MAX_CATEGORIES, ignored=()):
+        """Reference sketch of ``df``: layout from its distribution, counts from its rows"""
+        numeric, categories = {}, {}
+        for col in df.columns.difference(ignored, sort=False):
+            values = df[col]
+            if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                numeric[col] = bin_edges(values.to_numpy(dtype=float), n_bins)
+            else:
+                top = values.dropna().astype(str).value_counts().index[:max_categories]
+                categories[col] = top.tolist()
+        sketch = cls(numeric, categories, ignored)
+        sketch.update(df)
+        return sketch
+
+    def empty(self):
+        """Sketch with the same layout and no rows"""
+        sketch = FeatureSketch.__new__(FeatureSketch)
+        sketch.__dict__.update(self.__dict__)
+        sketch.counts = np.zeros_like(self.counts)
+        sketch.category_counts = {col: np.zeros_like(c) for col, c in self.category_counts.items()}
+        sketch.nulls = np.zeros_like(self.nulls)
+        sketch.absent = np.zeros_like(self.absent)
+        sketch.extra_columns = {}
+        sketch.n = 0
+        sketch._layout_cache = None
+        return sketch
+
+    def _layout(self, columns):
+        # Requests rebuild their frame, so compare against the last column set instead of hashing it
+        if self._layout_cache is not None and self._layout_cache[0].equals(columns):
+            return self._layout_cache[1]
+        index = pd.Index(columns)
+        if not index.isin(self.numeric + self.categorical).any():
+            # Notebook 02 column names against a sanitized reference
+            index = pd.Index([clean_column_name(c) for c in columns])
+        layout = (index.get_indexer(self.numeric), index.get_indexer(self.categorical),
+                  index.difference(self.numeric + self.categorical + self.ignored).tolist())
+        self._layout_cache = (columns, layout)
+        return layout
+
+    def update(self, df, max_rows=None):
+        """Add the rows of ``df``; missing reference columns count as null.
+
+        With ``max_rows``, larger frames are sketched on evenly spaced rows;
+        a few thousand rows per chunk is plenty for PSI/KS and keeps the
+        sketch a small fraction of the chunk's scoring time.
+        """
+        if max_rows and len(df) > max_rows:
+            df = df.iloc[::-(-len(df) // max_rows)]
+        n = len(df)
+        if n == 0:
+            return self
+        numeric, categorical, extra = self._layout(df.columns)
+        present = numeric >= 0
+
+        if len(self.numeric):
+            values = np.full((n, len(self.numeric)), np.nan)
+            if not self.categorical:
+                # All-numeric frames (model inputs): one ndarray conversion, no per-column pandas work
+                values[:, present] = df.to_numpy(dtype=float, na_value=np.nan)[:, numeric[present]]
+            elif present.any():
+                values[:, present] = df.iloc[:, numeric[present]].to_numpy(dtype=float, na_value=np.nan)
+            null = np.isnan(values)
+            if n == 1:
+                # Single request: one comparison against the padded edge matrix
+                row = values[0]
+                bins = (row[:, None] >= self.edges).sum(axis=1)
+                self.counts[np.flatnonzero(~null[0]), bins[~null[0]]] += 1
+            else:
+                for i in range(len(self.numeric)):
+                    col = values[~null[:, i], i]
+                    if len(col):
+                        bins = np.searchsorted(self.edges[i], col, side='right')
+                        self.counts[i] += np.bincount(bins, minlength=self.counts.shape[1])
+            self.nulls[:len(self.numeric)] += null.sum(axis=0)
+            self.absent[:len(self.numeric)] += np.where(present, 0, n)
+
+        for j, col in enumerate(self.categorical):
+            k = len(self.numeric) + j
+            if categorical[j] < 0:
+                self.nulls[k] += n
+                self.absent[k] += n
+                continue
+            values = df.iloc[:, categorical[j]]
+            missing = values.isna().to_numpy()
+            codes = pd.Categorical(values.astype(str), categories=self.categories[col]).codes
+            codes = np.where(codes < 0, len(self.categories[col]), codes)[~missing]
+            self.category_counts[col] += np.bincount(codes, minlength=len(self.categories[col]) + 1)
+            self.nulls[k] += missing.sum()
+
+        for col in extra:
+            self.extra_columns[col] = self.extra_columns.get(col, 0) + n
+        self.n += n
+        return self
+
+    def merge(self, other):
+        """Add another sketch built on the same reference layout"""
+        if other.numeric != self.numeric or other.categorical != self.categorical:
+            raise ValueError("Sketches were built on different reference layouts")
+        self.counts += other.counts
+        for col, counts in other.category_counts.items():
+            self.category_counts[col] += counts
+        self.nulls += other.nulls
+        self.absent += other.absent
+        for col, count in other.extra_columns.items():
+            self.extra_columns[col] = self.extra_columns.get(col, 0) + count
+        self.n += other.n
+        return self
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_layout_cache'] = None
+        return state
+
+
+def _psi(p, q, eps=1e-4):
+    """Population stability index between distributions along the last axis"""
+    p, q = p + eps, q + eps
+    p = p / p.sum(axis=-1, keepdims=True)
+    q = q / q.sum(axis=-1, keepdims=True)
+    return ((q - p) * np.log(q / p)).sum(axis=-1)
+
+
+def drift_report(reference, live, min_rows=MIN_ROWS):
+    """Per-column PSI, KS and null-rate change of ``live`` against ``reference``, worst first.
+
+    Null rates count only rows that had the column. Columns no live row
+    supplied (e.g. features a form never sets) are 'unobserved', not drift.
+    """
+    columns = reference.numeric + reference.categorical
+    ref_null = reference.nulls / max(reference.n, 1)
+    supplied = live.n - live.absent
+    live_null = np.where(supplied > 0, (live.nulls - live.absent) / np.maximum(supplied, 1), np.nan)
+    psi = np.full(len(columns), np.nan)
+    ks = np.full(len(columns), np.nan)
+
+    k = len(reference.numeric)
+    if k:
+        ref_counts, live_counts = reference.counts.astype(float), live.counts.astype(float)
+        observed = live_counts.sum(axis=1) > 0
+        psi[:k][observed] = _psi(ref_counts[observed], live_counts[observed])
+        ref_cdf = np.cumsum(ref_counts, axis=1) / np.maximum(ref_counts.sum(axis=1, keepdims=True), 1)
+        live_cdf = np.cumsum(live_counts, axis=1) / np.maximum(live_counts.sum(axis=1, keepdims=True), 1)
+        ks[:k][observed] = np.abs(ref_cdf - live_cdf).max(axis=1)[observed]
+    for j, col in enumerate(reference.categorical):
+        live_counts = live.category_counts[col]
+        if live_counts.sum():
+            psi[k + j] = _psi(reference.category_counts[col].astype(float), live_counts.astype(float))
+
+    report = pd.DataFrame({
+        'column': columns,
+        'kind': ['numeric'] * k + ['categorical'] * len(reference.categorical),
+        'psi': psi,
+        'ks': ks,
+        'null_rate_train': ref_null,
+        'null_rate_live': live_null,
+        'absent_rate': live.absent / max(live.n, 1),
+    })
+    null_shift = (report['null_rate_live'] - report['null_rate_train']).abs()
+    drift = (report['psi'] >= PSI_DRIFT) | (report['ks'] >= KS_DRIFT) | (null_shift >= NULL_DRIFT)
+    report['status'] = np.where(drift, 'drift', np.where(report['psi'] >= PSI_WARN, 'warn', 'ok'))
+    if live.n < min_rows:
+        report['status'] = 'insufficient'
+    report.loc[supplied == 0, 'status'] = 'unobserved'
+    order = report['status'].map({'drift': 0, 'warn': 1, 'ok': 2, 'insufficient': 3, 'unobserved': 4})
+    return report.assign(_order=order).sort_values(['_order', 'psi'], ascending=[True, False]).drop(
+        columns='_order').reset_index(drop=True)
+
+
+def summarize(report, live):
+    """Compact dict for JSON reports: flagged columns and unexpected new columns"""
+    return {
+        'rows': int(live.n),
+        'drift': report.loc[report['status'] == 'drift', 'column'].tolist(),
+        'warn': report.loc[report['status'] == 'warn', 'column'].tolist(),
+        'max_psi': float(report['psi'].max()) if report['psi'].notna().any() else None,
+        'new_columns': sorted(live.extra_columns),
+    }
+
+
+def save_sketch(sketch, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    joblib.dump(sketch, tmp)
+    tmp.replace(path)
+
+
+def load_sketches(paths, reference='features'):
+    """Merge the sketches saved at ``paths`` (batch runs save one per reference)"""
+    merged = None
+    for path in paths:
+        sketch = joblib.load(path)
+        if isinstance(sketch, dict):
+            sketch = sketch.get(reference)
+        if sketch is not None:
+            merged = sketch if merged is None else merged.merge(sketch)
+    return merged
+
+
+def load_references(models_dir=MODELS_DIR):
+    """{'features': FeatureSketch, 'raw': FeatureSketch} or {} if not built"""
+    path = Path(models_dir) / DRIFT_REFERENCE
+    return joblib.load(path) if path.exists() else {}
+
+
+class DriftMonitor:
+    """Thread-safe live sketch for one reference, flushed to ``directory`` periodically"""
+
+    def __init__(self, reference, name='predict', directory=DRIFT_DIR, flush_secs=FLUSH_SECS):
+        self.reference = reference
+        self.live = reference.empty()
+        self.name = name
+        self.directory = Path(directory)
+        self.flush_secs = flush_secs
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def observe(self, df):
+        with self._lock:
+            self.live.update(df)
+            due = time.monotonic() - self._last_flush >= self.flush_secs
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Save this process's sketch and report; returns the report summary"""
+        with self._lock:
+            live = self.live.empty().merge(self.live)
+        save_sketch(live, self.directory / f"{self.name}-{os.getpid()}.joblib")
+        summary = summarize(drift_report(self.reference, live), live)
+        with open(self.directory / f"{self.name}-{os.getpid()}_report.json", 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+def load_drift_monitor(models_dir=MODELS_DIR, name='predict', reference='features'):
+    """Monitor against the stored ``reference`` sketch, or None if it has not been built"""
+    references = load_references(models_dir)
+    if reference not in references:
+        return None
+    return DriftMonitor(references[reference], name=name)
+
+
+def build_references(data_dir=DATA_DIR, train_path=None):
+    references = {}
+    X_train, _, _, _ = load_training_matrices(data_dir)
+    references['features'] = FeatureSketch.fit(X_train)
+    if train_path is not None and Path(train_path).exists():
+        raw = pd.read_csv(train_path, low_memory=False)
+        references['raw'] = FeatureSketch.fit(raw, ignored=leakage_columns(raw.columns) + [TARGET])
+    return references
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit drift references or report drift of live sketches")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Fit reference sketches from the training data")
+    build.add_argument('--data-dir', default=str(DATA_DIR))
+    build.add_argument('--train-path', default=str(RAW_DATA_DIR / 'train_raw.csv'))
+    build.add_argument('--models-dir', default=str(MODELS_DIR))
+    report = sub.add_parser('report', help="Merge live sketches and compare them to a reference")
+    report.add_argument('sketches', nargs='*', help="Sketch files (default: cache/drift/predict-*.joblib)")
+    report.add_argument('--reference', default='features', choices=['features', 'raw'])
+    report.add_argument('--models-dir', default=str(MODELS_DIR))
+    report.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.time()
+        references = build_references(args.data_dir, args.train_path)
+        path = Path(args.models_dir) / DRIFT_REFERENCE
+        joblib.dump(references, path)
+        for name, sketch in references.items():
+            print(f"{name}: {sketch.n:,} rows, {len(sketch.numeric)} numeric / "
+                  f"{len(sketch.categorical)} categorical columns")
+        print(f"Saved {path} ({time.time() - start:.1f}s)")
+        return
+
+    reference = load_references(args.models_dir).get(args.reference)
+    if reference is None:
+        raise SystemExit(f"No '{args.reference}' reference in {args.models_dir}; run python -m pipeline.drift build")
+    paths = args.sketches or sorted(glob(str(DRIFT_DIR / 'predict-*.joblib')))
+    live = load_sketches(paths, args.reference)
+    if live is None:
+        raise SystemExit("No live sketches found")
+    result = drift_report(reference, live)
+    summary = summarize(result, live)
+    print(f"{summary['rows']:,} live rows from {len(paths)} sketch(es): "
+          f"{len(summary['drift'])} drifting, {len(summary['warn'])} warning")
+    if summary['new_columns']:
+        print(f"Columns not in the training data: {', '.join(summary['new_columns'])}")
+    print(result.head(args.top).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == '__main__':
+    # Run from the importable module so pickled classes resolve to pipeline.drift
+    from pipeline.drift import main
+    main()
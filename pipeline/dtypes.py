@@ -0,0 +1,165 @@
+"""
+Dtype compaction - shrink the notebook 02 design matrix to the smallest safe types
+
+After notebook 02 every feature is float64, including hundreds of 0/1
+one-hot indicators and small integer counts. This stage downcasts 0/1
+columns to uint8, small integer-valued columns to int8/int16 and everything
+else to float32, checks that model predictions are unchanged, and writes a
+per-column memory audit plus a dtype map (models/feature_dtypes.json) that
+the predict page uses to build its input row in the same types.
+
+Columns keep the sanitized names of load_training_matrices (notebooks 04 and
+06 sanitize whichever file they load), and the dtype map is keyed the same
+way. The prediction check runs against the served model by default; nothing
+is written when it fails.
+
+Usage:
+    python -m pipeline.dtypes                                     # check against the served model
+    python -m pipeline.dtypes --check-model models/best_advanced_model.joblib
+"""
+
+import json
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from pipeline.data import DATA_DIR, MODELS_DIR, load_training_matrices
+from pipeline.preprocessing import clean_column_name
+from pipeline.serving import resolve_model_path
+
+INT_TYPES = ['int8', 'int16']
+
+
+def smallest_dtype(series):
+    """Smallest dtype that represents ``series`` without loss"""
+    values = series.to_numpy()
+    if values.dtype == bool:
+        return 'uint8'
+    if not np.issubdtype(values.dtype, np.number):
+        return str(values.dtype)
+    if np.isnan(values.astype(float)).any():
+        return 'float32'
+
+    lo, hi = values.min(), values.max()
+    if np.array_equal(values, np.round(values)):
+        if lo >= 0 and hi <= 1:
+            return 'uint8'
+        for name in INT_TYPES:
+            info = np.iinfo(name)
+            if info.min <= lo and hi <= info.max:
+                return name
+    return 'float32'
+
+
+def compact_dtypes(X):
+    """Return (compacted frame, {column: dtype})"""
+    dtypes = {col: smallest_dtype(X[col]) for col in X.columns}
+    return X.astype(dtypes), dtypes
+
+
+def apply_dtypes(X, dtypes):
+    """Cast an inference frame to the training dtypes.
+
+    Integer columns (uint8 indicators included) fall back to float32 rather
+    than wrapping or truncating when a value is missing, outside the dtype's
+    range or not a whole number (e.g. 2.5 garage spaces). ``dtypes`` is keyed
+    by sanitized names; rows built with notebook 02 names are matched too.
+    """
+    casts = {col: dtype for col, dtype in dtypes.items() if col in X.columns}
+    if len(casts) < len(X.columns):
+        for col in X.columns.difference(list(casts), sort=False):
+            dtype = dtypes.get(clean_column_name(col))
+            if dtype is not None:
+                casts[col] = dtype
+    int_cols = [col for col, dtype in casts.items() if np.issubdtype(np.dtype(dtype), np.integer)]
+    if int_cols:
+        try:
+            values = X[int_cols].to_numpy(dtype=float, na_value=np.nan)
+        except (TypeError, ValueError):
+            values = X[int_cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        lo = np.array([np.iinfo(casts[col]).min for col in int_cols], dtype=float)
+        hi = np.array([np.iinfo(casts[col]).max for col in int_cols], dtype=float)
+        with np.errstate(invalid='ignore'):
+            unsafe = (np.isnan(values) | (values < lo) | (values > hi) | (values % 1 != 0)).any(axis=0)
+        for col in np.asarray(int_cols, dtype=object)[unsafe]:
+            del casts[col]
+        X = X.astype(casts)
+        for j in np.flatnonzero(unsafe):
+            # From the coerced values, so unparseable text becomes NaN instead of failing the cast
+            X[int_cols[j]] = values[:, j].astype(np.float32)
+        return X
+    return X.astype(casts)
+
+
+def dtype_audit(before, after):
+    """Per-column memory report, largest saving first"""
+    audit = pd.DataFrame({
+        'column': before.columns,
+        'dtype_before': [str(t) for t in before.dtypes],
+        'dtype_after': [str(t) for t in after.dtypes],
+        'bytes_before': before.memory_usage(index=False, deep=True).values,
+        'bytes_after': after.memory_usage(index=False, deep=True).values,
+    })
+    audit['bytes_saved'] = audit['bytes_before'] - audit['bytes_after']
+    return audit.sort_values('bytes_saved', ascending=False).reset_index(drop=True)
+
+
+def verify_predictions(model, before, after, rtol=1e-5):
+    """Compare predictions on the original and compacted matrices"""
+    p_before = np.asarray(model.predict(before), dtype=float)
+    p_after = np.asarray(model.predict(after), dtype=float)
+    diff = np.abs(p_before - p_after)
+    rel = diff / np.maximum(np.abs(p_before), 1.0)
+    return {
+        'max_abs_diff': float(diff.max()),
+        'max_rel_diff': float(rel.max()),
+        'within_tolerance': bool(rel.max() <= rtol),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downcast the design matrix and audit memory")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--check-model', default=None,
+                        help="Model used to verify predictions are unchanged (default: the model app.py serves)")
+    parser.add_argument('--rtol', type=float, default=1e-5)
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    models_dir = Path(args.models_dir)
+    X_train, X_test, _, _ = load_training_matrices(data_dir)
+
+    X_train_c, dtypes = compact_dtypes(X_train)
+    X_test_c = apply_dtypes(X_test, dtypes)
+
+    audit = dtype_audit(X_train, X_train_c)
+    total_before = audit['bytes_before'].sum()
+    total_after = audit['bytes_after'].sum()
+    print(f"X_train: {total_before / 1e6:,.1f} MB -> {total_after / 1e6:,.1f} MB "
+          f"({total_after / total_before:.1%} of original)")
+    print(audit['dtype_after'].value_counts().to_string())
+
+    check_model = Path(args.check_model) if args.check_model else resolve_model_path(models_dir)
+    if check_model.exists():
+        model = joblib.load(check_model)
+        check = verify_predictions(model, X_test, X_test_c, args.rtol)
+        print(f"Prediction check ({check_model.name}): max rel diff {check['max_rel_diff']:.2e} "
+              f"({'OK' if check['within_tolerance'] else 'FAILED'})")
+        if not check['within_tolerance']:
+            raise SystemExit("Compacted matrix changes predictions beyond tolerance; nothing written")
+    else:
+        print(f"\n*** WARNING: {check_model} not found - predictions on the compact matrix were NOT checked ***\n")
+
+    audit.to_csv(models_dir / 'dtype_audit.csv', index=False)
+    X_train_c.to_pickle(data_dir / 'X_train_compact.pkl')
+    X_test_c.to_pickle(data_dir / 'X_test_compact.pkl')
+    with open(models_dir / 'feature_dtypes.json', 'w') as f:
+        json.dump(dtypes, f, indent=2)
+    print(f"Saved compact matrices to {data_dir} and dtype map to {models_dir / 'feature_dtypes.json'}")
+
+
+if __name__ == '__main__':
+    main()
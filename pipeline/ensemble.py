@@ -0,0 +1,72 @@
+"""
+Ensemble inference - run Voting/Stacking members concurrently
+
+sklearn's VotingRegressor and StackingRegressor call each member's
+``predict`` one after another. XGBoost, LightGBM and sklearn's tree
+traversal release the GIL, so dispatching the members on a thread pool
+brings ensemble latency down toward the slowest member instead of the sum.
+The wrapper splits a global thread budget between the members so the pool
+and the libraries' own threads never exceed it.
+"""
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from sklearn.ensemble import VotingRegressor, StackingRegressor
+
+from pipeline.concurrency import available_cpus, configure_estimator
+
+
+class ParallelEnsemble:
+    """Drop-in replacement for a fitted VotingRegressor or StackingRegressor"""
+
+    def __init__(self, ensemble, thread_budget=None):
+        if not isinstance(ensemble, (VotingRegressor, StackingRegressor)):
+            raise TypeError(f"Expected a fitted VotingRegressor or StackingRegressor, got {type(ensemble).__name__}")
+        self.ensemble = ensemble
+        self.members = list(ensemble.estimators_)
+        self.thread_budget = thread_budget or available_cpus()
+
+        self.n_workers = min(len(self.members), self.thread_budget)
+        member_threads = max(1, self.thread_budget // self.n_workers)
+        for member in self.members:
+            configure_estimator(member, member_threads)
+        self._pool = ThreadPoolExecutor(max_workers=self.n_workers,
+                                        thread_name_prefix='ensemble-member')
+
+    def __getattr__(self, name):
+        # Anything not overridden (feature_names_in_, named_estimators_, ...) comes from the ensemble
+        if name == 'ensemble':
+            raise AttributeError(name)
+        return getattr(self.ensemble, name)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_pool', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool = ThreadPoolExecutor(max_workers=self.n_workers,
+                                        thread_name_prefix='ensemble-member')
+
+    def member_predictions(self, X):
+        """Predictions of every member, shape (n_rows, n_members)"""
+        futures = [self._pool.submit(member.predict, X) for member in self.members]
+        return np.column_stack([f.result() for f in futures])
+
+    def predict(self, X):
+        preds = self.member_predictions(X)
+        if isinstance(self.ensemble, VotingRegressor):
+            return np.average(preds, axis=1, weights=self.ensemble._weights_not_none)
+
+        if self.ensemble.passthrough:
+            preds = np.hstack([preds, np.asarray(X)])
+        return self.ensemble.final_estimator_.predict(preds)
+
+
+def parallelize(model, thread_budget=None):
+    """Wrap Voting/Stacking ensembles; return any other model unchanged"""
+    if isinstance(model, (VotingRegressor, StackingRegressor)):
+        return ParallelEnsemble(model, thread_budget)
+    return model
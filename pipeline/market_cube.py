@@ -0,0 +1,170 @@
+"""
+Market cube - pre-aggregated sale statistics for the Analysis page explorer
+
+Every combination (grouping set) of City, PostalCode, PropertyType and
+close month is aggregated once offline. Each cell stores the sale count,
+price quantiles (p10/p25/median/p75/p90) and median/mean price per sq ft.
+The finest cells also keep a log-price histogram sketch. Sketches are
+mergeable, so the price distribution of any filter combination is the sum
+of its finest cells' sketches, without the raw rows.
+A drill-down on the page is a lookup in one grouping-set table instead of a
+scan over 150k+ sales.
+
+Usage:
+    python -m pipeline.market_cube
+"""
+
+import time
+import argparse
+import itertools
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from pipeline.data import RAW_DATA_DIR, MODELS_DIR, TARGET, list_monthly_files, month_label
+from pipeline.preprocessing import outlier_mask
+
+MARKET_CUBE = 'market_cube.joblib'
+DIMENSIONS = ['City', 'PostalCode', 'PropertyType', 'Month']
+ALL = 'All'
+QUANTILES = {'p10': 0.10, 'p25': 0.25, 'median_price': 0.50, 'p75': 0.75, 'p90': 0.90}
+
+# Log-spaced price bins for the histogram sketch ($10K - $20M, ~6% wide)
+SKETCH_EDGES = np.geomspace(1e4, 2e7, 129)
+
+
+def load_sales(raw_dir=RAW_DATA_DIR):
+    """Columns the cube needs from every monthly file"""
+    wanted = set(DIMENSIONS) | {'CloseDate', 'LivingArea', TARGET}
+    frames = []
+    for path in list_monthly_files(raw_dir):
+        df = pd.read_csv(path, usecols=lambda c: c in wanted, low_memory=False,
+                         dtype={'City': str, 'PostalCode': str, 'PropertyType': str})
+        if 'CloseDate' in df.columns:
+            df['Month'] = pd.to_datetime(df['CloseDate'], errors='coerce').dt.strftime('%Y-%m')
+            df['Month'] = df['Month'].fillna(month_label(path))
+        else:
+            df['Month'] = month_label(path)
+        frames.append(df)
+    sales = pd.concat(frames, ignore_index=True)
+
+    sales[TARGET] = pd.to_numeric(sales[TARGET], errors='coerce')
+    sales = sales[outlier_mask(sales[TARGET])]
+    for dim in DIMENSIONS:
+        if dim not in sales.columns:
+            sales[dim] = ALL
+        sales[dim] = sales[dim].fillna('Unknown').astype(str).str.strip()
+    area = pd.to_numeric(sales.get('LivingArea'), errors='coerce')
+    sales['PricePerSqFt'] = sales[TARGET] / area.where(area > 0)
+    return sales[DIMENSIONS + [TARGET, 'PricePerSqFt']].reset_index(drop=True)
+
+
+def sketch_bins(prices):
+    """Sketch bin of each price (values outside SKETCH_EDGES go to the end bins)"""
+    bins = np.searchsorted(SKETCH_EDGES, np.asarray(prices, dtype=float), side='right') - 1
+    return np.clip(bins, 0, len(SKETCH_EDGES) - 2)
+
+
+class MarketCube:
+    """One aggregate table per grouping set of DIMENSIONS, plus finest-cell sketches"""
+
+    def __init__(self, tables, sketches, n_sales):
+        self.tables = tables
+        self.sketches = sketches
+        self.n_sales = n_sales
+
+    @classmethod
+    def build(cls, sales):
+        tables = {}
+        for r in range(len(DIMENSIONS) + 1):
+            for dims in itertools.combinations(DIMENSIONS, r):
+                grouped = sales.groupby(list(dims), sort=True) if dims else sales.groupby(lambda _: ALL)
+                stats = grouped[TARGET].quantile(list(QUANTILES.values())).unstack()
+                stats.columns = list(QUANTILES)
+                stats.insert(0, 'count', grouped.size())
+                stats['median_ppsf'] = grouped['PricePerSqFt'].median()
+                stats['mean_ppsf'] = grouped['PricePerSqFt'].mean()
+                tables[frozenset(dims)] = stats
+
+        finest = tables[frozenset(DIMENSIONS)]
+        counts = (sales.assign(_bin=sketch_bins(sales[TARGET]))
+                  .groupby(DIMENSIONS)['_bin'].value_counts().unstack(fill_value=0))
+        counts = counts.reindex(index=finest.index, columns=range(len(SKETCH_EDGES) - 1), fill_value=0)
+        return cls(tables, counts.to_numpy(dtype=np.uint32), len(sales))
+
+    def values(self, dim):
+        """Distinct values of one dimension, most sales first"""
+        table = self.tables[frozenset([dim])]
+        return table['count'].sort_values(ascending=False).index.tolist()
+
+    @staticmethod
+    def _mask(table, filters):
+        mask = np.ones(len(table), dtype=bool)
+        for dim, value in filters.items():
+            mask &= table.index.get_level_values(dim) == value
+        return mask
+
+    @staticmethod
+    def _active(filters):
+        return {dim: value for dim, value in filters.items() if value not in (None, ALL)}
+
+    def breakdown(self, by, min_count=1, **filters):
+        """Statistics of every ``by`` value among sales matching ``filters``"""
+        filters = self._active(filters)
+        filters.pop(by, None)
+        table = self.tables[frozenset(list(filters) + [by])]
+        rows = table[self._mask(table, filters)]
+        if isinstance(rows.index, pd.MultiIndex):
+            rows = rows.droplevel([n for n in rows.index.names if n != by])
+        return rows[rows['count'] >= min_count]
+
+    def cell(self, **filters):
+        """Statistics for one filter combination, or None if no sales match"""
+        filters = self._active(filters)
+        table = self.tables[frozenset(filters)]
+        rows = table[self._mask(table, filters)] if filters else table
+        return rows.iloc[0] if len(rows) else None
+
+    def distribution(self, **filters):
+        """Merged price sketch of every finest cell matching ``filters``"""
+        finest = self.tables[frozenset(DIMENSIONS)]
+        return self.sketches[self._mask(finest, self._active(filters))].sum(axis=0)
+
+
+def load_market_cube(models_dir=MODELS_DIR):
+    """Load the persisted cube, or None if it has not been built"""
+    path = Path(models_dir) / MARKET_CUBE
+    return joblib.load(path) if path.exists() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the market statistics cube")
+    parser.add_argument('--raw-dir', default=str(RAW_DATA_DIR))
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    args = parser.parse_args()
+
+    start = time.time()
+    sales = load_sales(args.raw_dir)
+    print(f"Loaded {len(sales):,} sales ({time.time() - start:.1f}s)")
+
+    start = time.time()
+    cube = MarketCube.build(sales)
+    cells = sum(len(t) for t in cube.tables.values())
+    print(f"Built {len(cube.tables)} grouping sets, {cells:,} cells ({time.time() - start:.1f}s)")
+
+    path = Path(args.models_dir) / MARKET_CUBE
+    joblib.dump(cube, path)
+    print(f"Saved {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+    city = cube.values('City')[0]
+    start = time.perf_counter()
+    for _ in range(100):
+        cube.breakdown('Month', City=city)
+    print(f"Drill-down latency: {(time.perf_counter() - start) / 100 * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    # Run from the importable module so pickled classes resolve to pipeline.market_cube
+    from pipeline.market_cube import main
+    main()
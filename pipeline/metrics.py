@@ -0,0 +1,178 @@
+"""
+Metrics - regression scores shared by pipeline stages and benchmarks
+
+``regression_scores`` scores arrays that are already in memory.
+``MetricsAccumulator`` gives the same R²/RMSE without holding predictions:
+it keeps running moments (count, mean and centred sum of squares of the
+target, merged with Chan's parallel update), residual sums, binned absolute
+and percentage error histograms for approximate quantiles, and the same
+statistics per price band. Accumulators are updated chunk by chunk and
+merged across worker processes, so R² and RMSE stay exact at any row count.
+
+MAPE skips targets below MAPE_MIN_TARGET. A handful of near-zero sale
+prices is enough to push an unguarded MAPE into the 1e16 range, as
+recorded in xgboost_enhanced_metrics.json.
+"""
+
+import numpy as np
+
+# Targets below this (in dollars) are data errors, not sale prices; left out of MAPE
+MAPE_MIN_TARGET = 10_000.0
+
+# Price bands (by actual price) for the per-band breakdown
+PRICE_BAND_EDGES = (100_000, 200_000, 300_000, 500_000, 1_000_000)
+
+# Absolute error: $1 to $10M, 20 buckets per decade (<= 12% relative bucket width)
+ABS_ERROR_EDGES = np.logspace(0, 7, 141)
+# Signed percentage error (prediction / actual - 1): -100% to +100% in 0.5% steps
+PCT_ERROR_EDGES = np.linspace(-1, 1, 401)
+
+
+def regression_scores(y_true, y_pred):
+    """R², RMSE and MAPE (MAPE skips targets below MAPE_MIN_TARGET)"""
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    resid = y_true - y_pred
+    ss_res = float(np.sum(resid ** 2))
+    ss_tot = float(np.sum((y_true - y_true.mean()) ** 2))
+    valid = y_true >= MAPE_MIN_TARGET
+    return {
+        'r2': 1 - ss_res / ss_tot if ss_tot > 0 else float('nan'),
+        'rmse': float(np.sqrt(ss_res / len(y_true))),
+        'mape': float(np.mean(np.abs(resid[valid] / y_true[valid]))) if valid.any() else float('nan'),
+    }
+
+
+def price_band_labels(edges=PRICE_BAND_EDGES):
+    """'<$100k', '$100k-$200k', ..., '$1M+' for the bands between ``edges``"""
+    def fmt(v):
+        return f"${v / 1e6:g}M" if v >= 1e6 else f"${v / 1e3:g}k"
+    bounds = [fmt(e) for e in edges]
+    return [f"<{bounds[0]}"] + [f"{a}-{b}" for a, b in zip(bounds, bounds[1:])] + [f"{bounds[-1]}+"]
+
+
+def histogram_quantile(counts, edges, q):
+    """Approximate ``q`` quantile (0-1) from bucket counts, interpolating inside the bucket.
+
+    ``counts`` has one under- and one overflow bucket around ``edges``; those
+    report the outermost edge. Shared by every histogram in the pipeline
+    (error histograms here, span latencies in pipeline.profiling).
+    """
+    total = counts.sum()
+    if total == 0:
+        return float('nan')
+    cumulative = np.cumsum(counts)
+    i = int(np.searchsorted(cumulative, q * total))
+    if i == 0:
+        return float(edges[0])
+    if i >= len(edges):
+        return float(edges[-1])
+    below = cumulative[i - 1]
+    frac = (q * total - below) / counts[i] if counts[i] else 0.0
+    return float(edges[i - 1] + frac * (edges[i] - edges[i - 1]))
+
+
+class MetricsAccumulator:
+    """Mergeable streaming regression metrics.
+
+    Exact: n, R², RMSE, MAE, bias, guarded MAPE. Approximate (histograms):
+    absolute and percentage error quantiles. With ``bands``, the same
+    statistics are kept per price band of the actual price.
+    """
+
+    def __init__(self, bands=PRICE_BAND_EDGES):
+        self.n = 0
+        self.mean = 0.0          # of y_true
+        self.m2 = 0.0            # sum of squared deviations of y_true from its mean
+        self.sse = 0.0           # sum of squared residuals
+        self.sum_resid = 0.0     # sum of (y_pred - y_true)
+        self.sum_abs = 0.0
+        self.sum_ape = 0.0
+        self.n_ape = 0
+        self.abs_counts = np.zeros(len(ABS_ERROR_EDGES) + 1, dtype=np.int64)
+        self.pct_counts = np.zeros(len(PCT_ERROR_EDGES) + 1, dtype=np.int64)
+        self.band_edges = tuple(bands) if bands else ()
+        self.bands = [MetricsAccumulator(bands=None) for _ in range(len(self.band_edges) + 1)] if bands else []
+
+    def _add_moments(self, n, mean, m2):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+
+    def update(self, y_true, y_pred):
+        """Add one chunk of actual and predicted prices"""
+        y_true = np.asarray(y_true, dtype=float).ravel()
+        y_pred = np.asarray(y_pred, dtype=float).ravel()
+        keep = np.isfinite(y_true) & np.isfinite(y_pred)
+        if not keep.all():
+            y_true, y_pred = y_true[keep], y_pred[keep]
+        if len(y_true) == 0:
+            return self
+
+        mean = float(y_true.mean())
+        self._add_moments(len(y_true), mean, float(((y_true - mean) ** 2).sum()))
+        resid = y_pred - y_true
+        abs_resid = np.abs(resid)
+        self.sse += float((resid ** 2).sum())
+        self.sum_resid += float(resid.sum())
+        self.sum_abs += float(abs_resid.sum())
+        self.abs_counts += np.bincount(np.searchsorted(ABS_ERROR_EDGES, abs_resid, side='right'),
+                                       minlength=len(self.abs_counts))
+
+        valid = y_true >= MAPE_MIN_TARGET
+        pct = resid[valid] / y_true[valid]
+        self.sum_ape += float(np.abs(pct).sum())
+        self.n_ape += int(valid.sum())
+        self.pct_counts += np.bincount(np.searchsorted(PCT_ERROR_EDGES, pct, side='right'),
+                                       minlength=len(self.pct_counts))
+
+        if self.bands:
+            band = np.searchsorted(self.band_edges, y_true, side='right')
+            for b in np.unique(band):
+                rows = band == b
+                self.bands[b].update(y_true[rows], y_pred[rows])
+        return self
+
+    def merge(self, other):
+        """Add another accumulator built with the same price bands"""
+        if other.band_edges != self.band_edges:
+            raise ValueError("Accumulators were built with different price bands")
+        self._add_moments(other.n, other.mean, other.m2)
+        self.sse += other.sse
+        self.sum_resid += other.sum_resid
+        self.sum_abs += other.sum_abs
+        self.sum_ape += other.sum_ape
+        self.n_ape += other.n_ape
+        self.abs_counts += other.abs_counts
+        self.pct_counts += other.pct_counts
+        for mine, theirs in zip(self.bands, other.bands):
+            mine.merge(theirs)
+        return self
+
+    def scores(self):
+        """Exact and histogram-based metrics of everything added so far"""
+        if self.n == 0:
+            return {'n': 0}
+        return {
+            'n': self.n,
+            'r2': float(1 - self.sse / self.m2) if self.m2 > 0 else float('nan'),
+            'rmse': float(np.sqrt(self.sse / self.n)),
+            'mae': self.sum_abs / self.n,
+            'bias': self.sum_resid / self.n,
+            'mape': self.sum_ape / self.n_ape if self.n_ape else float('nan'),
+            'mape_excluded': self.n - self.n_ape,
+            'abs_error_p50': histogram_quantile(self.abs_counts, ABS_ERROR_EDGES, 0.5),
+            'abs_error_p90': histogram_quantile(self.abs_counts, ABS_ERROR_EDGES, 0.9),
+            'pct_error_p05': histogram_quantile(self.pct_counts, PCT_ERROR_EDGES, 0.05),
+            'pct_error_p50': histogram_quantile(self.pct_counts, PCT_ERROR_EDGES, 0.5),
+            'pct_error_p95': histogram_quantile(self.pct_counts, PCT_ERROR_EDGES, 0.95),
+        }
+
+    def band_scores(self):
+        """``scores()`` per price band, keyed by band label (empty bands left out)"""
+        labels = price_band_labels(self.band_edges) if self.bands else []
+        return {label: band.scores() for label, band in zip(labels, self.bands) if band.n}
@@ -0,0 +1,228 @@
+"""
+Preprocessing - the notebook 02 feature pipeline as a reusable, fitted transformer
+
+Fitting learns everything notebook 02 derives from the training months
+(dropped columns, target encodings, one-hot columns, medians), so the same
+transformation can be replayed on later months, backtest folds or raw
+inventory files without re-running the notebook.
+
+Usage:
+    python -m pipeline.preprocessing   # fit on filled_data/train_raw.csv, save models/preprocessor.joblib
+"""
+
+import re
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+
+from pipeline.data import RAW_DATA_DIR, MODELS_DIR, TARGET
+
+# Same list as notebook 02 - matched case-insensitively as substrings
+LEAKAGE_FEATURES = [
+    # Price-related (direct leakage)
+    'ListPrice', 'OriginalListPrice',
+
+    # Date/time features
+    'CloseDate', 'DaysOnMarket', 'DOM', 'CDOM',
+    'ModificationTimestamp', 'StatusChangeTimestamp', 'OnMarketTimestamp',
+    'ContractDate', 'StatusChangeDate', 'PurchaseContractDate',
+    'ListingContractDate', 'ContractStatusChangeDate',
+
+    # Agent/Office names
+    'ListAgentEmail', 'ListAgentFirstName', 'ListAgentLastName',
+    'BuyerAgentEmail', 'BuyerAgentFirstName', 'BuyerAgentLastName',
+    'CoListAgentFirstName', 'CoListAgentLastName',
+    'ListOfficeName', 'BuyerOfficeName',
+
+    # Unique IDs
+    'ListingId', 'ListingKey', 'MLSNumber',
+    'Matrix_Unique_ID', 'UniversalPropertyId',
+
+    # Address
+    'UnparsedAddress', 'StreetAddress', 'StreetName', 'StreetNumber',
+
+    # Text remarks
+    'PublicRemarks', 'PrivateRemarks', 'Directions',
+
+    # Source marker
+    '_source_file'
+]
+
+PREPROCESSOR_FILE = 'preprocessor.joblib'
+
+MISSING_THRESHOLD = 0.60
+HIGH_CARD_THRESHOLD = 600
+TARGET_ENCODING_ALPHA = 10
+
+# Raw inputs of the engineered BuildingAge/TotalRooms/HasGarage columns
+ENGINEERED_INPUTS = ['YearBuilt', 'BedroomsTotal', 'BathroomsTotalInteger', 'GarageSpaces']
+
+
+def clean_column_name(col):
+    """Sanitize a feature name for XGBoost/LightGBM (same rule as notebook 04)"""
+    return re.sub(r'[^0-9a-zA-Z_]', '_', str(col))
+
+
+def leakage_columns(columns, target_col=TARGET):
+    """Columns notebook 02 drops as leakage"""
+    leaks = [leak.lower() for leak in LEAKAGE_FEATURES]
+    return [col for col in columns
+            if col != target_col and any(leak in col.lower() for leak in leaks)]
+
+
+def split_target(df, target_col=TARGET):
+    """Return (features, numeric target)"""
+    y = pd.to_numeric(df[target_col], errors='coerce') if target_col in df.columns else None
+    return df.drop(columns=[target_col], errors='ignore'), y
+
+
+def outlier_mask(y, low=0.5, high=99.5):
+    """Keep mask for targets inside the [low, high] percentile band"""
+    y_valid = y.dropna()
+    p_low = np.percentile(y_valid, low)
+    p_high = np.percentile(y_valid, high)
+    return (y >= p_low) & (y <= p_high) & y.notna()
+
+
+class Preprocessor:
+    """Fitted version of the notebook 02 preprocessing steps"""
+
+    def __init__(self, missing_threshold=MISSING_THRESHOLD,
+                 high_card_threshold=HIGH_CARD_THRESHOLD,
+                 alpha=TARGET_ENCODING_ALPHA, reference_year=None,
+                 sanitize_names=True):
+        self.missing_threshold = missing_threshold
+        self.high_card_threshold = high_card_threshold
+        self.alpha = alpha
+        self.reference_year = reference_year
+        self.sanitize_names = sanitize_names
+
+    def _engineer(self, X):
+        """BuildingAge, TotalRooms and HasGarage"""
+        X = X.copy()
+        if 'YearBuilt' in X.columns:
+            age = self.reference_year - pd.to_numeric(X['YearBuilt'], errors='coerce')
+            X['BuildingAge'] = age.clip(lower=0)
+        if 'BedroomsTotal' in X.columns and 'BathroomsTotalInteger' in X.columns:
+            X['TotalRooms'] = (pd.to_numeric(X['BedroomsTotal'], errors='coerce').fillna(0) +
+                               pd.to_numeric(X['BathroomsTotalInteger'], errors='coerce').fillna(0))
+        if 'GarageSpaces' in X.columns:
+            X['HasGarage'] = (pd.to_numeric(X['GarageSpaces'], errors='coerce').fillna(0) > 0).astype(int)
+        return X
+
+    def _encode(self, X):
+        """Apply the fitted target encodings and one-hot columns"""
+        for col, mapping in self.target_maps_.items():
+            if col in X.columns:
+                X[f'{col}_target'] = X[col].map(mapping).astype(float).fillna(self.global_mean_)
+            else:
+                X[f'{col}_target'] = self.global_mean_
+        X = X.drop(columns=list(self.target_maps_), errors='ignore')
+
+        onehot = [c for c in self.onehot_cols_ if c in X.columns]
+        if onehot:
+            X = pd.get_dummies(X, columns=onehot, drop_first=False, dummy_na=False)
+        return X
+
+    def fit_transform(self, df, target_col=TARGET, remove_outliers=True):
+        """Fit on raw training rows; return (X, y) exactly like notebook 02"""
+        if self.reference_year is None:
+            self.reference_year = datetime.now().year
+
+        X, y = split_target(df, target_col)
+        X = X.drop(columns=leakage_columns(X.columns, target_col))
+        X = self._engineer(X)
+
+        missing = X.isnull().mean()
+        self.dropped_missing_ = missing[missing > self.missing_threshold].index.tolist()
+        X = X.drop(columns=self.dropped_missing_)
+
+        categorical_cols = X.select_dtypes(include=['object']).columns.tolist()
+        self.onehot_cols_ = []
+        target_cols = []
+        for col in categorical_cols:
+            if X[col].nunique() > self.high_card_threshold:
+                target_cols.append(col)
+            else:
+                self.onehot_cols_.append(col)
+
+        self.global_mean_ = float(y.mean())
+        self.target_maps_ = {}
+        for col in target_cols:
+            stats = X[[col]].assign(target=y.values).groupby(col).agg(
+                count=('target', 'size'),
+                mean=('target', 'mean')
+            )
+            smoothed = ((stats['count'] * stats['mean'] + self.alpha * self.global_mean_) /
+                        (stats['count'] + self.alpha))
+            self.target_maps_[col] = smoothed.to_dict()
+
+        X = self._encode(X).reset_index(drop=True)
+        y = y.reset_index(drop=True)
+
+        if remove_outliers:
+            keep = outlier_mask(y)
+            X = X[keep].reset_index(drop=True)
+            y = y[keep].reset_index(drop=True)
+
+        numeric_cols = X.select_dtypes(include=[np.number]).columns
+        self.medians_ = X[numeric_cols].median().to_dict()
+        X = X.fillna(value=self.medians_)
+
+        self.raw_feature_columns_ = list(X.columns)
+        if self.sanitize_names:
+            X.columns = [clean_column_name(c) for c in X.columns]
+        self.feature_columns_ = list(X.columns)
+        return X, y
+
+    def fit(self, df, target_col=TARGET):
+        self.fit_transform(df, target_col)
+        return self
+
+    def transform(self, df, target_col=TARGET):
+        """Replay the fitted steps on new raw rows (target column is ignored)"""
+        X = df.drop(columns=[target_col], errors='ignore')
+        X = X.drop(columns=leakage_columns(X.columns, target_col))
+        X = self._engineer(X)
+        X = X.drop(columns=self.dropped_missing_, errors='ignore')
+        X = self._encode(X)
+
+        X = X.reindex(columns=self.raw_feature_columns_, fill_value=0)
+        X = X.fillna(value=self.medians_)
+        X.index = df.index
+        if self.sanitize_names:
+            X.columns = self.feature_columns_
+        return X
+
+
+def load_preprocessor(models_dir=MODELS_DIR):
+    """Load the fitted Preprocessor, or None if it has not been saved"""
+    path = Path(models_dir) / PREPROCESSOR_FILE
+    return joblib.load(path) if path.exists() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the notebook 02 preprocessing and save it for scoring")
+    parser.add_argument('--train-path', default=str(RAW_DATA_DIR / 'train_raw.csv'))
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    args = parser.parse_args()
+
+    start = time.time()
+    df = pd.read_csv(args.train_path, low_memory=False)
+    prep = Preprocessor()
+    X, _ = prep.fit_transform(df)
+    print(f"Fitted on {len(X):,} rows -> {X.shape[1]} features ({time.time() - start:.1f}s)")
+
+    path = Path(args.models_dir) / PREPROCESSOR_FILE
+    joblib.dump(prep, path)
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    # Run from the importable module so pickled classes resolve to pipeline.preprocessing
+    from pipeline.preprocessing import main
+    main()
@@ -0,0 +1,229 @@
+"""
+Profiling - opt-in timers, memory counters and sampled cProfile for the app
+
+Disabled unless HOME_PRICE_PROFILE=1. When disabled, ``instrument`` returns
+the function unchanged and ``request``/``span`` return a shared no-op
+context manager, so the hooks cost a function call at most.
+
+When enabled:
+- every ``request`` (one Streamlit script run) writes a trace line to
+  traces.jsonl with its nested spans (duration, RSS, RSS change)
+- durations per span name go into log-spaced histograms, which are rewritten
+  to histograms.json at most every HOME_PRICE_PROFILE_DUMP_SECS
+- a sampled fraction of requests runs under cProfile, and the stats are kept
+  in profiles/ only if the request was slower than HOME_PRICE_PROFILE_SLOW_MS
+
+Environment:
+    HOME_PRICE_PROFILE              1 to enable
+    HOME_PRICE_PROFILE_DIR          output directory (default cache/profiling)
+    HOME_PRICE_PROFILE_SAMPLE       fraction of requests run under cProfile (default 0.1)
+    HOME_PRICE_PROFILE_SLOW_MS      keep cProfile output above this duration (default 500)
+    HOME_PRICE_PROFILE_DUMP_SECS    histogram dump interval (default 60)
+
+Usage:
+    HOME_PRICE_PROFILE=1 streamlit run app.py
+    python -m pipeline.profiling                 # summarize cache/profiling/histograms.json
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import functools
+import contextlib
+import contextvars
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+
+from pipeline.data import CACHE_DIR
+from pipeline.metrics import histogram_quantile
+
+ENABLED = os.environ.get('HOME_PRICE_PROFILE', '').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = Path(os.environ.get('HOME_PRICE_PROFILE_DIR', CACHE_DIR / 'profiling'))
+SAMPLE_RATE = float(os.environ.get('HOME_PRICE_PROFILE_SAMPLE', '0.1'))
+SLOW_MS = float(os.environ.get('HOME_PRICE_PROFILE_SLOW_MS', '500'))
+DUMP_SECS = float(os.environ.get('HOME_PRICE_PROFILE_DUMP_SECS', '60'))
+
+# Histogram buckets: 0.01 ms to ~100 s, 10 per decade
+BUCKET_EDGES_MS = np.logspace(-2, 5, 71)
+
+_NOOP = contextlib.nullcontext()
+_trace = contextvars.ContextVar('home_price_trace', default=None)
+_lock = threading.Lock()
+_histograms = {}
+_last_dump = time.monotonic()
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_mb():
+    """Current resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1e6
+    except OSError:
+        import resource
+        # Peak rather than current RSS where /proc is unavailable (KB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _record(name, ms):
+    bucket = min(int(np.searchsorted(BUCKET_EDGES_MS, ms)), len(BUCKET_EDGES_MS))
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = {'counts': [0] * (len(BUCKET_EDGES_MS) + 1),
+                                        'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        hist['counts'][bucket] += 1
+        hist['count'] += 1
+        hist['total_ms'] += ms
+        hist['max_ms'] = max(hist['max_ms'], ms)
+
+
+@contextlib.contextmanager
+def _span(name):
+    trace = _trace.get()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        rss_after = rss_mb()
+        _record(name, ms)
+        if trace is not None:
+            trace['spans'].append({'name': name, 'ms': round(ms, 3), 'rss_mb': round(rss_after, 1),
+                                   'rss_delta_mb': round(rss_after - rss_before, 2)})
+
+
+def span(name):
+    """Time a block; recorded in the current request trace and the histograms"""
+    return _span(name) if ENABLED else _NOOP
+
+
+def instrument(name=None):
+    """Decorator form of ``span``; returns ``fn`` itself when profiling is disabled.
+
+    Called outside any request (e.g. a Streamlit fragment rerun), the call
+    is traced as a request of its own.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _request(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def _request(name):
+    if _trace.get() is not None:
+        # Nested request: treat as a span of the outer one
+        with _span(name):
+            yield
+        return
+
+    trace = {'request': name, 'started': datetime.now().isoformat(timespec='milliseconds'),
+             'thread': threading.current_thread().name, 'spans': []}
+    token = _trace.set(trace)
+    profiler = None
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread's profiler is active (one at a time on Python 3.12+)
+            profiler = None
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        if profiler is not None:
+            profiler.disable()
+        _trace.reset(token)
+        _record(f"request:{name}", ms)
+        trace['ms'] = round(ms, 3)
+        trace['rss_mb'] = round(rss_mb(), 1)
+        _finish(trace, profiler)
+
+
+def request(name):
+    """One traced unit of work (a Streamlit script run, a batch job, ...)"""
+    return _request(name) if ENABLED else _NOOP
+
+
+def _finish(trace, profiler):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(trace)
+    with _lock:
+        with open(PROFILE_DIR / 'traces.jsonl', 'a') as f:
+            f.write(line + '\n')
+
+    if profiler is not None and trace['ms'] >= SLOW_MS:
+        profiles = PROFILE_DIR / 'profiles'
+        profiles.mkdir(exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        slug = ''.join(c if c.isalnum() else '_' for c in trace['request'])
+        profiler.dump_stats(profiles / f"{stamp}_{slug}_{trace['ms']:.0f}ms.prof")
+
+    if time.monotonic() - _last_dump >= DUMP_SECS:
+        dump_histograms()
+
+
+def dump_histograms(path=None):
+    """Write the aggregated histograms (and their percentiles) to JSON"""
+    global _last_dump
+    path = Path(path or PROFILE_DIR / 'histograms.json')
+    with _lock:
+        snapshot = {name: dict(h, counts=list(h['counts'])) for name, h in _histograms.items()}
+        _last_dump = time.monotonic()
+    for hist in snapshot.values():
+        hist.update(percentiles(hist['counts']))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'bucket_edges_ms': BUCKET_EDGES_MS.tolist(), 'spans': snapshot,
+                   'dumped': datetime.now().isoformat(timespec='seconds')}, f)
+    tmp.replace(path)
+    return snapshot
+
+
+def percentiles(counts, qs=(50, 95, 99)):
+    """Approximate percentiles from histogram counts, interpolated inside the bucket"""
+    counts = np.asarray(counts)
+    return {f'p{q}_ms': histogram_quantile(counts, BUCKET_EDGES_MS, q / 100) for q in qs}
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Summarize profiling histograms")
+    parser.add_argument('path', nargs='?', default=str(PROFILE_DIR / 'histograms.json'))
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        data = json.load(f)
+    rows = []
+    for name, hist in data['spans'].items():
+        rows.append({'span': name, 'count': hist['count'],
+                     'mean_ms': hist['total_ms'] / max(hist['count'], 1),
+                     'p50_ms': hist['p50_ms'], 'p95_ms': hist['p95_ms'], 'p99_ms': hist['p99_ms'],
+                     'max_ms': hist['max_ms'], 'total_s': hist['total_ms'] / 1000})
+    print(f"Histograms dumped {data['dumped']}")
+    if rows:
+        table = pd.DataFrame(rows).sort_values('total_s', ascending=False)
+        print(table.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Feature pruning - drop low-importance features until test R² starts to suffer
+
+Features are ranked by gain (feature_importance.json for the first round,
+the retrained model afterwards). One-hot columns that came from the same
+categorical (e.g. every HighSchoolDistrict_* indicator) form one group and
+are ranked and dropped together. Each round drops the weakest fraction of
+the remaining groups/features and retrains on the in-memory float32 matrix;
+pruning stops as soon as test R² falls more than ``tolerance`` below the
+full-width model.
+
+Usage:
+    python -m pipeline.prune --tolerance 0.005 --step 0.1
+"""
+
+import io
+import json
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+
+from pipeline.data import DATA_DIR, MODELS_DIR, load_training_matrices, load_feature_importance
+from pipeline.backtest import DEFAULT_MODEL_PARAMS
+from pipeline.metrics import regression_scores
+from pipeline.timing import time_calls
+
+
+def feature_groups(columns):
+    """Map each pruning unit to its columns.
+
+    Columns sharing a ``<prefix>_`` where the prefix is not itself a column
+    are treated as one one-hot group; everything else is its own unit.
+    """
+    columns = list(columns)
+    present = set(columns)
+    by_prefix = {}
+    for col in columns:
+        prefix = col.split('_', 1)[0]
+        if '_' in col and prefix not in present:
+            by_prefix.setdefault(prefix, []).append(col)
+
+    groups = {}
+    for col in columns:
+        prefix = col.split('_', 1)[0]
+        members = by_prefix.get(prefix, [])
+        if len(members) > 1:
+            groups.setdefault(prefix, members)
+        else:
+            groups[col] = [col]
+    return groups
+
+
+def model_size_bytes(model):
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+
+def fit_and_score(X_train, y_train, X_test, y_test, columns, params, n_jobs=-1):
+    """Train on a column subset and collect accuracy, size and latency"""
+    import xgboost as xgb
+
+    model = xgb.XGBRegressor(**params, n_jobs=n_jobs, importance_type='gain')
+    start = time.time()
+    model.fit(X_train[columns], y_train)
+    train_time = time.time() - start
+
+    X_eval = X_test[columns]
+    single = X_eval.iloc[[0]]
+    scores = regression_scores(y_test, model.predict(X_eval))
+    return model, {
+        'n_features': len(columns),
+        'test_r2': scores['r2'],
+        'test_rmse': scores['rmse'],
+        'train_time': train_time,
+        'model_bytes': model_size_bytes(model),
+        'row_latency_ms': time_calls(lambda: model.predict(single), repeat=30)['p50_ms'],
+    }
+
+
+def prune(X_train, y_train, X_test, y_test, importance, tolerance=0.005, step=0.1,
+          max_rounds=20, params=None):
+    """Iteratively drop weak groups; return (model, columns, history)"""
+    params = dict(DEFAULT_MODEL_PARAMS, **(params or {}))
+    X_train = X_train.astype(np.float32)
+    X_test = X_test.astype(np.float32)
+
+    columns = list(X_train.columns)
+    model, stats = fit_and_score(X_train, y_train, X_test, y_test, columns, params)
+    baseline_r2 = stats['test_r2']
+    history = [dict(stats, round=0, dropped=0, accepted=True)]
+    print(f"Round 0: {len(columns)} features, R²={baseline_r2:.4f}")
+
+    best_model, best_columns = model, columns
+    gain = importance.reindex(columns).fillna(0.0)
+
+    for rnd in range(1, max_rounds + 1):
+        groups = feature_groups(best_columns)
+        scores = pd.Series({unit: gain.reindex(cols).fillna(0.0).sum() for unit, cols in groups.items()})
+        n_drop = max(1, int(len(scores) * step))
+        if n_drop >= len(scores):
+            break
+
+        weakest = scores.sort_values().index[:n_drop]
+        dropped = {c for unit in weakest for c in groups[unit]}
+        candidate = [c for c in best_columns if c not in dropped]
+
+        model, stats = fit_and_score(X_train, y_train, X_test, y_test, candidate, params)
+        accepted = baseline_r2 - stats['test_r2'] <= tolerance
+        history.append(dict(stats, round=rnd, dropped=len(dropped), accepted=accepted))
+        print(f"Round {rnd}: {len(candidate)} features, R²={stats['test_r2']:.4f} "
+              f"({'kept' if accepted else 'rejected'})")
+        if not accepted:
+            break
+
+        best_model, best_columns = model, candidate
+        gain = pd.Series(model.feature_importances_, index=candidate)
+
+    return best_model, best_columns, history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importance-driven feature pruning with an R² guardrail")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--output-dir', default=str(MODELS_DIR / 'pruned'))
+    parser.add_argument('--tolerance', type=float, default=0.005, help="Max allowed drop in test R²")
+    parser.add_argument('--step', type=float, default=0.1, help="Fraction of groups dropped per round")
+    parser.add_argument('--max-rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    X_train, X_test, y_train, y_test = load_training_matrices(args.data_dir)
+    importance = load_feature_importance(args.models_dir)
+
+    model, columns, history = prune(X_train, y_train, X_test, y_test, importance,
+                                    args.tolerance, args.step, args.max_rounds)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, output_dir / 'pruned_model.joblib')
+    with open(output_dir / 'expected_feature_columns.json', 'w') as f:
+        json.dump(columns, f, indent=2)
+
+    before = history[0]
+    after = [h for h in history if h['accepted']][-1]
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'tolerance': args.tolerance,
+        'before': before,
+        'after': after,
+        'history': history,
+    }
+    with open(output_dir / 'pruning_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'':18}{'before':>14}{'after':>14}")
+    for key in ['n_features', 'test_r2', 'train_time', 'model_bytes', 'row_latency_ms']:
+        print(f"{key:18}{before[key]:>14,.4g}{after[key]:>14,.4g}")
+    print(f"\nSaved pruned model and feature list to {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
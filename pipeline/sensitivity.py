@@ -0,0 +1,84 @@
+"""
+Sensitivity - vectorized what-if sweeps around a single feature vector
+
+Instead of one model.predict per edited input, the current row is copied
+once per grid point (one or two swept features), engineered columns that
+depend on the swept inputs are refreshed, and the whole batch is scored in
+a single predict call.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# Default sweep ranges (min, max, integer-valued)
+SWEEP_RANGES = {
+    'LivingArea': (500, 10000, False),
+    'YearBuilt': (1900, datetime.now().year, True),
+    'BedroomsTotal': (1, 10, True),
+    'BathroomsTotalInteger': (1, 10, True),
+    'GarageSpaces': (0, 5, True),
+    'LotSizeAcres': (0.05, 5.0, False),
+}
+
+
+def sweep_values(feature, n_points):
+    """Evenly spaced grid for a feature, de-duplicated for integer features"""
+    lo, hi, integer = SWEEP_RANGES[feature]
+    values = np.linspace(lo, hi, n_points)
+    if integer:
+        values = np.unique(np.round(values))
+    return values
+
+
+# Notebook 02 columns derived from the form inputs by refresh_engineered
+ENGINEERED_COLUMNS = ['BuildingAge', 'TotalRooms', 'HasGarage']
+
+
+def refresh_engineered(X, reference_year=None):
+    """Recompute the notebook 02 engineered columns after inputs change"""
+    if 'BuildingAge' in X.columns and 'YearBuilt' in X.columns:
+        X['BuildingAge'] = ((reference_year or datetime.now().year) - X['YearBuilt']).clip(lower=0)
+    if 'TotalRooms' in X.columns and 'BedroomsTotal' in X.columns and 'BathroomsTotalInteger' in X.columns:
+        X['TotalRooms'] = X['BedroomsTotal'] + X['BathroomsTotalInteger']
+    if 'HasGarage' in X.columns and 'GarageSpaces' in X.columns:
+        X['HasGarage'] = (X['GarageSpaces'] > 0).astype(X['HasGarage'].dtype)
+    return X
+
+
+def build_sweep(base_row, grids):
+    """Copy ``base_row`` once per point of the Cartesian product of ``grids``.
+
+    ``grids`` maps feature name -> 1-D array of values (one or two features).
+    Swept columns are stored as float64 so grid values are never truncated.
+    """
+    names = list(grids)
+    mesh = np.meshgrid(*[np.asarray(grids[n]) for n in names], indexing='ij')
+    n_rows = mesh[0].size
+
+    batch = pd.DataFrame(np.repeat(base_row.to_numpy(), n_rows, axis=0), columns=base_row.columns)
+    batch = batch.astype(base_row.dtypes.to_dict())
+    for name, values in zip(names, mesh):
+        if name in batch.columns:
+            batch[name] = values.ravel().astype(np.float64)
+    return refresh_engineered(batch), [m.ravel() for m in mesh]
+
+
+def sensitivity(model, base_row, grids, **predict_kwargs):
+    """Score every grid point in one predict call.
+
+    ``base_row`` should already have its engineered columns refreshed, so
+    the curve passes through the base row's own prediction. A tiered model
+    scores the grid on the tier that serves ``base_row``, not on the one its
+    (larger) batch size would pick. ``predict_kwargs`` are the ones the base
+    row was priced with (e.g. ``postal_codes`` for region shards).
+
+    Returns a long DataFrame with one column per swept feature plus
+    ``prediction``.
+    """
+    batch, points = build_sweep(base_row, grids)
+    result = pd.DataFrame({name: values for name, values in zip(grids, points)})
+    tier_for = getattr(model, 'tier_for', None)
+    kwargs = dict(predict_kwargs, tier=tier_for(base_row)) if tier_for is not None else predict_kwargs
+    result['prediction'] = np.asarray(model.predict(batch, **kwargs), dtype=float)
+    return result
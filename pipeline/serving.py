@@ -0,0 +1,129 @@
+"""
+Serving - model resolution and prediction wrappers used by the Streamlit app
+"""
+
+import os
+import json
+import joblib
+from pathlib import Path
+
+from pipeline.data import MODELS_DIR
+from pipeline.preprocessing import clean_column_name
+from pipeline.ensemble import parallelize
+from pipeline.shards import load_sharded_model
+from pipeline.concurrency import ThreadBudget, BudgetedModel, configure_estimator, limit_library_threads
+
+# Same preference order load_model() has always used
+MODEL_CANDIDATES = [
+    'best_ensemble_model.joblib',
+    'best_advanced_model.joblib',
+    'best_model_final.joblib',
+]
+STUDENT_MODEL = 'student_model.joblib'
+SHARDED_MODEL_NAME = 'region_shards'
+
+# Serve per-region shards (python -m pipeline.shards) instead of the single model
+SHARDED = os.environ.get('HOME_PRICE_SHARDED', '').lower() in ('1', 'true', 'yes')
+
+# Requests up to this many rows are treated as interactive
+INTERACTIVE_MAX_ROWS = 64
+
+
+def resolve_model_path(models_dir=MODELS_DIR):
+    """First existing model from MODEL_CANDIDATES (last one if none exist)"""
+    models_dir = Path(models_dir)
+    for name in MODEL_CANDIDATES:
+        path = models_dir / name
+        if path.exists():
+            return path
+    return models_dir / MODEL_CANDIDATES[-1]
+
+
+class DistilledModel:
+    """Compact student model that only needs a subset of the feature columns"""
+
+    def __init__(self, model, features):
+        self.model = model
+        self.features = list(features)
+
+    def predict(self, X):
+        missing = [f for f in self.features if f not in X.columns]
+        if missing:
+            # Callers may pass notebook 02 column names; the student uses sanitized ones
+            X = X.rename(columns=clean_column_name)
+            X = X.reindex(columns=self.features, fill_value=0)
+        return self.model.predict(X[self.features])
+
+
+class TieredModel:
+    """Route small interactive requests to the student, batches to the teacher.
+
+    ``tier`` can force 'fast' (student) or 'accurate' (teacher); by default
+    requests of at most ``interactive_max_rows`` rows go to the student.
+    """
+
+    def __init__(self, teacher, student, interactive_max_rows=INTERACTIVE_MAX_ROWS, metrics=None):
+        self.teacher = teacher
+        self.student = student
+        self.interactive_max_rows = interactive_max_rows
+        self.metrics = metrics or {}
+
+    def route(self, X, tier=None):
+        if tier == 'accurate' or self.student is None:
+            return self.teacher
+        if tier == 'fast' or len(X) <= self.interactive_max_rows:
+            return self.student
+        return self.teacher
+
+    def tier_for(self, X):
+        """Tier that serves ``X`` by default; pass it to keep related requests on one model"""
+        return 'fast' if self.route(X) is self.student else 'accurate'
+
+    def predict(self, X, tier=None):
+        return self.route(X, tier).predict(X)
+
+
+def load_student(models_dir=MODELS_DIR):
+    """Load the distilled student and its metrics, or (None, {}) if absent"""
+    models_dir = Path(models_dir)
+    path = models_dir / STUDENT_MODEL
+    if not path.exists():
+        return None, {}
+    metrics = {}
+    metrics_path = models_dir / 'student_model_metrics.json'
+    if metrics_path.exists():
+        with open(metrics_path) as f:
+            metrics = json.load(f)
+    return joblib.load(path), metrics
+
+
+def load_serving_model(models_dir=MODELS_DIR, sharded=SHARDED):
+    """The model stack the app serves, and its file name.
+
+    Best available model on the serving ThreadBudget, ensembles predicting
+    their members concurrently, and the distilled student (if any) in front
+    for interactive requests. With ``sharded`` (and trained shards) the
+    lazily loaded region shards are served instead.
+    """
+    models_dir = Path(models_dir)
+    model_path = resolve_model_path(models_dir)
+
+    # Split CPUs between concurrent sessions and each prediction's library threads
+    budget = ThreadBudget.for_serving()
+    limit_library_threads(budget.inner)
+
+    if sharded:
+        shards = load_sharded_model(models_dir, n_threads=budget.inner)
+        if shards is not None:
+            return BudgetedModel(shards, budget), SHARDED_MODEL_NAME
+
+    # Voting/Stacking ensembles predict their members concurrently
+    model = configure_estimator(joblib.load(model_path), budget.inner)
+    model = parallelize(model, thread_budget=budget.inner)
+
+    # Route interactive requests to the distilled student when available
+    student, student_metrics = load_student(models_dir)
+    if student is not None:
+        configure_estimator(student.model, budget.inner)
+        model = TieredModel(model, student, metrics=student_metrics)
+    return BudgetedModel(model, budget), model_path.name
@@ -0,0 +1,282 @@
+"""
+Region shards - per-region models with a global fallback, loaded lazily
+
+Requests cluster by city/postal code, yet one large model serves the whole
+state. Here the training data is split by region (the first ``digits``
+digits of PostalCode, i.e. the ZIP3 sectional center by default). Notebook 02
+target-encodes PostalCode, so the model matrix has no usable code: the raw
+codes travel next to X as a separate key series, read from
+train_raw.csv/test_raw.csv for training and taken from the request when
+serving. Every
+region with at least ``--min-rows`` training rows gets its own small model,
+and a global model of the same size is trained on all rows as the fallback
+for sparse or unknown regions. Shards are trained concurrently, with threads
+split by the ThreadBudget, and saved as models/shards/<name>.joblib next to
+shard_index.json (routes, per-shard sizes and test metrics).
+
+At serving time ShardedModel routes each row to the shard of the postal
+code passed with it (``predict(X, postal_codes=...)``). Shards
+are only loaded when first requested and kept in a bounded LRU cache
+(HOME_PRICE_SHARD_CACHE models, default 4), so a worker only holds the
+regions it is actually serving. Set HOME_PRICE_SHARDED=1 to serve shards in
+the app.
+
+Usage:
+    python -m pipeline.shards --min-rows 2000                  # train models/shards/
+    python -m pipeline.shards --min-rows 2000 --digits 3 --n-estimators 300 --raw-dir filled_data
+    HOME_PRICE_SHARDED=1 streamlit run app.py
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.data import (RAW_DATA_DIR, DATA_DIR, MODELS_DIR, load_training_matrices,
+                           load_training_keys, parse_postal_codes)
+from pipeline.backtest import DEFAULT_MODEL_PARAMS
+from pipeline.metrics import regression_scores
+from pipeline.preprocessing import clean_column_name
+from pipeline.concurrency import ThreadBudget, configure_estimator, limit_library_threads
+
+SHARDS_DIR = 'shards'
+SHARD_INDEX = 'shard_index.json'
+GLOBAL_SHARD = 'global'
+# Raw column regions come from; passed next to X, never read from the model matrix
+REGION_COLUMN = 'PostalCode'
+REGION_DIGITS = 3
+MIN_SHARD_ROWS = 2000
+MAX_LOADED_SHARDS = int(os.environ.get('HOME_PRICE_SHARD_CACHE', '4'))
+
+
+def region_keys(postal_codes, digits=REGION_DIGITS):
+    """Region of every raw postal code: its leading ``digits`` digits (NaN if unknown)"""
+    return np.floor(parse_postal_codes(postal_codes) / 10 ** (5 - digits))
+
+
+def shard_name(region, digits=REGION_DIGITS):
+    return f"zip{int(region):0{digits}d}"
+
+
+def fit_shard(name, X, y, params, threads, shards_dir):
+    """Fit one shard and save it; returns its training stats"""
+    import xgboost as xgb
+
+    start = time.time()
+    model = xgb.XGBRegressor(**params, n_jobs=threads).fit(X, y)
+    train_time = time.time() - start
+    path = Path(shards_dir) / f"{name}.joblib"
+    joblib.dump(model, path)
+    return {'rows': int(len(y)), 'train_time': train_time, 'bytes': path.stat().st_size}
+
+
+def train_shards(X_train, y_train, postal_codes, shards_dir, min_rows=MIN_SHARD_ROWS, digits=REGION_DIGITS,
+                 params=None):
+    """Train the global model and one shard per region with >= ``min_rows`` rows, concurrently.
+
+    ``postal_codes`` holds the raw postal code of every X_train row.
+    """
+    if len(postal_codes) != len(X_train):
+        raise ValueError(f"{len(postal_codes)} postal codes for {len(X_train)} training rows")
+    params = dict(DEFAULT_MODEL_PARAMS, **(params or {}))
+    shards_dir = Path(shards_dir)
+    shards_dir.mkdir(parents=True, exist_ok=True)
+
+    keys = region_keys(postal_codes, digits)
+    counts = pd.Series(keys).value_counts()
+    regions = sorted(int(r) for r, n in counts.items() if n >= min_rows)
+    jobs = [(GLOBAL_SHARD, np.arange(len(y_train)))]
+    jobs += [(shard_name(r, digits), np.flatnonzero(keys == r)) for r in regions]
+
+    budget = ThreadBudget().plan(len(jobs))
+    print(f"Training {len(jobs)} shards ({len(regions)} regions + global) on "
+          f"{budget.outer} workers x {budget.inner} threads")
+    with ThreadPoolExecutor(max_workers=budget.outer) as pool:
+        futures = {name: pool.submit(fit_shard, name, X_train.iloc[rows], y_train[rows], params,
+                                     budget.inner, shards_dir)
+                   for name, rows in jobs}
+        shards = {name: f.result() for name, f in futures.items()}
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'region_column': REGION_COLUMN,
+        'digits': digits,
+        'min_rows': min_rows,
+        'params': params,
+        'features': list(X_train.columns),
+        'routes': {str(r): shard_name(r, digits) for r in regions},
+        'shards': shards,
+    }
+
+
+class ShardedModel:
+    """Route rows to their region's shard, loading shards on demand into a bounded LRU cache.
+
+    ``postal_codes`` (one per row, or one for every row) picks the region;
+    rows without one, or without a trained region shard, go to the global
+    model. At most ``max_loaded`` shards (the global one included) are held
+    at a time.
+    """
+
+    def __init__(self, shards_dir, index, max_loaded=MAX_LOADED_SHARDS, n_threads=None):
+        self.shards_dir = Path(shards_dir)
+        self.index = index
+        self.digits = index['digits']
+        self.features = pd.Index(index['features'])
+        self.routes = {int(r): name for r, name in index['routes'].items()}
+        self.max_loaded = max(1, max_loaded)
+        self.n_threads = n_threads
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def loaded(self):
+        """Names of the shards currently in memory, least recently used first"""
+        with self._lock:
+            return list(self._cache)
+
+    def shard_for(self, postal_codes):
+        """Shard name serving each of ``postal_codes``"""
+        keys = region_keys(np.atleast_1d(np.asarray(postal_codes, dtype=object)), self.digits)
+        return pd.Series(keys).map(self.routes).fillna(GLOBAL_SHARD).to_numpy()
+
+    def _get(self, name):
+        with self._lock:
+            model = self._cache.get(name)
+            if model is not None:
+                self._cache.move_to_end(name)
+                self.stats['hits'] += 1
+                return model
+            self.stats['misses'] += 1
+
+        # Load outside the lock so requests for cached shards are not held up
+        model = joblib.load(self.shards_dir / f"{name}.joblib")
+        if self.n_threads:
+            configure_estimator(model, self.n_threads)
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep a single copy
+            model = self._cache.setdefault(name, model)
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.max_loaded:
+                self._cache.popitem(last=False)
+                self.stats['evictions'] += 1
+        return model
+
+    def _align(self, X):
+        if X.columns.equals(self.features):
+            return X
+        # Callers may pass notebook 02 column names; shards use sanitized ones
+        X = X.rename(columns=clean_column_name)
+        return X.reindex(columns=self.features, fill_value=0)
+
+    def predict(self, X, postal_codes=None):
+        if postal_codes is None:
+            return self._get(GLOBAL_SHARD).predict(self._align(X))
+        if np.ndim(postal_codes) == 0 or len(X) == 1:
+            # One region for the whole request (a form row, or a what-if grid around it)
+            name = self.shard_for(postal_codes)[0]
+            return self._get(name).predict(self._align(X))
+
+        names = self.shard_for(postal_codes)
+        if len(names) != len(X):
+            raise ValueError(f"{len(names)} postal codes for {len(X)} rows")
+        X = self._align(X)
+        if (names == names[0]).all():
+            return self._get(names[0]).predict(X)
+
+        prediction = np.empty(len(X))
+        # Shards already in memory first, so a batch evicts as little as possible
+        cached = set(self.loaded())
+        for name in sorted(np.unique(names), key=lambda n: n not in cached):
+            rows = np.flatnonzero(names == name)
+            prediction[rows] = self._get(name).predict(X.iloc[rows])
+        return prediction
+
+
+def load_shard_index(models_dir=MODELS_DIR):
+    """shard_index.json from models/shards, or None if no shards were trained"""
+    path = Path(models_dir) / SHARDS_DIR / SHARD_INDEX
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_sharded_model(models_dir=MODELS_DIR, max_loaded=MAX_LOADED_SHARDS, n_threads=None):
+    """ShardedModel over models/shards (no shard is loaded yet), or None if absent"""
+    index = load_shard_index(models_dir)
+    if index is None:
+        return None
+    return ShardedModel(Path(models_dir) / SHARDS_DIR, index, max_loaded, n_threads)
+
+
+def region_table(postal_codes, y, predictions, digits=REGION_DIGITS):
+    """Test R²/RMSE per region of ``postal_codes`` for each named prediction array"""
+    keys = pd.Series(region_keys(postal_codes, digits))
+    rows = []
+    for region, idx in keys.groupby(keys).groups.items():
+        idx = np.asarray(idx)
+        row = {'region': shard_name(region, digits), 'rows': len(idx)}
+        for label, pred in predictions.items():
+            scores = regression_scores(y[idx], pred[idx])
+            row[f'{label}_r2'] = scores['r2']
+            row[f'{label}_rmse'] = scores['rmse']
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train per-region model shards with a global fallback")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--raw-dir', default=str(RAW_DATA_DIR),
+                        help="Notebook 01 train_raw.csv/test_raw.csv, for the raw postal codes")
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--min-rows', type=int, default=MIN_SHARD_ROWS,
+                        help="Training rows a region needs for its own shard")
+    parser.add_argument('--digits', type=int, default=REGION_DIGITS, help="PostalCode digits defining a region")
+    parser.add_argument('--n-estimators', type=int, default=DEFAULT_MODEL_PARAMS['n_estimators'])
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MODEL_PARAMS['max_depth'])
+    args = parser.parse_args()
+
+    limit_library_threads(ThreadBudget().total)
+    X_train, X_test, y_train, y_test = load_training_matrices(args.data_dir)
+    codes_train, codes_test = load_training_keys(REGION_COLUMN, args.raw_dir)
+    if len(codes_train) != len(X_train) or len(codes_test) != len(X_test):
+        raise SystemExit(f"Raw files in {args.raw_dir} do not line up with the matrices in {args.data_dir} "
+                         f"({len(codes_train):,}/{len(codes_test):,} vs {len(X_train):,}/{len(X_test):,} rows)")
+
+    shards_dir = Path(args.models_dir) / SHARDS_DIR
+    start = time.time()
+    index = train_shards(X_train, y_train, codes_train, shards_dir, args.min_rows, args.digits,
+                         {'n_estimators': args.n_estimators, 'max_depth': args.max_depth})
+    train_time = time.time() - start
+
+    # Score with every shard resident; the serving cache size only affects latency
+    sharded = ShardedModel(shards_dir, index, max_loaded=len(index['shards']))
+    predictions = {'sharded': sharded.predict(X_test, codes_test),
+                   'global': sharded.predict(X_test)}
+    index['train_seconds'] = train_time
+    index['test_metrics'] = {label: regression_scores(y_test, pred) for label, pred in predictions.items()}
+    index['fallback_rows'] = int((sharded.shard_for(codes_test) == GLOBAL_SHARD).sum())
+
+    with open(shards_dir / SHARD_INDEX, 'w') as f:
+        json.dump(index, f, indent=2)
+
+    print(region_table(codes_test, y_test, predictions, args.digits)
+          .to_string(index=False, float_format=lambda v: f"{v:,.4f}" if abs(v) < 10 else f"{v:,.0f}"))
+    for label, scores in index['test_metrics'].items():
+        print(f"{label:>8}: test R²={scores['r2']:.4f} RMSE=${scores['rmse']:,.0f}")
+    print(f"{index['fallback_rows']:,} of {len(y_test):,} test rows fall back to the global model")
+    print(f"Saved {len(index['shards'])} shards to {shards_dir} ({train_time:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Score store - last prediction per ListingKey for incremental rescoring
+
+Each entry holds a content hash of the listing's raw row and the version of
+the model/preprocessor that scored it. A batch run only featurizes and
+predicts rows whose hash or model version changed (or that are new), and
+reuses stored predictions for the rest. Notebook 02 drops ListingKey as
+leakage, so it is used here only as the store key and never as a feature.
+
+The hash covers the columns the Preprocessor reads (leakage columns such as
+remarks, agents and timestamps are excluded), so edits that cannot change
+the prediction do not trigger a rescore. Each column is normalized by a
+fixed rule from the fitted Preprocessor (number or text), never by the
+dtype pandas inferred for the chunk at hand, so a listing hashes the same
+in every chunk and every run.
+"""
+
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from pipeline.data import CACHE_DIR, TARGET, file_fingerprint
+from pipeline.preprocessing import leakage_columns, PREPROCESSOR_FILE, ENGINEERED_INPUTS
+
+KEY_COLUMN = 'ListingKey'
+STORE_PATH = CACHE_DIR / 'score_store.pkl'
+
+# Hashed in place of every missing value under the text rule (the number rule uses NaN)
+MISSING = '\x00missing'
+BOOL_TEXT = {'True': '1', 'False': '0', 'true': '1', 'false': '0'}
+
+
+def model_version(model_path, models_dir):
+    """Identifier that changes whenever the model or the fitted preprocessing changes"""
+    parts = [file_fingerprint(model_path)]
+    prep_path = Path(models_dir) / PREPROCESSOR_FILE
+    if prep_path.exists():
+        parts.append(file_fingerprint(prep_path))
+    return hashlib.sha1(':'.join(parts).encode()).hexdigest()[:12]
+
+
+def hash_schema(prep):
+    """Normalization rule ('number' or 'text') for every raw column ``prep`` reads"""
+    text = set(prep.onehot_cols_) | set(prep.target_maps_)
+    read = set(prep.raw_feature_columns_) | set(ENGINEERED_INPUTS) | text
+    return {col: 'text' if col in text else 'number' for col in sorted(read)}
+
+
+def _as_number(values):
+    """float64, NaN for anything missing or unparseable; True/False as 1/0"""
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return values.astype('float64').to_numpy()
+    text = values.astype(str).str.strip().replace(BOOL_TEXT)
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype='float64')
+
+
+def _as_text(values):
+    """Stripped text with numbers in one form (70808, 70808.0 and '70808' agree), MISSING for gaps"""
+    text = values.astype(str).str.strip()
+    numbers = pd.to_numeric(text, errors='coerce')
+    parsed = numbers.notna().to_numpy()
+    result = text.to_numpy(dtype=object)
+    if parsed.any():
+        result[parsed] = numbers[parsed].astype('float64').astype(str).to_numpy(dtype=object)
+    result[values.isna().to_numpy() | (text == '').to_numpy()] = MISSING
+    return result
+
+
+def row_hashes(df, schema=None):
+    """uint64 content hash per row over the feature-relevant raw columns.
+
+    ``schema`` (from hash_schema) fixes each column's rule and limits the
+    hash to the columns the Preprocessor reads. Without it, every
+    non-leakage column is hashed under the text rule.
+    """
+    if schema is None:
+        drop = set(leakage_columns(df.columns)) | {TARGET}
+        schema = {c: 'text' for c in df.columns if c not in drop}
+    columns = sorted(c for c in schema if c in df.columns)
+    normalized = {col: _as_number(df[col]) if schema[col] == 'number' else _as_text(df[col])
+                  for col in columns}
+    frame = pd.DataFrame(normalized, index=df.index)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class ScoreStore:
+    """ListingKey -> (row_hash, model_version, predicted_price), persisted as a pickle"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = Path(path)
+        if self.path.exists():
+            self.table = pd.read_pickle(self.path)
+        else:
+            self.table = pd.DataFrame({'row_hash': pd.Series(dtype='uint64'),
+                                       'model_version': pd.Series(dtype=object),
+                                       'predicted_price': pd.Series(dtype='float64')})
+            self.table.index.name = KEY_COLUMN
+        self._updates = []
+
+    def __len__(self):
+        return len(self.table)
+
+    def _positions(self, keys):
+        return self.table.index.get_indexer(pd.Index(keys))
+
+    def predictions(self, keys):
+        """Stored predictions aligned to ``keys`` (NaN for unknown keys)"""
+        pos = self._positions(keys)
+        stored = self.table['predicted_price'].to_numpy()
+        return np.where(pos >= 0, stored[pos], np.nan) if len(stored) else np.full(len(pos), np.nan)
+
+    def changed(self, keys, hashes, version):
+        """Boolean mask of rows that must be rescored: new, edited or scored by another model"""
+        pos = self._positions(keys)
+        found = pos >= 0
+        same = np.zeros(len(pos), dtype=bool)
+        # Compared as uint64 arrays - a NaN-padded reindex would round hashes through float64
+        same[found] = ((self.table['row_hash'].to_numpy()[pos[found]] == np.asarray(hashes)[found]) &
+                       (self.table['model_version'].to_numpy()[pos[found]] == version))
+        return ~same
+
+    def update(self, keys, hashes, predictions, version):
+        """Queue new results; they are written by save()"""
+        keys = pd.Index(keys, name=KEY_COLUMN)
+        valid = ~keys.isna()
+        self._updates.append(pd.DataFrame({
+            'row_hash': np.asarray(hashes, dtype='uint64')[valid],
+            'model_version': version,
+            'predicted_price': np.asarray(predictions, dtype='float64')[valid],
+        }, index=keys[valid]))
+
+    def save(self):
+        if not self._updates:
+            return
+        table = pd.concat([self.table] + self._updates)
+        self.table = table[~table.index.duplicated(keep='last')]
+        self._updates = []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        self.table.to_pickle(tmp)
+        tmp.replace(self.path)
@@ -0,0 +1,444 @@
+"""
+Synthetic MLS data - raw monthly files at any scale, shaped like the real export
+
+The raw CRMLS files are private, so this rebuilds a raw column layout from
+the schema artifacts the notebooks leave in models/:
+- ``<col>_target`` features become high-cardinality categoricals
+- one-hot groups (``Levels_One``, ``PoolPrivateYN_True``...) become
+  categoricals/booleans with exactly those values
+- engineered columns (BuildingAge, TotalRooms, HasGarage) are left for the
+  Preprocessor to derive, everything else is numeric
+
+The raw columns later stages group or join on are always emitted, whether
+or not the schema has them (KEY_DEFAULTS). The market cube, region shards,
+undervalued scan and comparables index can therefore all run on the output:
+- City: 900 values (above HIGH_CARD_THRESHOLD, so target-encoded as in
+  notebook 02), 0.2% missing
+- PostalCode: 1,600 distinct 5-digit ZIP strings, 0.5% missing. ZIPs are
+  drawn from the row's city: every city has at least one, busier cities
+  more, and each ZIP belongs to one city (when a schema or profile has fewer
+  ZIPs than cities, cities share them instead)
+- PropertyType: the schema's one-hot values if present, else five CRMLS
+  types, never missing
+- LivingArea, Latitude, Longitude: NUMERIC_DEFAULTS (Latitude/Longitude
+  cluster around a centre per city)
+- ListingKey, CloseDate (uniform within the month), ListPrice and
+  ClosePrice: never missing
+
+Column statistics come from an optional profile (``--profile``) holding
+missing rates, numeric deciles and category frequencies but no rows. It can
+be built from the real export with ``--profile-from``. Without a profile,
+values and cardinalities the schema records (one-hot values) are reproduced,
+and everything it cannot record (missing rates, numeric spreads, the size of
+target-encoded columns) falls back to the documented defaults. Every column
+records its ``source`` ('profile', 'schema' or 'default'), and main()
+reports the counts. Without schema artifacts or a profile, generation fails.
+ClosePrice is drawn from a log-linear price model whose effect sizes follow
+feature_importance.json.
+
+Rows are generated in fixed-size chunks on a process pool and streamed to
+disk, so memory stays flat from 10k to 10M rows. Every chunk has its own
+seed, so the output is reproducible regardless of the worker count.
+
+Usage:
+    python -m pipeline.synthetic --rows 1000000 --months 8 --output synthetic_data --workers 8
+    python -m pipeline.synthetic --profile-from filled_data --profile models/raw_profile.json
+"""
+
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from pipeline.data import MODELS_DIR, TARGET, list_monthly_files, parse_postal_codes
+from pipeline.preprocessing import HIGH_CARD_THRESHOLD, leakage_columns
+from pipeline.prune import feature_groups
+from pipeline.concurrency import ThreadBudget
+
+CHUNK_ROWS = 100000
+ENGINEERED = {'BuildingAge', 'TotalRooms', 'HasGarage'}
+DECILES = np.linspace(0, 1, 11)
+
+# (deciles, missing rate, integer-valued) for common MLS numeric fields
+NUMERIC_DEFAULTS = {
+    'LivingArea': ([450, 950, 1150, 1330, 1500, 1680, 1880, 2120, 2450, 3000, 9000], 0.01, True),
+    'LotSizeAcres': ([0.01, 0.06, 0.1, 0.12, 0.14, 0.16, 0.18, 0.22, 0.3, 0.6, 40], 0.08, False),
+    'LotSizeArea': ([400, 2600, 4300, 5200, 6000, 6900, 7800, 9500, 13000, 26000, 1700000], 0.08, True),
+    'YearBuilt': ([1900, 1948, 1956, 1963, 1971, 1978, 1985, 1992, 2002, 2016, 2025], 0.02, True),
+    'BedroomsTotal': ([1, 2, 2, 3, 3, 3, 3, 4, 4, 4, 8], 0.01, True),
+    'BathroomsTotalInteger': ([1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 7], 0.01, True),
+    'GarageSpaces': ([0, 0, 1, 2, 2, 2, 2, 2, 2, 3, 6], 0.15, True),
+    'ParkingTotal': ([0, 1, 2, 2, 2, 2, 2, 2, 3, 4, 10], 0.1, True),
+    'StoriesTotal': ([1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4], 0.3, True),
+    'Latitude': ([32.55, 33.6, 33.8, 33.95, 34.05, 34.15, 34.4, 35.2, 37.3, 38.3, 41.9], 0.02, False),
+    'Longitude': ([-124.2, -122.2, -121.3, -118.9, -118.4, -118.2, -117.9, -117.6, -117.2, -116.8, -114.3], 0.02, False),
+}
+GENERIC_NUMERIC = (list(np.linspace(0, 100, 11)), 0.1, False)
+CATEGORICAL_MISSING = 0.05
+BOOLEAN_TRUE_RATE = 0.2
+TARGET_ENCODED_VALUES = int(HIGH_CARD_THRESHOLD * 1.5)
+
+# Raw columns the pipeline groups or joins on; emitted even when the schema lacks them (see module docstring)
+N_CITIES = 900
+N_POSTAL_CODES = 1600
+PROPERTY_TYPES = ['Residential', 'ResidentialIncome', 'ManufacturedInPark', 'Land', 'CommercialSale']
+KEY_DEFAULTS = {
+    'City': {'kind': 'categorical', 'values': [f"City {i:04d}" for i in range(N_CITIES)],
+             'probs': None, 'missing': 0.002},
+    'PostalCode': {'kind': 'categorical', 'values': None, 'probs': None, 'missing': 0.005},
+    'PropertyType': {'kind': 'categorical', 'values': PROPERTY_TYPES,
+                     'probs': [0.82, 0.08, 0.04, 0.04, 0.02], 'missing': 0.0},
+}
+KEY_NUMERIC = ['LivingArea', 'Latitude', 'Longitude']
+SCHEMA_FILES = ['expected_feature_columns.json', 'feature_schema.json', 'feature_importance.json']
+
+
+def load_schema_features(models_dir=MODELS_DIR, required=True):
+    """Feature columns from expected_feature_columns.json, feature_schema.json or feature_importance.json.
+
+    Without any of them, raises FileNotFoundError (or returns [] unless ``required``).
+    """
+    models_dir = Path(models_dir)
+    path = models_dir / 'expected_feature_columns.json'
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)
+    path = models_dir / 'feature_schema.json'
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)['feature_columns']
+    path = models_dir / 'feature_importance.json'
+    if path.exists():
+        with open(path) as f:
+            return list(json.load(f))
+    if not required:
+        return []
+    raise FileNotFoundError(f"No schema artifacts in {models_dir} (looked for {', '.join(SCHEMA_FILES)}); "
+                            f"run the notebooks first or pass a --profile built with --profile-from")
+
+
+def load_importance(models_dir=MODELS_DIR):
+    path = Path(models_dir) / 'feature_importance.json'
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _zipf_probs(n, s=1.1):
+    p = 1.0 / (np.arange(n) + 10.0) ** s
+    return p / p.sum()
+
+
+def _postal_codes(n, rng):
+    """``n`` distinct 5-digit ZIP strings in the California range the coordinates cover"""
+    return [f"{z:05d}" for z in np.sort(rng.choice(np.arange(90001, 96162), size=n, replace=False))]
+
+
+def raw_spec(features, importance=None, profile=None, seed=42):
+    """Per raw column: kind, distribution, price effect and ``source`` of its statistics.
+
+    ``profile`` entries override the schema-derived values and may add raw
+    columns the model never sees (e.g. ones notebook 02 drops as mostly empty).
+    The KEY_DEFAULTS/KEY_NUMERIC columns are always present.
+    """
+    importance = importance or {}
+    profile = profile or {}
+    if not features and not profile:
+        raise ValueError("Neither schema features nor a profile to build the raw columns from")
+    rng = np.random.default_rng(seed)
+    total_importance = sum(importance.values()) or 1.0
+    spec = {}
+
+    def weight(columns):
+        share = sum(importance.get(c, 0.0) for c in columns) / total_importance
+        return float(np.sqrt(share))
+
+    for unit, members in feature_groups(features).items():
+        if unit in ENGINEERED or unit.endswith('_raw'):
+            continue
+        if len(members) == 1 and unit.endswith('_target'):
+            col = unit[:-len('_target')]
+            # The schema only says "more than HIGH_CARD_THRESHOLD values"; the size is a default
+            n = TARGET_ENCODED_VALUES
+            spec[col] = {'kind': 'categorical', 'values': [f"{col} {i:04d}" for i in range(n)],
+                         'probs': _zipf_probs(n).tolist(), 'missing': CATEGORICAL_MISSING,
+                         'weight': weight(members), 'source': 'default'}
+        elif len(members) > 1:
+            values = [m[len(unit) + 1:] for m in members]
+            if set(values) <= {'True', 'False'}:
+                spec[unit] = {'kind': 'boolean', 'p_true': BOOLEAN_TRUE_RATE,
+                              'missing': CATEGORICAL_MISSING, 'weight': weight(members), 'source': 'default'}
+            else:
+                spec[unit] = {'kind': 'categorical', 'values': values,
+                              'probs': _zipf_probs(len(values)).tolist(),
+                              'missing': CATEGORICAL_MISSING, 'weight': weight(members), 'source': 'schema'}
+        else:
+            deciles, missing, integer = NUMERIC_DEFAULTS.get(unit, GENERIC_NUMERIC)
+            spec[unit] = {'kind': 'numeric', 'deciles': list(deciles), 'missing': missing,
+                          'integer': integer, 'weight': weight(members), 'source': 'default'}
+
+    # Key columns: target-encoded placeholders and absent columns get the documented defaults
+    for col, default in KEY_DEFAULTS.items():
+        s = spec.get(col)
+        if s is not None and s['source'] == 'schema' and (col != 'PostalCode' or
+                                                          all(pd.notna(parse_postal_codes(s['values'])))):
+            s['missing'] = default['missing']
+            continue
+        values = default['values'] or _postal_codes(N_POSTAL_CODES, rng)
+        probs = default['probs'] or _zipf_probs(len(values)).tolist()
+        spec[col] = dict(default, values=values, probs=probs, source='default',
+                         weight=s['weight'] if s is not None else weight([f'{col}_target']))
+    for col in KEY_NUMERIC:
+        if col not in spec:
+            deciles, missing, integer = NUMERIC_DEFAULTS[col]
+            spec[col] = {'kind': 'numeric', 'deciles': list(deciles), 'missing': missing,
+                         'integer': integer, 'weight': 0.0, 'source': 'default'}
+
+    for col, stats in profile.items():
+        spec[col] = dict(spec.get(col, {'weight': 0.0}), **stats)
+        spec[col]['source'] = 'profile'
+    # City first, so generate_frame can draw each row's PostalCode from its city
+    spec = {'City': spec.pop('City'), **spec}
+
+    # Fixed per-category price effects, so every chunk uses the same market
+    for col, s in spec.items():
+        if s['kind'] == 'categorical':
+            s['effects'] = (rng.normal(0, 1, len(s['values'])) * s['weight']).tolist()
+        elif s['kind'] == 'boolean':
+            s['effects'] = [0.0, float(rng.normal(0, 1) * s['weight'])]
+
+    # (city, ZIP) pairs: every city has a ZIP and every ZIP a city, so the two nest
+    if spec['City']['kind'] == 'categorical' and spec['PostalCode']['kind'] == 'categorical':
+        n_city, n_zip = len(spec['City']['values']), len(spec['PostalCode']['values'])
+        if n_zip >= n_city:
+            zips = np.arange(n_zip)
+            cities = np.concatenate([rng.permutation(n_city),
+                                     rng.choice(n_city, size=n_zip - n_city, p=spec['City']['probs'])])
+        else:
+            cities = np.arange(n_city)
+            zips = rng.permutation(np.concatenate([np.arange(n_zip), rng.choice(n_zip, size=n_city - n_zip)]))
+        spec['PostalCode']['city'] = np.column_stack([cities, zips]).tolist()
+
+    # A centre per city, so coordinates cluster and spatial features carry signal
+    if {'City', 'Latitude', 'Longitude'} <= set(spec) and spec['City']['kind'] == 'categorical':
+        n = len(spec['City']['values'])
+        spec['City']['centres'] = np.column_stack([
+            np.interp(rng.random(n), DECILES, spec['Latitude']['deciles']),
+            np.interp(rng.random(n), DECILES, spec['Longitude']['deciles']),
+        ]).tolist()
+    return spec
+
+
+def _sample_column(s, n, rng):
+    """(raw values, standardized signal used by the price model)"""
+    missing = rng.random(n) < s.get('missing', 0.0)
+    if s['kind'] == 'numeric':
+        deciles = np.asarray(s['deciles'], dtype=float)
+        values = np.interp(rng.random(n), DECILES, deciles)
+        if s.get('integer'):
+            values = np.round(values)
+        spread = (deciles[8] - deciles[2]) or 1.0
+        signal = np.clip((values - deciles[5]) / spread, -3, 3)
+        values = np.where(missing, np.nan, values)
+    elif s['kind'] == 'boolean':
+        flags = rng.random(n) < s['p_true']
+        signal = np.asarray(s['effects'])[flags.astype(int)]
+        values = pd.array(flags, dtype='boolean')
+        values[missing] = pd.NA
+    else:
+        idx = rng.choice(len(s['values']), size=n, p=s['probs'])
+        signal = np.asarray(s['effects'])[idx]
+        values = np.asarray(s['values'], dtype=object)[idx]
+        values[missing] = None
+    return values, np.where(missing, 0.0, signal)
+
+
+def _sample_postal_codes(s, city, n, rng):
+    """PostalCode drawn uniformly among the row's city's ZIPs; rows without a city draw freely"""
+    values, signal = _sample_column(s, n, rng)
+    pairs = np.asarray(s['city'])
+    codes = pd.Categorical(city, categories=s['city_values']).codes
+    order = np.argsort(pairs[:, 0], kind='stable')
+    counts = np.bincount(pairs[:, 0], minlength=len(s['city_values']))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    linked = (codes >= 0) & pd.notna(values)
+    c = codes[linked]
+    idx = pairs[order[starts[c] + np.floor(rng.random(len(c)) * counts[c]).astype(int)], 1]
+    values[linked] = np.asarray(s['values'], dtype=object)[idx]
+    signal[linked] = np.asarray(s['effects'])[idx]
+    return values, signal
+
+
+def generate_frame(spec, n, rng, month='2025-01', key_prefix='S'):
+    """One block of raw rows for ``month`` (YYYY-MM)"""
+    columns, log_price = {}, np.full(n, np.log(650000.0))
+    for col, s in spec.items():
+        if 'city' in s and 'City' in columns:
+            values, signal = _sample_postal_codes(dict(s, city_values=spec['City']['values']),
+                                                  columns['City'], n, rng)
+        else:
+            values, signal = _sample_column(s, n, rng)
+        columns[col] = values
+        if s['kind'] == 'numeric':
+            log_price += 0.35 * s.get('weight', 0.0) * signal
+        else:
+            log_price += 0.25 * signal
+    df = pd.DataFrame(columns)
+
+    if 'centres' in spec.get('City', {}):
+        centres = np.asarray(spec['City']['centres'])
+        codes = pd.Categorical(df['City'], categories=spec['City']['values']).codes
+        for i, col in enumerate(['Latitude', 'Longitude']):
+            has = (codes >= 0) & df[col].notna().to_numpy()
+            df.loc[has, col] = centres[codes[has], i] + rng.normal(0, 0.04, has.sum())
+
+    days = pd.Period(month, 'M').days_in_month
+    close = pd.Timestamp(f"{month}-01") + pd.to_timedelta(rng.integers(0, days, n), unit='D')
+    price = np.exp(log_price + rng.normal(0, 0.18, n))
+    df.insert(0, 'ListingKey', [f"{key_prefix}{i:010d}" for i in range(n)])
+    df['CloseDate'] = close.strftime('%Y-%m-%d')
+    df['ListPrice'] = np.round(price * rng.uniform(0.94, 1.08, n), -3)
+    df[TARGET] = np.round(price, -3)
+    return df
+
+
+def _write_chunk(spec, n, seed, month, key_prefix, path):
+    """Worker task: generate one chunk and write it as a headerless CSV part"""
+    df = generate_frame(spec, n, np.random.default_rng(seed), month, key_prefix)
+    df.to_csv(path, index=False, header=False)
+    return list(df.columns), n
+
+
+def generate(spec, rows, months, output_dir, start_month='2025-01', workers=None, seed=42,
+             chunk_rows=CHUNK_ROWS):
+    """Write ``rows`` rows spread evenly over ``months`` CRMLSSold<YYYYMM>_filled.csv files"""
+    output_dir = Path(output_dir)
+    parts_dir = output_dir / '_parts'
+    parts_dir.mkdir(parents=True, exist_ok=True)
+
+    periods = pd.period_range(start_month, periods=months, freq='M')
+    per_month = np.full(months, rows // months)
+    per_month[:rows % months] += 1
+    jobs = []
+    seeds = np.random.SeedSequence(seed).spawn(sum(-(-int(m) // chunk_rows) for m in per_month))
+    for period, month_rows in zip(periods, per_month):
+        for c, offset in enumerate(range(0, int(month_rows), chunk_rows)):
+            n = min(chunk_rows, int(month_rows) - offset)
+            prefix = f"S{period.strftime('%Y%m')}{c:04d}"
+            part = parts_dir / f"{period.strftime('%Y%m')}_{c:05d}.csv"
+            jobs.append((str(period), part, n, prefix))
+
+    budget = ThreadBudget().plan(workers or ThreadBudget().total)
+    files = []
+    with ProcessPoolExecutor(max_workers=budget.outer) as pool:
+        futures = [pool.submit(_write_chunk, spec, n, seeds[i].generate_state(1)[0], month, prefix, part)
+                   for i, (month, part, n, prefix) in enumerate(jobs)]
+        header = futures[0].result()[0] if futures else []
+        for period in periods:
+            target = output_dir / f"CRMLSSold{period.strftime('%Y%m')}_filled.csv"
+            tmp = target.with_suffix('.tmp')
+            with open(tmp, 'w', newline='') as out:
+                out.write(','.join(header) + '\n')
+                for future, (month, part, _, _) in zip(futures, jobs):
+                    if month != str(period):
+                        continue
+                    future.result()
+                    with open(part) as src:
+                        shutil.copyfileobj(src, out)
+                    part.unlink()
+            tmp.replace(target)
+            files.append(target)
+            print(f"  {target.name}")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    return files
+
+
+def build_profile(raw_dir, sample_rows=200000, top_values=2000):
+    """Column statistics (no rows) of the real monthly files, for use with --profile"""
+    # Key columns stay text, so ZIPs keep their leading zeros and are profiled as categories
+    frames = [pd.read_csv(p, low_memory=False, dtype=dict.fromkeys(KEY_DEFAULTS, str))
+              for p in list_monthly_files(raw_dir)]
+    df = pd.concat(frames, ignore_index=True)
+    if len(df) > sample_rows:
+        df = df.sample(sample_rows, random_state=42)
+    drop = set(leakage_columns(df.columns)) | {TARGET}
+
+    profile = {}
+    for col in df.columns:
+        if col in drop or col.startswith('Unnamed'):
+            continue
+        values = df[col]
+        missing = float(values.isna().mean())
+        present = values.dropna()
+        if present.empty:
+            continue
+        if pd.api.types.is_bool_dtype(present) or set(present.unique()) <= {True, False}:
+            profile[col] = {'kind': 'boolean', 'missing': missing, 'p_true': float(present.astype(bool).mean())}
+        elif pd.api.types.is_numeric_dtype(present):
+            integer = bool(np.all(np.mod(present, 1) == 0))
+            profile[col] = {'kind': 'numeric', 'missing': missing, 'integer': integer,
+                            'deciles': [float(v) for v in np.quantile(present, DECILES)]}
+        else:
+            counts = present.astype(str).value_counts()
+            # Every ZIP is kept: placeholder tail values would not parse as postal codes
+            top = counts if col == 'PostalCode' else counts.head(top_values)
+            values = top.index.tolist()
+            # Synthetic tail values keep the real cardinality without listing it
+            tail = [f"{col} other {i:05d}" for i in range(len(counts) - len(top))]
+            freqs = np.concatenate([top.to_numpy(dtype=float),
+                                    np.full(len(tail), (counts.sum() - top.sum()) / max(len(tail), 1))])
+            profile[col] = {'kind': 'categorical', 'missing': missing, 'values': values + tail,
+                            'probs': (freqs / freqs.sum()).tolist()}
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic raw MLS monthly files")
+    parser.add_argument('--rows', type=int, default=150000, help="Total rows across all months")
+    parser.add_argument('--months', type=int, default=8)
+    parser.add_argument('--start-month', default='2025-01')
+    parser.add_argument('--output', default='synthetic_data')
+    parser.add_argument('--models-dir', default=str(MODELS_DIR), help="Where the schema artifacts live")
+    parser.add_argument('--profile', default=None, help="Column profile JSON (see --profile-from)")
+    parser.add_argument('--profile-from', default=None, help="Build --profile from real monthly files and exit")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.profile_from:
+        profile = build_profile(args.profile_from)
+        target = Path(args.profile or Path(args.models_dir) / 'raw_profile.json')
+        with open(target, 'w') as f:
+            json.dump(profile, f)
+        print(f"Profiled {len(profile)} columns -> {target}")
+        return
+
+    profile = None
+    if args.profile:
+        with open(args.profile) as f:
+            profile = json.load(f)
+    features = load_schema_features(args.models_dir, required=profile is None)
+    spec = raw_spec(features, load_importance(args.models_dir), profile, args.seed)
+    kinds = pd.Series({c: s['kind'] for c, s in spec.items()}).value_counts().to_dict()
+    sources = pd.Series({c: s['source'] for c, s in spec.items()}).value_counts().to_dict()
+    print(f"Raw schema: {len(spec)} columns {kinds}; statistics from {sources}")
+    print("  keys: " + ", ".join(f"{c} ({len(spec[c]['values']):,} values, {spec[c]['missing']:.1%} missing, "
+                                 f"{spec[c]['source']})" for c in KEY_DEFAULTS if spec[c]['kind'] == 'categorical'))
+
+    start = time.time()
+    files = generate(spec, args.rows, args.months, args.output, args.start_month, args.workers,
+                     args.seed, args.chunk_rows)
+    elapsed = time.time() - start
+    size = sum(f.stat().st_size for f in files) / 1e6
+    print(f"Wrote {args.rows:,} rows to {len(files)} files ({size:,.0f} MB) in {elapsed:.1f}s "
+          f"-> {args.rows / elapsed:,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
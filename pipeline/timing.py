@@ -0,0 +1,23 @@
+"""
+Timing - latency measurement shared by pipeline stages and the benchmark scripts
+"""
+
+import time
+import numpy as np
+
+
+def time_calls(fn, repeat=50, warmup=3):
+    """Call ``fn`` repeatedly and return latency stats in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.asarray(samples)
+    return {
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+    }
@@ -0,0 +1,244 @@
+"""
+Subsample tuning - successive halving on stratified subsamples, then a full refit
+
+The notebook 04 searches fit every sampled config with 3-fold CV on the full
+training matrix. Here the same XGBoost search space is explored on nested
+subsamples of the training data, stratified by price band x region
+(a Latitude/Longitude quantile grid), so every rung keeps the full data's
+mix of cheap/expensive and urban/rural listings:
+- rung 0 fits all candidates on ``--min-rows`` rows
+- each later rung keeps the best 1/eta configs and fits them on eta times
+  as many rows, until the next rung would keep a single config or the
+  sample is the full data
+- the winner is refit on the full training data and scored on the test split
+
+Every fit is scored on the same stratified validation split held out of the
+training data. Fits within a rung run concurrently, with threads split by the
+ThreadBudget. ``--agreement`` also fits every candidate on the full data, then
+reports how well each rung's ranking matches the full-data ranking
+(Spearman rho, Kendall tau, whether the full-data winner was promoted) and
+the wall time the full search would have taken.
+
+Usage:
+    python -m pipeline.tune --candidates 27 --min-rows 4000 --eta 3
+    python -m pipeline.tune --candidates 27 --agreement       # also measure rank agreement
+"""
+
+import json
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.data import DATA_DIR, MODELS_DIR, load_training_matrices
+from pipeline.metrics import regression_scores
+from pipeline.concurrency import ThreadBudget, limit_library_threads
+
+# Search space of notebook 04_1
+XGB_PARAM_DIST = {
+    'n_estimators': [200, 300, 500],
+    'learning_rate': [0.01, 0.03, 0.05, 0.1],
+    'max_depth': [5, 7, 9, 11],
+    'min_child_weight': [1, 3, 5],
+    'subsample': [0.7, 0.8, 0.9],
+    'colsample_bytree': [0.7, 0.8, 0.9],
+    'gamma': [0, 0.1, 0.2],
+    'reg_alpha': [0, 0.1, 0.5],
+    'reg_lambda': [0.5, 1, 1.5, 2],
+}
+BASE_PARAMS = {'random_state': 42, 'tree_method': 'hist', 'verbosity': 0}
+TUNED_MODEL = 'tuned_xgboost.joblib'
+TUNING_REPORT = 'tuning_report.json'
+PRICE_BANDS = 5
+REGION_BINS = 3
+VALIDATION_SIZE = 0.2
+
+
+def strata_labels(X, y, price_bands=PRICE_BANDS, region_bins=REGION_BINS):
+    """Price band x region cell of every row (region = Latitude/Longitude quantile grid, else PostalCode)"""
+    def quantile_codes(values, n):
+        values = pd.Series(np.asarray(values, dtype=float))
+        return pd.qcut(values.rank(method='first'), n, labels=False).fillna(0).astype(int).to_numpy()
+
+    band = quantile_codes(y, price_bands)
+    if 'Latitude' in X.columns and 'Longitude' in X.columns:
+        region = quantile_codes(X['Latitude'], region_bins) * region_bins + quantile_codes(X['Longitude'], region_bins)
+    elif 'PostalCode' in X.columns:
+        region = quantile_codes(X['PostalCode'], region_bins * region_bins)
+    else:
+        region = np.zeros(len(X), dtype=int)
+    return band * (region_bins * region_bins) + region
+
+
+def stratified_order(strata, seed=42):
+    """Row order per stratum (shuffled); any prefix per stratum is a stratified sample"""
+    rng = np.random.default_rng(seed)
+    return {s: rng.permutation(np.flatnonzero(strata == s)) for s in np.unique(strata)}
+
+
+def stratified_sample(order, n):
+    """Nested stratified sample of about ``n`` rows: the same prefix of every stratum's order"""
+    total = sum(len(idx) for idx in order.values())
+    frac = min(1.0, n / total)
+    parts = [idx[:max(1, int(round(frac * len(idx))))] for idx in order.values()]
+    return np.sort(np.concatenate(parts))
+
+
+def sample_configs(n, seed=42):
+    from sklearn.model_selection import ParameterSampler
+    return list(ParameterSampler(XGB_PARAM_DIST, n_iter=n, random_state=seed))
+
+
+def fit_and_score(params, X_fit, y_fit, X_val, y_val, threads):
+    import xgboost as xgb
+
+    start = time.perf_counter()
+    model = xgb.XGBRegressor(**BASE_PARAMS, **params, n_jobs=threads).fit(X_fit, y_fit)
+    fit_time = time.perf_counter() - start
+    return regression_scores(y_val, model.predict(X_val))['r2'], fit_time
+
+
+def evaluate(configs, ids, rows, X, y, X_val, y_val):
+    """Fit ``configs[ids]`` on ``rows`` concurrently; returns {id: (val R², fit seconds)}"""
+    budget = ThreadBudget().plan(len(ids))
+    X_fit, y_fit = X.iloc[rows], y[rows]
+    with ThreadPoolExecutor(max_workers=budget.outer) as pool:
+        futures = {i: pool.submit(fit_and_score, configs[i], X_fit, y_fit, X_val, y_val, budget.inner)
+                   for i in ids}
+        return {i: f.result() for i, f in futures.items()}
+
+
+def successive_halving(configs, X, y, X_val, y_val, order, min_rows=4000, eta=3):
+    """Rungs of (rows, {config id: (R², seconds)}), smallest sample first"""
+    ids = list(range(len(configs)))
+    n_rows = min_rows
+    total = len(y)
+    rungs = []
+    while True:
+        rows = stratified_sample(order, n_rows)
+        start = time.time()
+        scores = evaluate(configs, ids, rows, X, y, X_val, y_val)
+        rungs.append({'rows': len(rows), 'scores': scores, 'wall': time.time() - start})
+        best = max(scores.values(), key=lambda s: s[0])[0]
+        print(f"  rung {len(rungs) - 1}: {len(ids)} configs on {len(rows):,} rows, best R²={best:.4f} "
+              f"({rungs[-1]['wall']:.1f}s)")
+        keep = max(1, len(ids) // eta)
+        # A single survivor is already the winner; the full refit follows
+        if keep == 1 or len(rows) >= total:
+            break
+        ids = sorted(ids, key=lambda i: scores[i][0], reverse=True)[:keep]
+        n_rows *= eta
+    return rungs
+
+
+def rank_agreement(rungs, full_scores):
+    """How well each rung's ranking of its configs matches the full-data ranking"""
+    from scipy.stats import spearmanr, kendalltau
+
+    full_best = max(full_scores, key=lambda i: full_scores[i][0])
+    rows = []
+    for r, rung in enumerate(rungs):
+        ids = list(rung['scores'])
+        row = {'rung': r, 'rows': rung['rows'], 'configs': len(ids),
+               'contains_full_best': full_best in ids,
+               'top1_matches': max(ids, key=lambda i: rung['scores'][i][0]) == full_best}
+        if len(ids) > 2:
+            sub = [rung['scores'][i][0] for i in ids]
+            full = [full_scores[i][0] for i in ids]
+            row['spearman'] = float(spearmanr(sub, full)[0])
+            row['kendall'] = float(kendalltau(sub, full)[0])
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive-halving XGBoost search on stratified subsamples")
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--models-dir', default=str(MODELS_DIR))
+    parser.add_argument('--candidates', type=int, default=27)
+    parser.add_argument('--min-rows', type=int, default=4000, help="Training rows per config in the first rung")
+    parser.add_argument('--eta', type=int, default=3, help="Keep 1/eta configs and multiply rows by eta per rung")
+    parser.add_argument('--agreement', action='store_true',
+                        help="Also fit every config on the full data to measure rank agreement (slow)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    limit_library_threads(ThreadBudget().total)
+    X_train, X_test, y_train, y_test = load_training_matrices(args.data_dir)
+    strata = strata_labels(X_train, y_train)
+
+    # Stratified validation split held out of the training data for every rung
+    order = stratified_order(strata, args.seed)
+    n_val = int(len(y_train) * VALIDATION_SIZE)
+    val_rows = stratified_sample(order, n_val)
+    fit_mask = np.ones(len(y_train), dtype=bool)
+    fit_mask[val_rows] = False
+    X_fit, y_fit = X_train[fit_mask].reset_index(drop=True), y_train[fit_mask]
+    X_val, y_val = X_train.iloc[val_rows], y_train[val_rows]
+    fit_order = stratified_order(strata[fit_mask], args.seed)
+
+    configs = sample_configs(args.candidates, args.seed)
+    print(f"Searching {len(configs)} configs on {len(y_fit):,} training rows "
+          f"({len(np.unique(strata))} price band x region strata), validating on {len(y_val):,}")
+
+    start = time.time()
+    rungs = successive_halving(configs, X_fit, y_fit, X_val, y_val, fit_order, args.min_rows, args.eta)
+    final = rungs[-1]['scores']
+    best_id = max(final, key=lambda i: final[i][0])
+    best_params = configs[best_id]
+    search_time = time.time() - start
+
+    # Refit the winner on all training rows (fit + validation) and score the test split
+    import xgboost as xgb
+    start = time.time()
+    model = xgb.XGBRegressor(**BASE_PARAMS, **best_params, n_jobs=ThreadBudget().total).fit(X_train, y_train)
+    refit_time = time.time() - start
+    test_scores = regression_scores(y_test, model.predict(X_test))
+    print(f"\nBest config {best_id}: {best_params}")
+    print(f"Search {search_time:.1f}s + refit {refit_time:.1f}s -> test R²={test_scores['r2']:.4f} "
+          f"RMSE=${test_scores['rmse']:,.0f}")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'candidates': len(configs),
+        'min_rows': args.min_rows,
+        'eta': args.eta,
+        'best_config': best_id,
+        'best_params': best_params,
+        'search_seconds': search_time,
+        'refit_seconds': refit_time,
+        'test_metrics': test_scores,
+        'rungs': [{'rows': r['rows'], 'wall': r['wall'],
+                   'scores': {str(i): {'r2': s[0], 'fit_seconds': s[1]} for i, s in r['scores'].items()}}
+                  for r in rungs],
+        'configs': configs,
+    }
+
+    if args.agreement:
+        print(f"\nFitting all {len(configs)} configs on the full data for the agreement report...")
+        start = time.time()
+        full_rows = np.arange(len(y_fit))
+        full_scores = evaluate(configs, list(range(len(configs))), full_rows, X_fit, y_fit, X_val, y_val)
+        full_time = time.time() - start
+        agreement = rank_agreement(rungs, full_scores)
+        full_best = max(full_scores, key=lambda i: full_scores[i][0])
+        print(pd.DataFrame(agreement).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        print(f"Full-data best: config {full_best} (val R²={full_scores[full_best][0]:.4f}); "
+              f"halving picked config {best_id} (full-data val R²={full_scores[best_id][0]:.4f})")
+        print(f"Full search {full_time:.1f}s vs halving {search_time:.1f}s -> {full_time / search_time:.1f}x faster")
+        report.update(agreement=agreement, full_search_seconds=full_time, full_best_config=full_best,
+                      full_scores={str(i): s[0] for i, s in full_scores.items()})
+
+    models_dir = Path(args.models_dir)
+    joblib.dump(model, models_dir / TUNED_MODEL)
+    with open(models_dir / TUNING_REPORT, 'w') as f:
+        json.dump(report, f, indent=2, default=float)
+    print(f"Saved {models_dir / TUNED_MODEL} and {models_dir / TUNING_REPORT}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""
+Undervalued listings - rank active inventory by predicted price versus list price
+
+An inventory file is streamed in chunks through the fitted Preprocessor and
+the saved model, as in batch scoring but in-process on the full ThreadBudget.
+ListPrice is a leakage column for the model (notebook 02 drops it), so it is
+set aside before featurization and only used for the comparison.
+
+For every listing:
+- gap = predicted - list price, and gap_pct relative to list price
+- z_score = log(predicted / list price), bias-corrected and divided by the
+  model's log-price error spread in the listing's predicted-price band
+  (from held-out predictions, see ``calibrate``), i.e. how many typical
+  model errors the list price sits below the valuation
+- a 90% valuation interval from the same bands, and whether the list price
+  falls below it
+
+The k highest z-scores per City, per PostalCode and overall are kept in
+bounded heaps as chunks stream by. Group labels are normalized first
+(5-digit ZIP strings, stripped city names), so a chunk read with a float
+PostalCode column lands in the same heap as one read as int. Only each group's top k within a chunk
+(picked with vectorized pandas ops) is offered to the heaps. Results are
+saved for the Analysis page.
+
+Usage:
+    python -m pipeline.undervalued calibrate                 # models/price_error_bands.json from data/X_test.csv
+    python -m pipeline.undervalued scan filled_data/active_listings.csv --top 10
+"""
+
+import json
+import time
+import heapq
+import argparse
+import itertools
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+
+from pipeline.data import DATA_DIR, MODELS_DIR, load_training_matrices, parse_postal_codes
+from pipeline.preprocessing import load_preprocessor
+from pipeline.serving import resolve_model_path
+from pipeline.concurrency import ThreadBudget, limit_library_threads, configure_estimator
+from pipeline.batch_score import CHUNK_SIZE, iter_chunks, score_frame, model_feature_columns, check_model_columns
+from pipeline.store import KEY_COLUMN
+
+UNDERVALUED_FILE = 'undervalued_listings.joblib'
+ERROR_BANDS_FILE = 'price_error_bands.json'
+LIST_PRICE = 'ListPrice'
+GROUP_COLUMNS = ['City', 'PostalCode']
+DISPLAY_COLUMNS = [KEY_COLUMN, 'UnparsedAddress', 'City', 'PostalCode', 'PropertyType',
+                   'LivingArea', 'BedroomsTotal', 'BathroomsTotalInteger', 'YearBuilt']
+TOP_K = 10
+N_BANDS = 10
+
+# Log-price error spread used before calibration (about the 12% test MAPE of notebook 04)
+DEFAULT_LOG_SIGMA = 0.15
+INTERVAL_Z = 1.645
+
+
+def fit_error_bands(predicted, actual, n_bands=N_BANDS):
+    """Median bias and robust spread (1.4826 x MAD) of log(actual / predicted) per predicted-price band"""
+    predicted = np.asarray(predicted, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    valid = (predicted > 0) & (actual > 0)
+    log_pred = np.log(predicted[valid])
+    resid = np.log(actual[valid]) - log_pred
+    edges = np.unique(np.quantile(log_pred, np.linspace(0, 1, n_bands + 1)[1:-1]))
+    band = np.searchsorted(edges, log_pred, side='right')
+    bias, sigma, counts = [], [], []
+    for b in range(len(edges) + 1):
+        r = resid[band == b]
+        median = float(np.median(r)) if len(r) else 0.0
+        bias.append(median)
+        sigma.append(float(1.4826 * np.median(np.abs(r - median))) if len(r) > 1 else DEFAULT_LOG_SIGMA)
+        counts.append(int(len(r)))
+    return {'edges': np.exp(edges).tolist(), 'bias': bias, 'sigma': sigma, 'n': counts}
+
+
+def load_error_bands(models_dir=MODELS_DIR):
+    path = Path(models_dir) / ERROR_BANDS_FILE
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def group_labels(values, col):
+    """Chunk-independent group labels: 5-digit ZIP strings for PostalCode, stripped text otherwise.
+
+    The same column can be read as int, float or text depending on a
+    chunk's values, so '70808', 70808 and 70808.0 must all give '70808'.
+    """
+    if col == 'PostalCode':
+        codes = pd.Series(parse_postal_codes(values), index=values.index)
+        labels = codes.astype('Int64').astype(str).str.zfill(5)
+        return labels.where(codes.notna(), 'Unknown')
+    labels = values.astype(str).str.strip()
+    return labels.where(values.notna() & (labels != ''), 'Unknown')
+
+
+def valuation_frame(chunk, predicted, list_price, bands=None):
+    """Per-listing gap, z-score and interval; ``chunk`` supplies the display columns"""
+    predicted = np.asarray(predicted, dtype=float)
+    list_price = np.asarray(list_price, dtype=float)
+    if bands is None:
+        bias, sigma = np.zeros(len(predicted)), np.full(len(predicted), DEFAULT_LOG_SIGMA)
+    else:
+        band = np.searchsorted(bands['edges'], predicted, side='right')
+        bias, sigma = np.asarray(bands['bias'])[band], np.asarray(bands['sigma'])[band]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_ratio = np.log(predicted) + bias - np.log(list_price)
+        frame = chunk[[c for c in DISPLAY_COLUMNS if c in chunk.columns]].copy()
+        for col in GROUP_COLUMNS:
+            if col in frame.columns:
+                frame[col] = group_labels(frame[col], col)
+            else:
+                frame[col] = 'Unknown'
+        frame[LIST_PRICE] = list_price
+        frame['predicted_price'] = predicted
+        frame['interval_low'] = predicted * np.exp(bias - INTERVAL_Z * sigma)
+        frame['interval_high'] = predicted * np.exp(bias + INTERVAL_Z * sigma)
+        frame['gap'] = predicted - list_price
+        frame['gap_pct'] = frame['gap'] / list_price
+        frame['z_score'] = log_ratio / sigma
+    frame['below_interval'] = list_price < frame['interval_low'].to_numpy()
+    return frame[np.isfinite(frame['z_score'].to_numpy()) & (list_price > 0)]
+
+
+class TopK:
+    """Streaming k best rows by ``score`` per value of ``group`` (or overall), in bounded min-heaps"""
+
+    def __init__(self, k=TOP_K, group=None, score='z_score'):
+        self.k = k
+        self.group = group
+        self.score = score
+        self.heaps = {}
+        self._seq = itertools.count()
+
+    def push(self, frame):
+        if frame.empty:
+            return
+        ranked = frame.sort_values(self.score, ascending=False)
+        # Only a group's top k in this chunk can enter its heap
+        candidates = ranked.groupby(self.group, sort=False).head(self.k) if self.group else ranked.head(self.k)
+        groups = candidates[self.group].to_numpy() if self.group else itertools.repeat(None)
+        for group, score, record in zip(groups, candidates[self.score].to_numpy(), candidates.to_dict('records')):
+            heap = self.heaps.setdefault(group, [])
+            item = (score, next(self._seq), record)
+            if len(heap) < self.k:
+                heapq.heappush(heap, item)
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, item)
+
+    def result(self):
+        """All kept rows, best first within each group, with their rank"""
+        rows = []
+        for heap in self.heaps.values():
+            for rank, (_, _, record) in enumerate(sorted(heap, key=lambda item: -item[0]), start=1):
+                rows.append(dict(record, rank=rank))
+        if not rows:
+            return pd.DataFrame()
+        frame = pd.DataFrame(rows)
+        order = [self.group, 'rank'] if self.group else ['rank']
+        return frame.sort_values(order).reset_index(drop=True)
+
+
+def scan(inputs, models_dir=MODELS_DIR, model_path=None, k=TOP_K, chunk_size=CHUNK_SIZE, scores_path=None):
+    """Score every listing in ``inputs`` and keep the top k per group; returns the results dict"""
+    prep = load_preprocessor(models_dir)
+    if prep is None:
+        raise FileNotFoundError(f"No preprocessor in {models_dir}; run python -m pipeline.preprocessing")
+    model_path = Path(model_path) if model_path else resolve_model_path(models_dir)
+    threads = ThreadBudget().total
+    limit_library_threads(threads)
+    model = configure_estimator(joblib.load(model_path), threads)
+    columns = model_feature_columns(model, models_dir)
+    check_model_columns(prep.feature_columns_, columns)
+    bands = load_error_bands(models_dir)
+
+    tops = {'overall': TopK(k)}
+    tops.update({col: TopK(k, group=col) for col in GROUP_COLUMNS})
+    timings = dict.fromkeys(['read', 'preprocess', 'predict', 'rank'], 0.0)
+    rows = priced = below = 0
+    start = time.time()
+    if scores_path is not None:
+        Path(scores_path).unlink(missing_ok=True)
+
+    for source in inputs:
+        for _, chunk, read_time in iter_chunks(source, chunk_size):
+            timings['read'] += read_time
+            list_price = pd.to_numeric(chunk.pop(LIST_PRICE), errors='coerce') if LIST_PRICE in chunk.columns \
+                else pd.Series(np.nan, index=chunk.index)
+            preds, prep_time, predict_time = score_frame(chunk, prep, model, columns)
+            timings['preprocess'] += prep_time
+            timings['predict'] += predict_time
+
+            rank_start = time.perf_counter()
+            scored = valuation_frame(chunk, preds, list_price.to_numpy(), bands)
+            for top in tops.values():
+                top.push(scored)
+            timings['rank'] += time.perf_counter() - rank_start
+
+            rows += len(chunk)
+            priced += len(scored)
+            below += int(scored['below_interval'].sum())
+            if scores_path is not None:
+                scored.to_csv(scores_path, mode='a', header=not Path(scores_path).exists(), index=False)
+
+    wall = time.time() - start
+    return {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'inputs': [str(p) for p in inputs],
+        'model': model_path.name,
+        'calibrated': bands is not None,
+        'k': k,
+        'rows': rows,
+        'priced': priced,
+        'below_interval': below,
+        'wall_time': wall,
+        'rows_per_sec': rows / wall if wall else 0.0,
+        'stage_seconds': timings,
+        'top': {name: top.result() for name, top in tops.items()},
+    }
+
+
+def load_undervalued(models_dir=MODELS_DIR):
+    """Load the last scan results, or None if no scan has been saved"""
+    path = Path(models_dir) / UNDERVALUED_FILE
+    return joblib.load(path) if path.exists() else None
+
+
+def calibrate(data_dir=DATA_DIR, models_dir=MODELS_DIR, model_path=None, n_bands=N_BANDS):
+    """Error bands from the notebook 02 test split"""
+    model_path = Path(model_path) if model_path else resolve_model_path(models_dir)
+    model = joblib.load(model_path)
+    _, X_test, _, y_test = load_training_matrices(data_dir)
+    columns = model_feature_columns(model, models_dir)
+    check_model_columns(X_test.columns, columns)
+    if columns is not None:
+        X_test = X_test.reindex(columns=columns, fill_value=0)
+    bands = fit_error_bands(model.predict(X_test), y_test, n_bands)
+    bands['model'] = model_path.name
+    return bands
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank active listings by predicted versus list price")
+    sub = parser.add_subparsers(dest='command', required=True)
+    cal = sub.add_parser('calibrate', help="Fit per-price-band error spreads on the test split")
+    cal.add_argument('--data-dir', default=str(DATA_DIR))
+    cal.add_argument('--models-dir', default=str(MODELS_DIR))
+    cal.add_argument('--model', default=None)
+    run = sub.add_parser('scan', help="Score an inventory file and keep the top listings per area")
+    run.add_argument('inputs', nargs='+', help="Active listing CSV files (with ListPrice)")
+    run.add_argument('--models-dir', default=str(MODELS_DIR))
+    run.add_argument('--model', default=None)
+    run.add_argument('--top', type=int, default=TOP_K, help="Listings kept per city / postal code")
+    run.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    run.add_argument('--scores', default=None, help="Also write every scored listing to this CSV")
+    args = parser.parse_args()
+
+    if args.command == 'calibrate':
+        bands = calibrate(args.data_dir, args.models_dir, args.model)
+        path = Path(args.models_dir) / ERROR_BANDS_FILE
+        with open(path, 'w') as f:
+            json.dump(bands, f, indent=2)
+        for lo, hi, bias, sigma, n in zip([0] + bands['edges'], bands['edges'] + [np.inf],
+                                          bands['bias'], bands['sigma'], bands['n']):
+            print(f"  ${lo:>12,.0f} - ${hi:>12,.0f}  bias {bias:+.3f}  sigma {sigma:.3f}  (n={n:,})")
+        print(f"Saved {path}")
+        return
+
+    results = scan(args.inputs, args.models_dir, args.model, args.top, args.chunk_size, args.scores)
+    path = Path(args.models_dir) / UNDERVALUED_FILE
+    joblib.dump(results, path)
+
+    print(f"Scanned {results['rows']:,} listings ({results['priced']:,} with a list price) "
+          f"in {results['wall_time']:.1f}s -> {results['rows_per_sec']:,.0f} rows/s")
+    for stage, seconds in results['stage_seconds'].items():
+        print(f"  {stage:<10} {seconds:8.2f}s")
+    if not results['calibrated']:
+        print(f"No {ERROR_BANDS_FILE}; z-scores use a flat log-price sigma of {DEFAULT_LOG_SIGMA}")
+    print(f"{results['below_interval']:,} listed below their 90% valuation interval")
+    overall = results['top']['overall']
+    if not overall.empty:
+        show = [c for c in [KEY_COLUMN, 'City', LIST_PRICE, 'predicted_price', 'gap_pct', 'z_score'] if c in overall]
+        print(overall[show].to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Batch scoring: column guard and resuming an interrupted run"""
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from pipeline.batch_score import PROGRESS_FILE, check_model_columns, run_batch
+from pipeline.preprocessing import PREPROCESSOR_FILE, Preprocessor
+from pipeline.store import ScoreStore
+
+
+def listings(n, seed):
+    rng = np.random.default_rng(seed)
+    area = rng.uniform(800, 4000, n).round()
+    return pd.DataFrame({
+        'ListingKey': [f'k{seed}-{i}' for i in range(n)],
+        'LivingArea': area,
+        'BedroomsTotal': rng.integers(1, 6, n),
+        'YearBuilt': rng.integers(1950, 2020, n),
+        'PropertyType': rng.choice(['Residential', 'Condo'], n),
+        'ClosePrice': (150 * area * rng.normal(1, 0.1, n)).round(),
+    })
+
+
+@pytest.fixture
+def batch_setup(tmp_path):
+    """models/ with a fitted Preprocessor and linear model, plus two input files"""
+    models = tmp_path / 'models'
+    models.mkdir()
+    prep = Preprocessor(reference_year=2025)
+    X, y = prep.fit_transform(listings(500, 0).astype({'PropertyType': object}))
+    joblib.dump(prep, models / PREPROCESSOR_FILE)
+    model_path = models / 'model.joblib'
+    joblib.dump(LinearRegression().fit(X, y), model_path)
+
+    inputs = []
+    for seed in (1, 2):
+        path = tmp_path / f'listings_{seed}.csv'
+        listings(300, seed).to_csv(path, index=False)
+        inputs.append(path)
+    return tmp_path, models, model_path, inputs
+
+
+def run(setup, inputs, name, **kwargs):
+    root, models, model_path, _ = setup
+    return run_batch(inputs, root / name, models_dir=models, model_path=model_path, chunk_size=100,
+                     workers=1, store_path=root / f'{name}.pkl', **kwargs)
+
+
+def test_check_model_columns():
+    assert check_model_columns(['a', 'b'], None) == []
+    assert check_model_columns(['a'] + [f'c{i}' for i in range(199)], [f'c{i}' for i in range(200)]) == ['c199']
+    with pytest.raises(ValueError, match='model columns'):
+        check_model_columns(['a', 'b'], ['a', 'x'])
+
+
+def test_resume_matches_uninterrupted_run(batch_setup):
+    _, _, _, inputs = batch_setup
+    full = run(batch_setup, inputs, 'full')
+
+    # "Interrupted" after the first file: the second run skips its checkpointed chunks
+    run(batch_setup, inputs[:1], 'resumed')
+    resumed = run(batch_setup, inputs, 'resumed')
+    assert resumed['rows_skipped'] == 300
+    assert resumed['rows_scored'] == 300
+    assert not resumed['partial']
+    assert resumed['metrics']['overall'] == pytest.approx(full['metrics']['overall'])
+
+    root = batch_setup[0]
+    full_store, resumed_store = ScoreStore(root / 'full.pkl').table, ScoreStore(root / 'resumed.pkl').table
+    pd.testing.assert_frame_equal(resumed_store.sort_index(), full_store.sort_index())
+
+
+def test_resume_without_progress_is_partial(batch_setup):
+    root, _, _, inputs = batch_setup
+    run(batch_setup, inputs[:1], 'bare')
+    (root / 'bare' / PROGRESS_FILE).unlink()
+    report = run(batch_setup, inputs, 'bare')
+    assert report['partial']
+    assert report['metrics']['overall']['n'] == 300
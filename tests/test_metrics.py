@@ -0,0 +1,67 @@
+"""Streaming metrics: merged accumulators match metrics over the full arrays"""
+
+import numpy as np
+import pytest
+
+from pipeline.metrics import (ABS_ERROR_EDGES, MAPE_MIN_TARGET, MetricsAccumulator, histogram_quantile,
+                              regression_scores)
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(0)
+    y_true = rng.lognormal(12.5, 0.6, 20_000)
+    y_true[:50] = rng.uniform(1, MAPE_MIN_TARGET, 50)   # near-zero sale prices MAPE must skip
+    y_pred = y_true * rng.normal(1, 0.15, len(y_true))
+    return y_true, y_pred
+
+
+def test_thirteen_chunk_merge_matches_full_arrays(prices):
+    y_true, y_pred = prices
+    chunks = np.array_split(np.arange(len(y_true)), 13)
+    # Uneven chunks, one per "worker", merged in a different order than they were built
+    merged = MetricsAccumulator()
+    for rows in reversed(chunks):
+        merged.merge(MetricsAccumulator().update(y_true[rows], y_pred[rows]))
+    single = MetricsAccumulator().update(y_true, y_pred)
+
+    expected = regression_scores(y_true, y_pred)
+    scores = merged.scores()
+    assert scores['n'] == len(y_true)
+    for key in ('r2', 'rmse', 'mape'):
+        assert scores[key] == pytest.approx(expected[key], rel=1e-9)
+    assert scores['mape_excluded'] == 50
+    assert scores['mae'] == pytest.approx(np.mean(np.abs(y_pred - y_true)), rel=1e-9)
+    for key in ('abs_error_p50', 'abs_error_p90', 'pct_error_p05', 'pct_error_p95'):
+        assert scores[key] == single.scores()[key]
+
+
+def test_band_scores_merge(prices):
+    y_true, y_pred = prices
+    half = len(y_true) // 2
+    merged = MetricsAccumulator().update(y_true[:half], y_pred[:half])
+    merged.merge(MetricsAccumulator().update(y_true[half:], y_pred[half:]))
+    single = MetricsAccumulator().update(y_true, y_pred)
+    assert merged.band_scores().keys() == single.band_scores().keys()
+    for label, scores in single.band_scores().items():
+        assert merged.band_scores()[label]['rmse'] == pytest.approx(scores['rmse'], rel=1e-9)
+        assert merged.band_scores()[label]['n'] == scores['n']
+
+
+def test_merge_rejects_different_bands():
+    with pytest.raises(ValueError):
+        MetricsAccumulator().merge(MetricsAccumulator(bands=(250_000,)))
+
+
+def test_update_skips_non_finite():
+    acc = MetricsAccumulator().update([200_000, np.nan, 300_000], [210_000, 1.0, np.inf])
+    assert acc.scores()['n'] == 1
+
+
+def test_histogram_quantile_interpolates():
+    errors = np.random.default_rng(1).lognormal(9, 1, 50_000)
+    counts = np.bincount(np.searchsorted(ABS_ERROR_EDGES, errors, side='right'),
+                         minlength=len(ABS_ERROR_EDGES) + 1)
+    for q in (0.1, 0.5, 0.9):
+        assert histogram_quantile(counts, ABS_ERROR_EDGES, q) == pytest.approx(np.quantile(errors, q), rel=0.06)
+    assert np.isnan(histogram_quantile(np.zeros_like(counts), ABS_ERROR_EDGES, 0.5))
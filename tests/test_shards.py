@@ -0,0 +1,60 @@
+"""Region shards: routing on raw postal codes and the bounded LRU shard cache"""
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.dummy import DummyRegressor
+
+from pipeline.shards import GLOBAL_SHARD, ShardedModel, shard_name
+
+REGIONS = {708: 1.0, 707: 2.0, 700: 3.0}
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    """ShardedModel over constant shards: region 708 predicts 1.0, 707 -> 2.0, ..., global -> 0.0"""
+    X = pd.DataFrame({'LivingArea': [1.0, 2.0]})
+    for name, value in [(shard_name(r), v) for r, v in REGIONS.items()] + [(GLOBAL_SHARD, 0.0)]:
+        model = DummyRegressor(strategy='constant', constant=value).fit(X, [value, value])
+        joblib.dump(model, tmp_path / f"{name}.joblib")
+    index = {'digits': 3, 'features': ['LivingArea'],
+             'routes': {str(r): shard_name(r) for r in REGIONS}, 'shards': {}}
+    return lambda max_loaded: ShardedModel(tmp_path, index, max_loaded=max_loaded)
+
+
+def test_routes_raw_postal_codes(sharded):
+    model = sharded(4)
+    codes = ['70808', 70712.0, '70001-1234', None, '99999']
+    np.testing.assert_array_equal(model.shard_for(codes),
+                                  ['zip708', 'zip707', 'zip700', GLOBAL_SHARD, GLOBAL_SHARD])
+    X = pd.DataFrame({'LivingArea': np.arange(len(codes), dtype=float)})
+    np.testing.assert_array_equal(model.predict(X, codes), [1.0, 2.0, 3.0, 0.0, 0.0])
+
+
+def test_lru_cache_evicts_least_recently_used(sharded):
+    model = sharded(2)
+    model._get('zip708')
+    model._get('zip707')
+    model._get('zip708')                 # hit; zip707 is now least recently used
+    model._get('zip700')                 # evicts zip707
+    assert model.loaded() == ['zip708', 'zip700']
+    assert model.stats == {'hits': 1, 'misses': 3, 'evictions': 1}
+
+    model._get('zip707')                 # reloaded, evicts zip708
+    assert model.loaded() == ['zip700', 'zip707']
+    assert model.stats == {'hits': 1, 'misses': 4, 'evictions': 2}
+
+
+def test_batch_predict_stays_within_cache(sharded):
+    model = sharded(1)
+    codes = ['70808', '70712', '70808', '70001']
+    X = pd.DataFrame({'LivingArea': np.ones(len(codes))})
+    np.testing.assert_array_equal(model.predict(X, codes), [1.0, 2.0, 1.0, 3.0])
+    assert len(model.loaded()) == 1
+    assert model.stats['misses'] == 3
+
+
+def test_rejects_misaligned_postal_codes(sharded):
+    with pytest.raises(ValueError):
+        sharded(4).predict(pd.DataFrame({'LivingArea': [1.0, 2.0, 3.0]}), ['70808', '70712'])
@@ -0,0 +1,66 @@
+"""Score-store hashing: a listing hashes the same whatever dtype its chunk was read with"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.store import ScoreStore, hash_schema, row_hashes
+
+
+@pytest.fixture
+def schema():
+    prep = SimpleNamespace(onehot_cols_=['PropertyType'], target_maps_={'PostalCode': {}},
+                           raw_feature_columns_=['LivingArea', 'Latitude', 'PoolPrivateYN'])
+    return hash_schema(prep)
+
+
+def test_hash_schema_rules(schema):
+    assert schema['PostalCode'] == 'text'
+    assert schema['PropertyType'] == 'text'
+    assert schema['LivingArea'] == 'number'
+    # Engineered inputs are read even when they are not features themselves
+    assert schema['YearBuilt'] == 'number'
+
+
+@pytest.mark.parametrize('chunk', [
+    {'LivingArea': [1500, 2000], 'PostalCode': [70808, 70809], 'YearBuilt': [1990, 2005]},
+    {'LivingArea': [1500.0, 2000.0], 'PostalCode': [70808.0, 70809.0], 'YearBuilt': [1990.0, 2005.0]},
+    {'LivingArea': ['1500', ' 2000'], 'PostalCode': ['70808', '70809.0'], 'YearBuilt': ['1990', '2005']},
+], ids=['int', 'float', 'str'])
+def test_row_hashes_ignore_chunk_dtype(schema, chunk):
+    reference = pd.DataFrame({'LivingArea': [1500, 2000], 'PostalCode': ['70808', '70809'],
+                              'YearBuilt': [1990, 2005], 'PublicRemarks': ['a', 'b']})
+    frame = pd.DataFrame(chunk).assign(PublicRemarks=['edited', 'remarks'])
+    np.testing.assert_array_equal(row_hashes(frame, schema), row_hashes(reference, schema))
+
+
+def test_row_hashes_missing_and_bool(schema):
+    numeric = pd.DataFrame({'LivingArea': [np.nan, 1500.0], 'PostalCode': [np.nan, 70808.0],
+                            'PoolPrivateYN': [1.0, 0.0]})
+    text = pd.DataFrame({'LivingArea': ['', '1500'], 'PostalCode': [None, '70808'],
+                         'PoolPrivateYN': ['True', 'False']})
+    np.testing.assert_array_equal(row_hashes(numeric, schema), row_hashes(text, schema))
+
+
+def test_row_hashes_see_feature_edits(schema):
+    before = pd.DataFrame({'LivingArea': [1500], 'PostalCode': ['70808']})
+    after = pd.DataFrame({'LivingArea': [1501], 'PostalCode': ['70808']})
+    assert row_hashes(before, schema)[0] != row_hashes(after, schema)[0]
+
+
+def test_store_changed_after_save(tmp_path):
+    store = ScoreStore(tmp_path / 'store.pkl')
+    keys = ['a', 'b', 'c']
+    hashes = np.array([1, 2, 2 ** 63 + 5], dtype='uint64')
+    assert store.changed(keys, hashes, 'v1').all()
+
+    store.update(keys, hashes, [100.0, 200.0, 300.0], 'v1')
+    store.save()
+    store = ScoreStore(tmp_path / 'store.pkl')
+    hashes[1] = 3
+    np.testing.assert_array_equal(store.changed(keys + ['d'], np.append(hashes, 4), 'v1'),
+                                  [False, True, False, True])
+    assert store.changed(keys, hashes, 'v2').all()
+    np.testing.assert_array_equal(store.predictions(['c', 'x']), [300.0, np.nan])